@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmarks the crontab code paths of restart_scheduler.py against a fake crontab.
+
+Runs the real get_current_crontab / get_script_cron_jobs / remove_all_script_cron_jobs /
+add_cron_job functions (and a CrontabTransaction-based writer for the concurrency test) with:
+  - a fake `crontab` executable first on PATH, which stores the crontab in a temp file and
+    counts every invocation, and
+  - a temporary spool directory for the spool backend.
+
+For every backend and crontab size it reports wall time, crontab process spawns and peak
+Python memory per operation. It then starts N concurrent writer processes, each adding one
+unique line, and counts how many of those lines are missing afterwards (lost updates).
+Results are printed as JSON so runs of different versions can be diffed.
+
+    python3 benchmarks/bench_crontab.py > bench.json
+    python3 benchmarks/bench_crontab.py --sizes 10,1000 --writers 4,16 --repeat 3
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import restart_scheduler as rs  # noqa: E402
+
+FAKE_CRONTAB = """#!/bin/sh
+# Stand-in for crontab(1): -l prints, - installs from stdin, -r removes. Counts every spawn.
+echo x >> "$FAKE_CRONTAB_SPAWNS"
+case "$1" in
+    -l) if [ -f "$FAKE_CRONTAB_FILE" ]; then cat "$FAKE_CRONTAB_FILE"; else echo "no crontab for $(id -un)" >&2; exit 1; fi ;;
+    -r) rm -f "$FAKE_CRONTAB_FILE" ;;
+    -)  cat > "$FAKE_CRONTAB_FILE.tmp" && mv "$FAKE_CRONTAB_FILE.tmp" "$FAKE_CRONTAB_FILE" ;;
+    *)  echo "fake crontab: unsupported arguments $*" >&2; exit 2 ;;
+esac
+"""
+
+OPERATIONS = ["get_current_crontab", "get_script_cron_jobs", "remove_all_script_cron_jobs", "add_cron_job"]
+
+
+class Sandbox:
+    """Temporary fake crontab, spool directory and lock file, wired into the environment and module."""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="rs-bench-")
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.spool_dir = os.path.join(self.root, "spool")
+        os.makedirs(self.bin_dir)
+        os.makedirs(self.spool_dir)
+        crontab = os.path.join(self.bin_dir, "crontab")
+        with open(crontab, "w") as f:
+            f.write(FAKE_CRONTAB)
+        os.chmod(crontab, 0o755)
+        self.crontab_file = os.path.join(self.root, "crontab.txt")
+        self.spawn_file = os.path.join(self.root, "spawns")
+        os.environ.update({
+            "PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", ""),
+            "FAKE_CRONTAB_FILE": self.crontab_file,
+            "FAKE_CRONTAB_SPAWNS": self.spawn_file,
+        })
+        rs.CRONTAB_SPOOL_DIRS = [self.spool_dir]
+        rs.CRON_LOCK_PATH = os.path.join(self.root, "restart_scheduler.lock")
+        # Benchmarks must not depend on whether this machine has a reboot binary
+        rs.resolve_reboot_command = lambda: "/sbin/reboot"
+
+    def use_backend(self, backend):
+        rs.CRON_BACKEND = backend
+
+    @property
+    def storage_path(self):
+        return rs.get_crontab_spool_path() if rs.use_spool_backend() else self.crontab_file
+
+    def write(self, content):
+        with open(self.storage_path, "w") as f:
+            f.write(content)
+
+    def read(self):
+        try:
+            with open(self.storage_path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def spawns(self):
+        try:
+            with open(self.spawn_file) as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def make_crontab(size):
+    """A crontab of `size` foreign lines with the script's managed block in the middle."""
+    lines = [f"{i % 60} {i % 24} * * * /usr/local/bin/generated-job-{i} --shard {i % 97} >/dev/null 2>&1"
+             for i in range(size)]
+    job = rs.format_script_cron_job("0 4 * * *", "/usr/local/bin/restart_scheduler gate", rs.DEFAULT_JOB_ID, "Daily at 04:00")
+    lines[size // 2:size // 2] = [rs.MANAGED_BLOCK_BEGIN, job, rs.MANAGED_BLOCK_END]
+    return "\n".join(lines) + "\n"
+
+
+def run_operation(name):
+    if name == "get_current_crontab":
+        rs.get_current_crontab()
+    elif name == "get_script_cron_jobs":
+        rs.get_script_cron_jobs()
+    elif name == "remove_all_script_cron_jobs":
+        rs.remove_all_script_cron_jobs(inform_user=False)
+    elif name == "add_cron_job":
+        rs.add_cron_job("30 5 * * *", "Daily at 05:30")
+
+
+def bench_operation(sandbox, name, content, repeat):
+    """Times one operation on a freshly written crontab; returns medians over `repeat` runs.
+    Peak memory comes from one extra run under tracemalloc, which would distort the timings.
+    """
+    times, spawns = [], []
+    for _ in range(repeat):
+        sandbox.write(content)
+        before = sandbox.spawns()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_operation(name)
+        times.append(time.perf_counter() - started)
+        spawns.append(sandbox.spawns() - before)
+    sandbox.write(content)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_operation(name)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds_median": round(statistics.median(times), 6),
+        "seconds_min": round(min(times), 6),
+        "spawns": max(spawns),
+        "peak_bytes": peak,
+    }
+
+
+def concurrent_writer(backend, index, start_event):
+    """Worker process: adds one unique line through a crontab transaction."""
+    rs.CRON_BACKEND = backend
+    start_event.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with rs.CrontabTransaction() as txn:
+            txn.content += f"* * * * * /bin/true writer-{index}\n"
+            txn.commit()
+
+
+def bench_concurrency(sandbox, backend, writers, base_content):
+    """Starts `writers` processes at once and counts lines lost to overlapping read-modify-write cycles."""
+    sandbox.write(base_content)
+    ctx = multiprocessing.get_context("fork")
+    start_event = ctx.Event()
+    procs = [ctx.Process(target=concurrent_writer, args=(backend, i, start_event)) for i in range(writers)]
+    for p in procs:
+        p.start()
+    started = time.perf_counter()
+    start_event.set()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    final = sandbox.read()
+    present = sum(1 for i in range(writers) if f"writer-{i}\n" in final)
+    return {
+        "writers": writers,
+        "seconds": round(elapsed, 6),
+        "lost_updates": writers - present,
+        "failed_writers": sum(1 for p in procs if p.exitcode != 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="comma-separated crontab line counts")
+    parser.add_argument("--writers", default="2,8,32", help="comma-separated concurrent writer counts")
+    parser.add_argument("--backends", default="command,spool", help="comma-separated crontab backends")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (fewer for sizes >= 10000)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    writer_counts = [int(w) for w in args.writers.split(",") if w]
+    backends = [b for b in args.backends.split(",") if b]
+
+    with open(os.path.join(REPO_ROOT, "restart_scheduler.py"), "rb") as f:
+        script_digest = hashlib.sha1(f.read()).hexdigest()
+    report = {
+        "script_sha1": script_digest,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "operations": [],
+        "concurrency": [],
+    }
+    sandbox = Sandbox()
+    try:
+        for backend in backends:
+            sandbox.use_backend(backend)
+            for size in sizes:
+                content = make_crontab(size)
+                repeat = args.repeat if size < 10000 else max(1, args.repeat // 2)
+                for name in OPERATIONS:
+                    result = bench_operation(sandbox, name, content, repeat)
+                    result.update(backend=backend, size=size, operation=name)
+                    report["operations"].append(result)
+                    print(f"{backend:8} {size:>7} {name:28} {result['seconds_median'] * 1000:9.2f} ms "
+                          f"{result['spawns']:>2} spawns {result['peak_bytes'] / 1024:9.0f} KiB", file=sys.stderr)
+            for writers in writer_counts:
+                result = bench_concurrency(sandbox, backend, writers, make_crontab(100))
+                result["backend"] = backend
+                report["concurrency"].append(result)
+                print(f"{backend:8} {writers:>3} concurrent writers: {result['lost_updates']} lost updates, "
+                      f"{result['seconds']:.3f}s", file=sys.stderr)
+    finally:
+        sandbox.cleanup()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if any(r["lost_updates"] or r["failed_writers"] for r in report["concurrency"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
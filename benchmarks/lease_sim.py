@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Simulates restart admission for a fleet of hosts on one machine.
+
+Starts the bundled lease server (`restart_scheduler.py lease-server`) as a separate process, or
+uses a temporary lease directory, and runs every simulated host as its own process. Each host
+goes through the gate's real admission code (acquire_restart_lease / release_restart_lease) for
+a number of restart rounds:
+  - it waits a random clock drift, then asks for a slot in its pool,
+  - holds the slot for a random "reboot" duration and releases it, or
+  - with --crash-rate, never releases it, so the slot only frees up when the TTL expires.
+
+Every hold is recorded with the backend's own grant and expiry times. The report gives, per
+backend, the peak number of concurrent holders per pool (which must never exceed --slots),
+admission waits and timeouts. Results are printed as JSON; the exit status is 1 if any pool
+went over its limit.
+
+    python3 benchmarks/lease_sim.py
+    python3 benchmarks/lease_sim.py --hosts 200 --pools 4 --slots 3 --backends tcp --output sim.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO_ROOT, "restart_scheduler.py")
+sys.path.insert(0, REPO_ROOT)
+import restart_scheduler as rs  # noqa: E402
+
+
+class LeaseServer:
+    """The bundled lease server on a free local port, logging into the sandbox."""
+
+    def __init__(self, root):
+        env = dict(os.environ, RESTART_SCHEDULER_LOG=os.path.join(root, "server.log"),
+                   RESTART_SCHEDULER_CONFIG=os.path.join(root, "none.conf"))
+        self.proc = subprocess.Popen([sys.executable, SCRIPT, "lease-server", "--port", "0",
+                                      "--state", os.path.join(root, "server-state.json")],
+                                     stdout=subprocess.PIPE, text=True, env=env)
+        line = self.proc.stdout.readline()
+        if not line.startswith("Listening on "):
+            self.stop()
+            raise RuntimeError(f"lease server did not start: {line!r}")
+        self.address = line.split()[-1]
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def host_settings(args, backend, location, host, pool):
+    return {"backend": backend, "directory": location, "server": location, "pool": pool,
+            "slots": args.slots, "ttl": args.ttl, "holder": host, "deadline": args.deadline,
+            "backoff": args.backoff, "max_backoff": args.max_backoff, "on_timeout": "skip"}
+
+
+def run_host(args, backend, location, root, index, start_event, results):
+    """Worker process: one simulated host going through args.rounds restarts."""
+    host, pool = f"host-{index:04d}", f"pool-{index % args.pools}"
+    rs.LEASE_STATE_PATH = os.path.join(root, "state", f"{host}.json")
+    rs.LOG_PATH = os.path.join(root, "hosts.log")
+    settings = host_settings(args, backend, location, host, pool)
+    lease_backend = rs.get_lease_backend(settings)
+    rng = random.Random(args.seed * 100003 + index)
+    start_event.wait()
+    for _ in range(args.rounds):
+        time.sleep(rng.uniform(0, args.drift))
+        asked = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            admitted = rs.acquire_restart_lease(settings, "sim")
+        record = {"pool": pool, "host": host, "admitted": admitted, "waited": time.monotonic() - asked}
+        if admitted:
+            granted_at = time.time()
+            lease = next((item for item in lease_backend.list(pool) if item["holder"] == host), None)
+            time.sleep(rng.uniform(0.5, 1.5) * args.hold)
+            if lease is None:
+                # the host stalled for longer than the TTL between the grant and the lookup
+                lease = {"acquired": granted_at, "expires": granted_at}
+            record.update(start=lease["acquired"], expires=lease["expires"])
+            if rng.random() < args.crash_rate:
+                # never released: the slot comes back when the lease expires
+                record.update(crashed=True, end=lease["expires"])
+                os.unlink(rs.LEASE_STATE_PATH)
+                time.sleep(max(0.0, lease["expires"] - time.time()))
+            else:
+                record.update(crashed=False, end=time.time())
+                with contextlib.redirect_stdout(io.StringIO()):
+                    rs.release_restart_lease("sim")
+        results.put(record)
+
+
+def peak_holders(records):
+    """Largest number of overlapping leases; a release and a grant at the same instant do not overlap.
+    A lease ends at its release or its expiry, whichever comes first.
+    """
+    events = sorted([(r["start"], 1) for r in records] + [(min(r["end"], r["expires"]), -1) for r in records])
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def simulate(args, backend):
+    root = tempfile.mkdtemp(prefix="rs-lease-sim-")
+    os.makedirs(os.path.join(root, "state"))
+    server = None
+    try:
+        if backend == "tcp":
+            server = LeaseServer(root)
+            location = server.address
+        else:
+            location = os.path.join(root, "leases")
+        ctx = multiprocessing.get_context("fork")
+        start_event, results = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=run_host, args=(args, backend, location, root, i, start_event, results))
+                 for i in range(args.hosts)]
+        for p in procs:
+            p.start()
+        started = time.perf_counter()
+        start_event.set()
+        records = []
+        while len(records) < args.hosts * args.rounds:
+            try:
+                records.append(results.get(timeout=1.0))
+            except queue.Empty:
+                if not any(p.is_alive() for p in procs):
+                    break
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if server:
+            server.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    holds = [r for r in records if r["admitted"]]
+    waits = sorted(r["waited"] for r in holds)
+    pools = {}
+    for pool in sorted({r["pool"] for r in records}):
+        peak = peak_holders([r for r in holds if r["pool"] == pool])
+        pools[pool] = {"peak_holders": peak, "over_limit": peak > args.slots}
+    return {
+        "backend": backend,
+        "seconds": round(elapsed, 3),
+        "restarts": len(holds),
+        "timeouts": len(records) - len(holds),
+        "crashed": sum(1 for r in holds if r["crashed"]),
+        # held past the TTL: the slot was given to another host meanwhile; raise --ttl
+        "expired_while_held": sum(1 for r in holds if not r["crashed"] and r["end"] > r["expires"]),
+        "wait_median": round(statistics.median(waits), 3) if waits else None,
+        "wait_p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else None,
+        "wait_max": round(waits[-1], 3) if waits else None,
+        "failed_hosts": sum(1 for p in procs if p.exitcode != 0),
+        "pools": pools,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", default="tcp,directory", help="comma-separated lease backends")
+    parser.add_argument("--hosts", type=int, default=60, help="simulated hosts (default 60)")
+    parser.add_argument("--pools", type=int, default=3, help="pools the hosts are spread over (default 3)")
+    parser.add_argument("--slots", type=int, default=2, help="concurrent restarts allowed per pool (default 2)")
+    parser.add_argument("--rounds", type=int, default=2, help="restarts per host (default 2)")
+    parser.add_argument("--hold", type=float, default=0.2, help="mean seconds a restart holds its slot (default 0.2)")
+    parser.add_argument("--drift", type=float, default=0.5, help="max seconds a host starts late, like clock drift (default 0.5)")
+    parser.add_argument("--crash-rate", type=float, default=0.05, help="fraction of restarts that never release (default 0.05)")
+    parser.add_argument("--ttl", type=float, default=5.0, help="lease TTL in seconds (default 5)")
+    parser.add_argument("--deadline", type=float, default=60.0, help="admission deadline in seconds (default 60)")
+    parser.add_argument("--backoff", type=float, default=0.05, help="first retry delay in seconds (default 0.05)")
+    parser.add_argument("--max-backoff", type=float, default=0.5, help="longest retry delay in seconds (default 0.5)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    if args.ttl <= 1.5 * args.hold:
+        parser.error("--ttl must exceed the longest hold (1.5 x --hold), or leases expire while held")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "runs": [],
+    }
+    for backend in [b for b in args.backends.split(",") if b]:
+        result = simulate(args, backend)
+        report["runs"].append(result)
+        peak = max(pool["peak_holders"] for pool in result["pools"].values())
+        print(f"{backend:10} {result['restarts']:>5} restarts in {result['seconds']:7.2f}s, peak {peak}/{args.slots} "
+              f"per pool, wait p50 {result['wait_median']}s p95 {result['wait_p95']}s, "
+              f"{result['timeouts']} timeouts, {result['crashed']} crashed, "
+              f"{result['expired_while_held']} expired while held", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if any(pool["over_limit"] for r in report["runs"] for pool in r["pools"].values()) \
+        or any(r["failed_hosts"] for r in report["runs"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
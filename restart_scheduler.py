@@ -2,13 +2,157 @@
 # -*- coding: utf-8 -*-
 
 import os
-import subprocess
-import datetime
 import sys
-import re
+import json
+import time
 
 # Unique identifier for cron jobs created by this script
 CRON_COMMENT = "#restart_scheduler_job_by_script"
+# The script's jobs live between these lines, so they can be found without scanning the crontab
+MANAGED_BLOCK_BEGIN = "# BEGIN restart_scheduler managed block (do not edit by hand)"
+MANAGED_BLOCK_END = "# END restart_scheduler managed block"
+DEFAULT_JOB_ID = "default"
+
+# How the crontab is read and written:
+#   "command" - through the crontab(1) binary (default, works everywhere)
+#   "spool"   - read and atomically replace the spool file directly, without forking crontab
+CRON_BACKEND = os.environ.get("RESTART_SCHEDULER_CRON_BACKEND", "command").strip().lower()
+# Debian/Ubuntu keep per-user crontabs in /var/spool/cron/crontabs, RHEL/cronie in /var/spool/cron
+CRONTAB_SPOOL_DIRS = [os.environ["RESTART_SCHEDULER_SPOOL_DIR"]] if os.environ.get("RESTART_SCHEDULER_SPOOL_DIR") \
+    else ["/var/spool/cron/crontabs", "/var/spool/cron"]
+# Lock serializing concurrent invocations that edit the crontab
+CRON_LOCK_PATH = os.environ.get("RESTART_SCHEDULER_LOCK", "/run/lock/restart_scheduler.lock")
+# Held by a running gate, so overlapping gates (cron, watch, by hand) cannot both drain and reboot
+GATE_LOCK_PATH = os.path.join(os.path.dirname(CRON_LOCK_PATH), "restart_scheduler.gate.lock")
+
+# Optional settings for the gate and other non-interactive features (INI format, see README)
+CONFIG_PATH = os.environ.get("RESTART_SCHEDULER_CONFIG", "/etc/restart_scheduler.conf")
+# Where restarts are scheduled: "cron", "systemd" (timer units) or "auto" (cron if crontab exists)
+SCHEDULER_BACKEND = os.environ.get("RESTART_SCHEDULER_BACKEND", "")
+SYSTEMD_UNIT_DIR = os.environ.get("RESTART_SCHEDULER_UNIT_DIR", "/etc/systemd/system")
+SYSTEMCTL = os.environ.get("RESTART_SCHEDULER_SYSTEMCTL", "systemctl")
+# Persistent state (restart history, snapshots, leases)
+STATE_DIR = os.environ.get("RESTART_SCHEDULER_STATE_DIR", "/var/lib/restart_scheduler")
+# The script only edits schedules as root, so its jobs live in root's crontab
+SCHEDULER_USER = "root"
+# Cache behind the 'status' command, rebuilt when the crontab, timer units or config change.
+# Written by root and readable by everyone, so unprivileged monitoring agents can use it.
+STATUS_CACHE_PATH = os.environ.get("RESTART_SCHEDULER_STATUS_CACHE", "/run/restart_scheduler/status.json")
+# Upper bound on cache age, for changes the key does not see (e.g. a reboot binary being installed)
+STATUS_CACHE_MAX_AGE = 3600
+STATUS_NEXT_RUNS = 5
+# Append-only JSON-lines log of gate decisions and other restart events
+LOG_PATH = os.environ.get("RESTART_SCHEDULER_LOG", "/var/log/restart_scheduler.log")
+
+# ---------------------------------------------------------------------------
+# Status cache reader. Monitoring agents poll 'status' every few seconds, so a cache hit is
+# answered from here with only os, json and time loaded; the imports and definitions further
+# down run for a cache miss and for every other command.
+# ---------------------------------------------------------------------------
+
+# Stands in for a cache key part the caller has no permission to check
+STATUS_KEY_UNVERIFIED = "unverified"
+
+def _stat_key(path):
+    """(inode, mtime, size) of path, or None if it does not exist. Other errors propagate."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+def get_crontab_spool_dir():
+    """Returns the first existing crontab spool directory, or None."""
+    for spool_dir in CRONTAB_SPOOL_DIRS:
+        if os.path.isdir(spool_dir):
+            return spool_dir
+    return None
+
+def status_cache_key():
+    """Everything the status answer is derived from: the settings, the config file, the crontab
+    spool directory and the systemd unit directory. crontab(1) and the spool backend replace spool
+    files by renaming into the directory and cron watches its mtime for changes; unlike root's
+    spool file, anyone can stat it. Sources the caller may not stat are STATUS_KEY_UNVERIFIED.
+    """
+    spool_dir = get_crontab_spool_dir()
+    key = [SCHEDULER_BACKEND, CRON_BACKEND, CONFIG_PATH, None, spool_dir, None, SYSTEMD_UNIT_DIR, None]
+    for index, path in ((3, CONFIG_PATH), (5, spool_dir), (7, SYSTEMD_UNIT_DIR)):
+        try:
+            key[index] = _stat_key(path) if path else None
+        except OSError:
+            key[index] = STATUS_KEY_UNVERIFIED
+    return key
+
+def load_status_cache(key):
+    """Returns the stored {"key", "built", "status"} if it was built for key, else None.
+    Unverified key parts match anything.
+    """
+    try:
+        with open(STATUS_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or len(cache.get("key") or []) != len(key):
+        return None
+    if any(mine != cached and mine != STATUS_KEY_UNVERIFIED for mine, cached in zip(key, cache["key"])):
+        return None
+    return cache
+
+def read_status_cache(key):
+    """Returns the cached status if it was built for key less than STATUS_CACHE_MAX_AGE ago and
+    every job still has an upcoming run (past runs are dropped), else None.
+    """
+    cache = load_status_cache(key)
+    if cache is None or time.time() - cache.get("built", 0) > STATUS_CACHE_MAX_AGE:
+        return None
+    status = cache["status"]
+    # isoformat strings of naive local times compare like the times themselves
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for job in status["jobs"]:
+        upcoming = [t for t in job["next_runs"] if t > now]
+        if job["next_runs"] and not upcoming:
+            return None
+        job["next_runs"] = upcoming
+    status["cached"] = True
+    return status
+
+def print_status(status):
+    """Writes the status (or status error) as one line of JSON."""
+    sys.stdout.write(json.dumps(status, separators=(',', ':')) + "\n")
+
+if __name__ == "__main__" and sys.argv[1:] == ["status"]:
+    _status = read_status_cache(status_cache_key())
+    if _status is not None:
+        print_status(_status)
+        sys.exit(0)
+
+# Everything else (imported after the status fast path above)
+import subprocess  # noqa: E402
+import datetime  # noqa: E402
+import re  # noqa: E402
+import shlex  # noqa: E402
+import argparse  # noqa: E402
+import concurrent.futures  # noqa: E402
+import collections  # noqa: E402
+import functools  # noqa: E402
+import bisect  # noqa: E402
+import calendar  # noqa: E402
+import hashlib  # noqa: E402
+import itertools  # noqa: E402
+import array  # noqa: E402
+import configparser  # noqa: E402
+import mmap  # noqa: E402
+import fcntl  # noqa: E402
+import pwd  # noqa: E402
+import grp  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import signal  # noqa: E402
+import math  # noqa: E402
+import random  # noqa: E402
+import socket  # noqa: E402
+import socketserver  # noqa: E402
+import ctypes  # noqa: E402
 
 # Determine the name the script was executed with for display purposes
 try:
@@ -19,161 +163,3074 @@ try:
 except Exception:
     EXECUTED_SCRIPT_NAME = "restart_scheduler.py" # A sensible fallback
 
-# ANSI color codes for better terminal output
-HEADER = '\033[95m'
-OKBLUE = '\033[94m'
-OKCYAN = '\033[96m'
-OKGREEN = '\033[92m'
-WARNING = '\033[93m'
-FAIL = '\033[91m'
-ENDC = '\033[0m'
-BOLD = '\033[1m'
-UNDERLINE = '\033[4m'
+# ANSI color codes for better terminal output
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKCYAN = '\033[96m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+# No escape codes when output is piped or captured (scripts, fleet runs, cron mail)
+if os.environ.get("NO_COLOR") or not sys.stdout.isatty():
+    HEADER = OKBLUE = OKCYAN = OKGREEN = WARNING = FAIL = ENDC = BOLD = UNDERLINE = ''
+
+def clear_screen():
+    """Clears the terminal screen."""
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+def check_root():
+    """Checks if the script is run as root."""
+    if os.geteuid() != 0:
+        print(f"{FAIL}This script requires root privileges to manage crontab and itself.{ENDC}")
+        # Use EXECUTED_SCRIPT_NAME for more accurate instruction
+        script_call_name = EXECUTED_SCRIPT_NAME.replace('.py', '') if '.py' in EXECUTED_SCRIPT_NAME.lower() else EXECUTED_SCRIPT_NAME
+        print(f"Please run with '{BOLD}sudo python3 {EXECUTED_SCRIPT_NAME}{ENDC}' or if installed in PATH '{BOLD}sudo {script_call_name}{ENDC}'.")
+        sys.exit(1)
+
+_config = None
+
+def load_config():
+    """Loads CONFIG_PATH once; a missing file yields an empty configuration."""
+    global _config
+    if _config is None:
+        _config = configparser.ConfigParser(interpolation=None)
+        try:
+            _config.read(CONFIG_PATH, encoding='utf-8')
+        except configparser.Error as e:
+            print(f"{WARNING}Ignoring unreadable config {CONFIG_PATH}: {e}{ENDC}", file=sys.stderr)
+            _config = configparser.ConfigParser(interpolation=None)
+    return _config
+
+def get_config_option(section, option, default=None, cast=str):
+    """Returns a config value converted with cast; empty or missing values give default."""
+    value = load_config().get(section, option, fallback="").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"{WARNING}Invalid value for [{section}] {option} in {CONFIG_PATH}: '{value}'{ENDC}", file=sys.stderr)
+        return default
+
+def get_config_list(section, option):
+    """Returns a multi-line config value as a list of its non-empty lines."""
+    value = load_config().get(section, option, fallback="")
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+def log_event(event, fsync=False, **fields):
+    """Appends one JSON record to LOG_PATH (echoed to the terminal when interactive).
+    fsync=True makes sure the record survives an imminent reboot.
+    """
+    record = {"time": datetime.datetime.now().isoformat(timespec='milliseconds'), "event": event}
+    record.update(fields)
+    line = json.dumps(record, separators=(',', ':'), default=str)
+    try:
+        with open(LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except OSError as e:
+        print(f"{WARNING}Could not write {LOG_PATH}: {e}{ENDC}", file=sys.stderr)
+    if sys.stdout.isatty():
+        print(f"{OKBLUE}[{event}]{ENDC} " + " ".join(f"{k}={v}" for k, v in fields.items()))
+    return record
+
+def get_crontab_spool_path(user=None):
+    """Returns the spool file holding user's crontab (default: the current user's), or None if no
+    spool directory exists.
+    """
+    user = user or pwd.getpwuid(os.geteuid()).pw_name
+    spool_dir = get_crontab_spool_dir()
+    return os.path.join(spool_dir, user) if spool_dir else None
+
+def crontab_installed():
+    """True when a crontab executable is on PATH."""
+    return any(os.access(os.path.join(d, "crontab"), os.X_OK) for d in os.environ.get("PATH", "").split(os.pathsep) if d)
+
+def use_spool_backend():
+    """True when the crontab should be edited through the spool file instead of the crontab binary."""
+    return CRON_BACKEND == "spool" and get_crontab_spool_path() is not None
+
+def read_crontab_spool():
+    """Reads the crontab straight from the spool file."""
+    try:
+        with open(get_crontab_spool_path(), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+    except OSError as e:
+        print(f"{FAIL}Error reading crontab spool file: {e}{ENDC}")
+        sys.exit(1)
+
+def write_crontab_spool(content):
+    """Atomically replaces the spool file (write to a temp file in the same directory, then rename).
+    The rename updates the spool directory mtime, which is what cron watches for changes.
+    """
+    spool_path = get_crontab_spool_path()
+    if not content.strip():
+        try:
+            os.unlink(spool_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"{FAIL}Error removing crontab spool file: {e}{ENDC}")
+            return False
+        return True
+
+    # Keep the ownership/mode of the existing file; new files follow crontab(1): user:crontab (or user's group), 0600
+    try:
+        st = os.stat(spool_path)
+        uid, gid, mode = st.st_uid, st.st_gid, st.st_mode & 0o7777
+    except FileNotFoundError:
+        pw = pwd.getpwuid(os.geteuid())
+        uid, gid, mode = pw.pw_uid, pw.pw_gid, 0o600
+        try:
+            gid = grp.getgrnam("crontab").gr_gid
+        except KeyError:
+            pass
+
+    spool_dir = os.path.dirname(spool_path)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=".restart_scheduler.", dir=spool_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fchmod(f.fileno(), mode)
+            if os.geteuid() == 0:
+                os.fchown(f.fileno(), uid, gid)
+            os.fsync(f.fileno())
+        os.replace(tmp_path, spool_path)
+        tmp_path = None
+        return True
+    except OSError as e:
+        print(f"{FAIL}Error writing crontab spool file: {e}{ENDC}")
+        return False
+    finally:
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+def get_current_crontab():
+    """Gets the current user's crontab content."""
+    if use_spool_backend():
+        return read_crontab_spool()
+    try:
+        result = subprocess.run(['crontab', '-l'], capture_output=True, text=True, check=False)
+        if result.returncode == 0:
+            return result.stdout
+        elif "no crontab for" in result.stderr.lower() or result.stdout == "":
+            return ""
+        else:
+            # Only print warning if stderr has content beyond "no crontab for"
+            if result.stderr and "no crontab for" not in result.stderr.lower():
+                 print(f"{WARNING}Warning while reading crontab: {result.stderr.strip()}{ENDC}")
+            return ""
+    except FileNotFoundError:
+        print(f"{FAIL}Command 'crontab' not found. Is it installed?{ENDC}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"{FAIL}Unknown error while reading crontab: {e}{ENDC}")
+        sys.exit(1)
+
+def set_crontab(content):
+    """Sets the user's crontab content."""
+    if use_spool_backend():
+        return write_crontab_spool(content)
+    if not content.strip():
+        try:
+            subprocess.run(['crontab', '-r'], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return True
+        except subprocess.CalledProcessError as e:
+            # If 'no crontab for' is the error, it's effectively cleared/empty.
+            if e.stderr and "no crontab for" not in e.stderr.decode().lower():
+                print(f"{FAIL}Error trying to clear crontab (it might have been already empty): {e.stderr.decode().strip()}{ENDC}")
+                # return False # Still, the state is 'empty', so perhaps true is better.
+            return True # Treat as success if crontab is now effectively empty.
+    try:
+        process = subprocess.Popen(['crontab', '-'], stdin=subprocess.PIPE, text=True, encoding='utf-8')
+        stdout, stderr = process.communicate(input=content)
+        if process.returncode == 0:
+            return True
+        else:
+            print(f"{FAIL}Error setting crontab: {stderr or stdout or 'Unknown error'}{ENDC}")
+            return False
+    except FileNotFoundError:
+        print(f"{FAIL}Command 'crontab' not found. Is it installed?{ENDC}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"{FAIL}Unknown error while setting crontab: {e}{ENDC}")
+        sys.exit(1)
+
+_crontab_lock_fd = None
+_crontab_lock_depth = 0
+
+def open_lock_file(lock_path):
+    """Opens (creating) a lock file, in the temp directory when lock_path's directory is missing."""
+    if not os.path.isdir(os.path.dirname(lock_path)):
+        lock_path = os.path.join(tempfile.gettempdir(), os.path.basename(lock_path))
+    return os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+def acquire_crontab_lock():
+    """Takes the exclusive crontab lock (flock) so parallel invocations serialize their edits.
+    Re-entrant within one process.
+    """
+    global _crontab_lock_fd, _crontab_lock_depth
+    if _crontab_lock_depth == 0:
+        fd = open_lock_file(CRON_LOCK_PATH)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError:
+            os.close(fd)
+            raise
+        _crontab_lock_fd = fd
+    _crontab_lock_depth += 1
+
+def release_crontab_lock():
+    """Releases one level of the crontab lock taken by acquire_crontab_lock()."""
+    global _crontab_lock_fd, _crontab_lock_depth
+    _crontab_lock_depth -= 1
+    if _crontab_lock_depth == 0 and _crontab_lock_fd is not None:
+        fcntl.flock(_crontab_lock_fd, fcntl.LOCK_UN)
+        os.close(_crontab_lock_fd)
+        _crontab_lock_fd = None
+
+def join_crontab_lines(lines):
+    """Joins crontab lines back into file content (empty content means 'no crontab')."""
+    return "\n".join(lines) + "\n" if lines else ""
+
+def _find_line_start(content, marker, start=0):
+    """Offset of the first line starting with marker at or after start, or -1 (one C-level scan)."""
+    at = content.find(marker, start)
+    while at > 0 and content[at - 1] != "\n":
+        at = content.find(marker, at + 1)
+    return at
+
+def _find_line_start_bytes(buf, marker, start=0):
+    """_find_line_start for bytes and mmaps: searches for newline + marker, so a marker quoted
+    later in a line never matches; a marker at offset 0 is the only one without a newline.
+    """
+    if start == 0 and buf[:len(marker)] == marker:
+        return 0
+    at = buf.find(b"\n" + marker, max(0, start - 1))
+    return at if at == -1 else at + 1
+
+def find_managed_block(content):
+    """Locates the managed block in crontab content.
+    Returns (start, body_start, body_end, end) offsets, or None when there is no block.
+    content[start:end] is the whole block including markers, content[body_start:body_end] its jobs.
+    """
+    start = _find_line_start(content, MANAGED_BLOCK_BEGIN)
+    if start == -1:
+        return None
+    body_start = content.find("\n", start)
+    body_start = len(content) if body_start == -1 else body_start + 1
+    body_end = _find_line_start(content, MANAGED_BLOCK_END, body_start)
+    if body_end == -1: # unterminated block (hand edit): it runs to the end
+        return start, body_start, len(content), len(content)
+    end = content.find("\n", body_end)
+    return start, body_start, body_end, len(content) if end == -1 else end + 1
+
+def _strip_legacy_jobs(text):
+    """Drops CRON_COMMENT lines outside the block (written by older versions or moved by hand)."""
+    kept = [line for line in text.splitlines() if CRON_COMMENT not in line]
+    return join_crontab_lines(kept)
+
+def read_managed_lines(content):
+    """Returns the script's job lines: the managed block body, else legacy tagged lines."""
+    block = find_managed_block(content)
+    if block:
+        return [line for line in content[block[1]:block[2]].splitlines() if line.strip()]
+    if CRON_COMMENT not in content:
+        return []
+    return [line for line in content.splitlines() if CRON_COMMENT in line and line.strip()]
+
+def splice_managed_block(content, job_lines):
+    """Returns content with the managed block replaced by job_lines (removed when empty).
+    The surrounding text is reused as-is; only stray legacy lines trigger a line-level pass.
+    """
+    block = find_managed_block(content)
+    if block:
+        before, after = content[:block[0]], content[block[3]:]
+    else:
+        before, after = content, ""
+    if CRON_COMMENT in before:
+        before = _strip_legacy_jobs(before)
+    if CRON_COMMENT in after:
+        after = _strip_legacy_jobs(after)
+    if before and not before.endswith("\n"):
+        before += "\n"
+    new_block = ""
+    if job_lines:
+        new_block = MANAGED_BLOCK_BEGIN + "\n" + "".join(line + "\n" for line in job_lines) + MANAGED_BLOCK_END + "\n"
+    return before + new_block + after
+
+class CrontabTransaction:
+    """Holds the crontab lock, reads the crontab once and writes it back at most once.
+
+    with CrontabTransaction() as txn:
+        txn.managed_lines = [...]    # or edit txn.content directly
+        txn.commit()
+
+    commit() is a no-op when the edited content equals what was read.
+    """
+
+    def __enter__(self):
+        acquire_crontab_lock()
+        try:
+            self.original = get_current_crontab()
+        except BaseException:
+            release_crontab_lock()
+            raise
+        self.content = self.original
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        release_crontab_lock()
+        return False
+
+    @property
+    def lines(self):
+        return self.content.splitlines()
+
+    @lines.setter
+    def lines(self, lines):
+        self.content = join_crontab_lines(lines)
+
+    @property
+    def managed_lines(self):
+        return read_managed_lines(self.content)
+
+    @managed_lines.setter
+    def managed_lines(self, job_lines):
+        self.content = splice_managed_block(self.content, job_lines)
+
+    @property
+    def changed(self):
+        return self.content != self.original
+
+    def commit(self):
+        """Writes the edited crontab if it changed. Returns True on success."""
+        new_content = self.content
+        if new_content == self.original:
+            return True
+        if set_crontab(new_content):
+            self.original = new_content
+            return True
+        return False
+
+def remove_all_script_cron_jobs(inform_user=True):
+    """Removes all cron jobs previously set by this script.
+    Returns:
+        - Number of jobs actually removed (>=0) on success.
+        - -1 on failure to set/modify crontab.
+    """
+    with CrontabTransaction() as txn:
+        num_jobs_found = len(txn.managed_lines)
+
+        # Also drops an empty block or stray legacy lines; if nothing else remains, maps to crontab -r
+        txn.managed_lines = []
+        if num_jobs_found == 0:
+            if txn.changed:
+                txn.commit()
+            if inform_user:
+                print(f"{OKBLUE}ℹ️ No restart tasks set by this script were found in crontab.{ENDC}")
+            return 0 # 0 jobs existed, 0 removed, operation successful
+
+        if txn.commit():
+            if inform_user:
+                print(f"{OKGREEN}✅ Successfully cleared {num_jobs_found} previously set restart task(s) from crontab.{ENDC}")
+            return num_jobs_found # Number of jobs removed
+        else:
+            if inform_user:
+                # set_crontab would have printed specific errors
+                print(f"{FAIL}⚠️ Failed to update crontab to remove tasks.{ENDC}")
+            return -1 # Indicates failure
+
+def resolve_reboot_command():
+    """Returns the command that reboots this machine (reboot, else 'shutdown -r now'), or None."""
+    reboot_paths = ["/sbin/reboot", "/usr/sbin/reboot", "/bin/reboot", "/usr/bin/reboot"]
+    reboot_command_to_use = None
+    for path in reboot_paths:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            reboot_command_to_use = path
+            break
+
+    if not reboot_command_to_use:
+        shutdown_paths = ["/sbin/shutdown", "/usr/sbin/shutdown", "/bin/shutdown", "/usr/bin/shutdown"]
+        shutdown_command_base = None
+        for path in shutdown_paths:
+            if os.path.exists(path) and os.access(path, os.X_OK):
+                shutdown_command_base = path
+                break
+        if shutdown_command_base:
+            reboot_command_to_use = f"{shutdown_command_base} -r now"
+    return reboot_command_to_use
+
+def get_script_invocation():
+    """Returns the absolute command line that runs this script (used in scheduled jobs)."""
+    script_path = os.path.abspath(sys.argv[0] if sys.argv and sys.argv[0] and os.path.exists(sys.argv[0]) else __file__)
+    if os.access(script_path, os.X_OK) and not script_path.endswith('.py'):
+        return shlex.quote(script_path)
+    return f"{shlex.quote(sys.executable)} {shlex.quote(script_path)}"
+
+def format_script_cron_job(schedule_expression, command, job_id, job_description):
+    """Builds the crontab line for a job: '<schedule> <command> #tag [<id>] (<description>)'."""
+    return f"{schedule_expression} {command} {CRON_COMMENT} [{job_id}] ({job_description})"
+
+def add_cron_job(schedule_expression, job_description, job_id=DEFAULT_JOB_ID):
+    """Sets the restart job with job_id in a single crontab read/write: an existing job with that
+    id is replaced in place, the script's other jobs are kept, and a new id is appended.
+    The job runs this script's 'gate' command, which reboots once the host is quiet.
+    Returns True on success.
+    """
+    if not resolve_reboot_command():
+        print(f"{FAIL}⚠️ No valid command for restart (reboot or shutdown) found. Please check the correct path.{ENDC}")
+        print(f"{FAIL}Cannot set restart task.{ENDC}")
+        return False
+
+    new_job = format_script_cron_job(schedule_expression, f"{get_script_invocation()} gate", job_id, job_description)
+
+    with CrontabTransaction() as txn:
+        job_lines, replaced = [], False
+        for line in txn.managed_lines:
+            if parse_script_cron_job(line)["id"] != job_id:
+                job_lines.append(line)
+            elif not replaced:
+                # duplicates of the id (hand edits, legacy untagged lines) collapse into the new job
+                job_lines.append(new_job)
+                replaced = True
+        if not replaced:
+            job_lines.append(new_job)
+        txn.managed_lines = job_lines
+        committed = txn.commit()
+
+    if committed:
+        print(f"{OKGREEN}✅ Restart task successfully set for '{job_description}'.{ENDC}")
+        print(f"   Cron schedule: {BOLD}{schedule_expression}{ENDC}")
+        stage_reboot_strategy()
+    else:
+        print(f"{FAIL}⚠️ Error setting new crontab task.{ENDC}")
+    return committed
+
+def read_managed_lines_from_spool(path=None):
+    """Reads only the managed block of the spool file (default: the current user's): the file is
+    mmapped and searched for the markers, and only the block is decoded. Falls back to a full read
+    for legacy crontabs.
+    """
+    try:
+        with open(path or get_crontab_spool_path(), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                begin = _find_line_start_bytes(mm, MANAGED_BLOCK_BEGIN.encode())
+                if begin == -1:
+                    if mm.find(CRON_COMMENT.encode()) == -1:
+                        return []
+                    return read_managed_lines(mm[:].decode('utf-8', 'replace'))
+                body_start = mm.find(b"\n", begin)
+                if body_start == -1:
+                    return []
+                end = _find_line_start_bytes(mm, MANAGED_BLOCK_END.encode(), body_start + 1)
+                block = mm[begin:end if end != -1 else len(mm)].decode('utf-8', 'replace')
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        print(f"{FAIL}Error reading crontab spool file: {e}{ENDC}")
+        sys.exit(1)
+    return [line for line in block.splitlines()[1:] if line.strip()]
+
+def get_script_cron_jobs():
+    """Gets cron jobs set by this script."""
+    if use_spool_backend():
+        return read_managed_lines_from_spool()
+    return read_managed_lines(get_current_crontab())
+
+SCRIPT_JOB_ID_RE = re.compile(r'\s*\[([\w.@-]+)\]')
+
+def parse_script_cron_job(line):
+    """Splits a crontab line written by this script into id, schedule, command and description."""
+    match_desc = re.search(r'\(([^)]+)\)$', line)
+    description = match_desc.group(1) if match_desc else "No description"
+    cron_part, _, tag_part = line.partition(CRON_COMMENT)
+    cron_part = cron_part.strip()
+    match_id = SCRIPT_JOB_ID_RE.match(tag_part)
+    fields = cron_part.split()
+    # @daily style macros take one field, regular expressions five
+    n_schedule_fields = 1 if fields and fields[0].startswith('@') else 5
+    return {
+        "id": match_id.group(1) if match_id else DEFAULT_JOB_ID,
+        "schedule": " ".join(fields[:n_schedule_fields]),
+        "command": " ".join(fields[n_schedule_fields:]),
+        "description": description,
+    }
+
+# ---------------------------------------------------------------------------
+# Cron expression engine: compiles schedules to bitsets and enumerates fire times
+# ---------------------------------------------------------------------------
+
+class CronError(ValueError):
+    """Raised for cron expressions that cannot be compiled."""
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *", "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0", "@daily": "0 0 * * *", "@midnight": "0 0 * * *", "@hourly": "0 * * * *",
+}
+CRON_MONTH_NAMES = {name: i for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+CRON_DOW_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+# (name, lowest value, highest value, symbolic names); day of week accepts 7 as Sunday
+CRON_FIELD_SPECS = [
+    ("minute", 0, 59, {}), ("hour", 0, 23, {}), ("day of month", 1, 31, {}),
+    ("month", 1, 12, CRON_MONTH_NAMES), ("day of week", 0, 7, CRON_DOW_NAMES),
+]
+
+# Compiled schedule. Masks are integers with bit N set when value N matches.
+# day_minutes is the sorted tuple of minute-of-day offsets (hour * 60 + minute) that fire.
+CronSchedule = collections.namedtuple("CronSchedule", [
+    "expression", "minute_mask", "hour_mask", "dom_mask", "month_mask", "dow_mask",
+    "dom_star", "dow_star", "day_minutes", "at_reboot",
+])
+
+def _parse_cron_value(text, names, field_name):
+    value = names.get(text.lower()) if names else None
+    if value is None:
+        if not text.isdigit():
+            raise CronError(f"invalid {field_name} value '{text}'")
+        value = int(text)
+    return value
+
+def _parse_cron_field(text, field_name, low, high, names):
+    """Parses one cron field (lists, ranges, */N and a-b/N steps) into a bitmask."""
+    mask = 0
+    for part in text.split(','):
+        base, has_step, step_text = part.partition('/')
+        step = 1
+        if has_step:
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"invalid step in {field_name} field '{part}'")
+            step = int(step_text)
+        if base == '*':
+            start, end = low, high
+        elif '-' in base:
+            start_text, _, end_text = base.partition('-')
+            start = _parse_cron_value(start_text, names, field_name)
+            end = _parse_cron_value(end_text, names, field_name)
+        else:
+            start = _parse_cron_value(base, names, field_name)
+            end = high if has_step else start
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise CronError(f"{field_name} field '{part}' is outside {low}-{high}")
+        for value in range(start, end + 1, step):
+            mask |= 1 << value
+    return mask
+
+@functools.lru_cache(maxsize=4096)
+def compile_cron_expression(expression):
+    """Compiles a cron schedule ('M H DOM MON DOW' or an @macro) into a CronSchedule."""
+    text = " ".join(expression.split())
+    if text == "@reboot":
+        return CronSchedule(text, 0, 0, 0, 0, 0, True, True, (), True)
+    fields = CRON_MACROS.get(text.lower(), text).split()
+    if len(fields) != 5:
+        raise CronError(f"expected 5 fields in '{expression}', got {len(fields)}")
+    masks = [_parse_cron_field(field, *spec) for field, spec in zip(fields, CRON_FIELD_SPECS)]
+    minute_mask, hour_mask, dom_mask, month_mask, dow_mask = masks
+    if dow_mask & (1 << 7):
+        dow_mask = (dow_mask | 1) & ~(1 << 7)
+    day_minutes = tuple(h * 60 + m for h in range(24) if hour_mask >> h & 1
+                        for m in range(60) if minute_mask >> m & 1)
+    # Like Vixie cron: a day-of-month or day-of-week field starting with '*' does not restrict
+    # on its own, and when both are restricted a day matches if EITHER field matches.
+    return CronSchedule(text, minute_mask, hour_mask, dom_mask, month_mask, dow_mask,
+                        fields[2].startswith('*'), fields[4].startswith('*'), day_minutes, False)
+
+@functools.lru_cache(maxsize=8192)
+def _cron_days_in_year(dom_mask, month_mask, dow_mask, dom_star, dow_star, year):
+    days = []
+    either = not (dom_star or dow_star)
+    for month in range(1, 13):
+        if not month_mask >> month & 1:
+            continue
+        first_ordinal = datetime.date(year, month, 1).toordinal()
+        first_dow = first_ordinal % 7 # date.fromordinal(1) is a Monday, so ordinal % 7 is cron's 0=Sunday
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            dom_ok = dom_mask >> day & 1
+            dow_ok = dow_mask >> ((first_dow + day - 1) % 7) & 1
+            if (dom_ok or dow_ok) if either else (dom_ok and dow_ok):
+                days.append(first_ordinal + day - 1)
+    return tuple(days)
+
+def cron_days_in_year(schedule, year):
+    """Returns the sorted date ordinals in year on which schedule fires.
+    Cached on the day-level fields only, so schedules differing in hour/minute share the work.
+    """
+    return _cron_days_in_year(schedule.dom_mask, schedule.month_mask, schedule.dow_mask,
+                              schedule.dom_star, schedule.dow_star, year)
+
+def iter_cron_fire_times(schedule, after):
+    """Yields the fire times of schedule strictly after the datetime 'after', in order.
+    Whole non-matching months and days are skipped through the per-year day table.
+    """
+    if isinstance(schedule, str):
+        schedule = compile_cron_expression(schedule)
+    if schedule.at_reboot or not schedule.day_minutes:
+        return
+    start = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    start_ordinal = start.toordinal()
+    start_minute = start.hour * 60 + start.minute
+    day_minutes = schedule.day_minutes
+    year = start.year
+    empty_years = 0
+    # Day-of-month/weekday/leap-day combinations repeat every 28 years; stop after that if nothing fires
+    while empty_years <= 28 and year <= datetime.MAXYEAR:
+        days = cron_days_in_year(schedule, year)
+        found = False
+        for ordinal in days[bisect.bisect_left(days, start_ordinal):]:
+            first = bisect.bisect_left(day_minutes, start_minute) if ordinal == start_ordinal else 0
+            if first == len(day_minutes):
+                continue
+            found = True
+            day = datetime.date.fromordinal(ordinal)
+            for offset in day_minutes[first:]:
+                yield datetime.datetime(day.year, day.month, day.day, offset // 60, offset % 60)
+        empty_years = 0 if found else empty_years + 1
+        year += 1
+
+def next_cron_fire_times(schedule, count, after=None):
+    """Returns the next count fire times of schedule (expression or CronSchedule) after 'after' (default now)."""
+    if after is None:
+        after = datetime.datetime.now()
+    fire_times = []
+    for fire_time in iter_cron_fire_times(schedule, after):
+        fire_times.append(fire_time)
+        if len(fire_times) >= count:
+            break
+    return fire_times
+
+def expand_cron_fire_minutes(schedule, start, end):
+    """Returns every fire time of schedule in [start, end) as minute indexes
+    (date ordinal * 1440 + minute of day), which is much cheaper than building datetimes
+    when expanding long ranges for many schedules.
+    """
+    if isinstance(schedule, str):
+        schedule = compile_cron_expression(schedule)
+    if schedule.at_reboot or not schedule.day_minutes:
+        return []
+    start_index = start.toordinal() * 1440 + start.hour * 60 + start.minute + (1 if start.second or start.microsecond else 0)
+    end_index = end.toordinal() * 1440 + end.hour * 60 + end.minute + (1 if end.second or end.microsecond else 0)
+    first_ordinal, last_ordinal = start.toordinal(), end.toordinal()
+    day_minutes = schedule.day_minutes
+    result = []
+    for year in range(start.year, end.year + 1):
+        days = cron_days_in_year(schedule, year)
+        days = days[bisect.bisect_left(days, first_ordinal):bisect.bisect_right(days, last_ordinal)]
+        result.extend([ordinal * 1440 + offset for ordinal in days for offset in day_minutes])
+    return result[bisect.bisect_left(result, start_index):bisect.bisect_left(result, end_index)]
+
+def minute_index_to_datetime(index):
+    """Converts a minute index from expand_cron_fire_minutes() back to a datetime."""
+    day = datetime.date.fromordinal(index // 1440)
+    return datetime.datetime(day.year, day.month, day.day, index % 1440 // 60, index % 60)
+
+# ---------------------------------------------------------------------------
+# Scheduling backends: crontab or systemd timers
+# ---------------------------------------------------------------------------
+
+def scheduled_action(job, gate_arguments="gate"):
+    """Arguments the scheduled command passes to this script: the reboot gate, or
+    'restart-services GROUP' for jobs that only restart services.
+    """
+    if not job.get("services"):
+        return gate_arguments
+    arguments = f"restart-services {shlex.quote(job['services'])}"
+    if job.get("services_file"):
+        arguments += f" -f {shlex.quote(job['services_file'])}"
+    return arguments
+
+def diff_jobs(current, desired):
+    """Compares {job id: installed form} with {job id: desired form}.
+    Returns {"added", "changed", "removed", "unchanged"} id lists (desired order, then removals).
+    """
+    diff = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for job_id, wanted in desired.items():
+        if job_id not in current:
+            diff["added"].append(job_id)
+        elif current[job_id] != wanted:
+            diff["changed"].append(job_id)
+        else:
+            diff["unchanged"].append(job_id)
+    diff["removed"] = [job_id for job_id in current if job_id not in desired]
+    return diff
+
+def diff_has_changes(diff):
+    return bool(diff["added"] or diff["changed"] or diff["removed"])
+
+class CronBackend:
+    """Schedules restarts as crontab lines tagged with CRON_COMMENT."""
+
+    name = "cron"
+
+    def list_jobs(self):
+        return [parse_script_cron_job(line) for line in get_script_cron_jobs()]
+
+    def job_command(self, job):
+        return f"{get_script_invocation()} {scheduled_action(job)}"
+
+    def reconcile_jobs(self, desired, dry_run=False):
+        """Makes the managed block hold exactly the desired jobs, with one crontab read and
+        no write at all when it already does. Returns the diff plus "written" (and "error").
+        """
+        wanted = {job["id"]: format_script_cron_job(" ".join(job["schedule"].split()), self.job_command(job),
+                                                    job["id"], job["description"])
+                  for job in desired}
+        with CrontabTransaction() as txn:
+            installed = txn.managed_lines
+            current = {parse_script_cron_job(line)["id"]: line for line in installed}
+            diff = diff_jobs(current, wanted)
+            # duplicate ids (hand edits, legacy lines) also need a rewrite
+            needs_write = diff_has_changes(diff) or len(current) != len(installed)
+            diff["written"] = False
+            if needs_write and not dry_run:
+                txn.managed_lines = list(wanted.values())
+                diff["written"] = txn.commit()
+                if not diff["written"]:
+                    diff["error"] = "could not write the crontab"
+        return diff
+
+    def install_job(self, schedule_expression, job_description, jitter=None, name=DEFAULT_JOB_ID):
+        if jitter:
+            print(f"{WARNING}Jitter is only supported by the systemd backend; ignoring it.{ENDC}")
+        return add_cron_job(schedule_expression, job_description, job_id=name)
+
+    def remove_all_jobs(self, inform_user=True):
+        return remove_all_script_cron_jobs(inform_user)
+
+    def next_runs(self, job, count):
+        return next_cron_fire_times(job["schedule"], count)
+
+SYSTEMD_UNIT_PREFIX = "restart-scheduler-"
+SYSTEMD_DOW_NAMES = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+
+def _mask_values(mask, low, high):
+    return [value for value in range(low, high + 1) if mask >> value & 1]
+
+def _calendar_component(mask, low, high, width=1):
+    values = _mask_values(mask, low, high)
+    if len(values) == high - low + 1:
+        return "*"
+    return ",".join(f"{value:0{width}d}" for value in values)
+
+def cron_to_on_calendar(schedule_expression):
+    """Translates a cron schedule to the equivalent systemd OnCalendar= expressions.
+    Both restricted day-of-month and day-of-week (cron OR semantics) need two expressions,
+    which a timer unions.
+    """
+    compiled = compile_cron_expression(schedule_expression)
+    if compiled.at_reboot:
+        raise CronError("@reboot cannot be expressed as a calendar timer")
+    time_part = f"{_calendar_component(compiled.hour_mask, 0, 23, 2)}:{_calendar_component(compiled.minute_mask, 0, 59, 2)}:00"
+    months = _calendar_component(compiled.month_mask, 1, 12, 2)
+    days = _calendar_component(compiled.dom_mask, 1, 31, 2)
+    weekdays = _calendar_component(compiled.dow_mask, 0, 6)
+    if weekdays != "*":
+        weekdays = ",".join(SYSTEMD_DOW_NAMES[int(d)] for d in weekdays.split(','))
+    if compiled.dom_star or compiled.dow_star:
+        prefix = "" if weekdays == "*" else f"{weekdays} "
+        return [f"{prefix}*-{months}-{days} {time_part}"]
+    return [f"{weekdays} *-{months}-* {time_part}", f"*-{months}-{days} {time_part}"]
+
+def write_file_if_changed(path, content, mode=0o644):
+    """Atomically writes content to path (temp file + rename) unless it already holds it. Returns True if written."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    fd, tmp_path = tempfile.mkstemp(prefix=".restart_scheduler.", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            os.fchmod(f.fileno(), mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+def run_systemctl(*args, timeout=None):
+    """Runs SYSTEMCTL with args as an argv list (no shell), capturing its output.
+    Returns the CompletedProcess; returncode is None when timeout passed, 127 when systemctl is missing.
+    """
+    argv = shlex.split(SYSTEMCTL) + list(args)
+    try:
+        return subprocess.run(argv, capture_output=True, text=True, check=False, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(argv, None, "", f"timed out after {timeout}s")
+    except FileNotFoundError as e:
+        return subprocess.CompletedProcess(argv, 127, "", str(e))
+
+class SystemdTimerBackend:
+    """Schedules restarts as restart-scheduler-<name>.timer/.service units.
+
+    Timers get OnCalendar= from the cron schedule, RandomizedDelaySec= to spread a fleet,
+    plus Persistent= and AccuracySec= from the [systemd] config section.
+    """
+
+    name = "systemd"
+
+    def __init__(self, unit_dir=None, systemctl=None):
+        self.unit_dir = unit_dir or SYSTEMD_UNIT_DIR
+        self.systemctl = shlex.split(systemctl or SYSTEMCTL)
+
+    def _run(self, *args):
+        try:
+            return subprocess.run(self.systemctl + list(args), capture_output=True, text=True, check=False)
+        except FileNotFoundError:
+            print(f"{FAIL}Command '{self.systemctl[0]}' not found. Is systemd installed?{ENDC}")
+            sys.exit(1)
+
+    def _timer_paths(self):
+        try:
+            names = sorted(os.listdir(self.unit_dir))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.unit_dir, n) for n in names if n.startswith(SYSTEMD_UNIT_PREFIX) and n.endswith(".timer")]
+
+    def list_jobs(self):
+        jobs = []
+        for path in self._timer_paths():
+            unit = os.path.basename(path)
+            job = {"id": unit[len(SYSTEMD_UNIT_PREFIX):-len(".timer")], "schedule": "", "command": "",
+                   "description": "No description", "unit": unit}
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith("# schedule: "):
+                        job["schedule"] = line[len("# schedule: "):].strip()
+                    elif line.startswith("Description="):
+                        job["description"] = line.split("=", 1)[1].strip().replace("restart_scheduler: ", "", 1)
+            try:
+                with open(path[:-len(".timer")] + ".service", 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.startswith("ExecStart="):
+                            job["command"] = line.split("=", 1)[1].strip()
+            except OSError:
+                pass
+            jobs.append(job)
+        return jobs
+
+    def job_command(self, job):
+        return f"{get_script_invocation()} {scheduled_action(job, 'gate --trigger systemd')}"
+
+    def _unit_paths(self, job_id):
+        base = os.path.join(self.unit_dir, f"{SYSTEMD_UNIT_PREFIX}{job_id}")
+        return base + ".timer", base + ".service"
+
+    def render_units(self, job):
+        """Returns (timer, service) unit file contents for a job dict (id, schedule, description, jitter)."""
+        name, schedule_expression, job_description = job["id"], " ".join(job["schedule"].split()), job["description"]
+        jitter = job.get("jitter")
+        if jitter is None:
+            jitter = get_config_option("systemd", "randomized_delay", 0, int)
+        persistent = get_config_option("systemd", "persistent", "false")
+        accuracy = get_config_option("systemd", "accuracy", "1s")
+        header = f"# Managed by restart_scheduler, do not edit.\n# schedule: {schedule_expression}\n"
+        unit = f"[Unit]\nDescription=restart_scheduler: {job_description}\n"
+        calendars = "".join(f"OnCalendar={c}\n" for c in cron_to_on_calendar(schedule_expression))
+        timer = (f"{header}{unit}\n[Timer]\n{calendars}RandomizedDelaySec={jitter}\n"
+                 f"AccuracySec={accuracy}\nPersistent={persistent}\nUnit={SYSTEMD_UNIT_PREFIX}{name}.service\n\n"
+                 f"[Install]\nWantedBy=timers.target\n")
+        service = f"{header}{unit}\n[Service]\nType=oneshot\nExecStart={self.job_command(job)}\n"
+        return timer, service
+
+    def _read_units(self, job_id):
+        contents = []
+        for path in self._unit_paths(job_id):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    contents.append(f.read())
+            except OSError:
+                contents.append(None)
+        return tuple(contents)
+
+    def reconcile_jobs(self, desired, dry_run=False, prune=True):
+        """Makes the installed timers match the desired jobs: only added or changed units are
+        written, followed by one daemon-reload. Nothing is written or reloaded when they match.
+        With prune=False, timers of jobs that are not in desired are left alone.
+        Returns the diff plus "written" (and "error"). Raises CronError for untranslatable schedules.
+        """
+        wanted = {job["id"]: self.render_units(job) for job in desired}
+        current = {os.path.basename(p)[len(SYSTEMD_UNIT_PREFIX):-len(".timer")]: None for p in self._timer_paths()}
+        if not prune:
+            current = {job_id: None for job_id in current if job_id in wanted}
+        for job_id in current:
+            current[job_id] = self._read_units(job_id)
+        diff = diff_jobs(current, wanted)
+        diff["written"] = False
+        if dry_run or not diff_has_changes(diff):
+            return diff
+        try:
+            if diff["removed"]:
+                self._remove_units([self._unit_paths(job_id)[0] for job_id in diff["removed"]])
+            for job_id in diff["added"] + diff["changed"]:
+                for path, content in zip(self._unit_paths(job_id), wanted[job_id]):
+                    write_file_if_changed(path, content)
+        except OSError as e:
+            diff["error"] = f"error writing timer units: {e}"
+            return diff
+        ok = self._run("daemon-reload").returncode == 0
+        timers = lambda ids: [f"{SYSTEMD_UNIT_PREFIX}{job_id}.timer" for job_id in ids]
+        if ok and diff["added"]:
+            ok = self._run("enable", "--now", *timers(diff["added"])).returncode == 0
+        if ok and diff["changed"]:
+            ok = self._run("restart", *timers(diff["changed"])).returncode == 0
+        diff["written"] = True
+        if not ok:
+            diff["error"] = "systemctl failed to activate the timers"
+        return diff
+
+    def install_job(self, schedule_expression, job_description, jitter=None, name=DEFAULT_JOB_ID):
+        if not resolve_reboot_command():
+            print(f"{FAIL}⚠️ No valid command for restart (reboot or shutdown) found. Please check the correct path.{ENDC}")
+            return False
+        timer_unit = f"{SYSTEMD_UNIT_PREFIX}{name}.timer"
+        try:
+            diff = self.reconcile_jobs([{"id": name, "schedule": schedule_expression,
+                                         "description": job_description, "jitter": jitter}], prune=False)
+        except CronError as e:
+            print(f"{FAIL}⚠️ Cannot convert schedule to a systemd timer: {e}{ENDC}")
+            return False
+        ok = "error" not in diff
+        if ok:
+            print(f"{OKGREEN}✅ Restart timer {timer_unit} set for '{job_description}'.{ENDC}")
+            print(f"   OnCalendar: {BOLD}{'; '.join(cron_to_on_calendar(schedule_expression))}{ENDC}")
+            stage_reboot_strategy()
+        else:
+            print(f"{FAIL}⚠️ Could not activate {timer_unit}: {diff['error']}.{ENDC}")
+        return ok
+
+    def _remove_units(self, timer_paths):
+        self._run("disable", "--now", *[os.path.basename(p) for p in timer_paths])
+        for path in timer_paths:
+            for unit_path in (path, path[:-len(".timer")] + ".service"):
+                try:
+                    os.unlink(unit_path)
+                except FileNotFoundError:
+                    pass
+
+    def remove_all_jobs(self, inform_user=True):
+        timer_paths = self._timer_paths()
+        if not timer_paths:
+            if inform_user:
+                print(f"{OKBLUE}ℹ️ No restart timers set by this script were found.{ENDC}")
+            return 0
+        try:
+            self._remove_units(timer_paths)
+        except OSError as e:
+            if inform_user:
+                print(f"{FAIL}⚠️ Failed to remove timer units: {e}{ENDC}")
+            return -1
+        self._run("daemon-reload")
+        if inform_user:
+            print(f"{OKGREEN}✅ Successfully removed {len(timer_paths)} restart timer(s).{ENDC}")
+        return len(timer_paths)
+
+    def next_elapse(self, unit):
+        """The timer's own next elapse time (includes the randomized delay), or None."""
+        result = self._run("show", "--timestamp=unix", "-p", "NextElapseUSecRealtime", "--value", unit)
+        value = result.stdout.strip() if result.returncode == 0 else ""
+        if value.startswith('@'):
+            try:
+                return datetime.datetime.fromtimestamp(int(value[1:]))
+            except ValueError:
+                return None
+        for fmt in ("%a %Y-%m-%d %H:%M:%S %Z", "%a %Y-%m-%d %H:%M:%S"):
+            try:
+                return datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+
+    def next_runs(self, job, count):
+        upcoming = next_cron_fire_times(job["schedule"], count)
+        elapse = self.next_elapse(job["unit"]) if "unit" in job else None
+        if elapse and upcoming:
+            upcoming[0] = elapse
+        return upcoming
+
+def get_scheduler_backend():
+    """Returns the configured scheduling backend (RESTART_SCHEDULER_BACKEND, else [scheduler] backend, else auto)."""
+    choice = (SCHEDULER_BACKEND or get_config_option("scheduler", "backend", "auto")).strip().lower()
+    if choice == "auto":
+        choice = "cron" if crontab_installed() or not os.path.isdir("/run/systemd/system") else "systemd"
+    return SystemdTimerBackend() if choice == "systemd" else CronBackend()
+
+# ---------------------------------------------------------------------------
+# Declarative desired state: named schedules reconciled against the backend
+# ---------------------------------------------------------------------------
+
+SCHEDULE_SECTION_PREFIX = "schedule "
+JOB_ID_RE = re.compile(r'[\w.@-]+')
+
+def build_schedule_from_options(options, where):
+    """Turns one [schedule NAME] section (cron / daily / interval+start / every_days+at) into (schedule, description)."""
+    def time_option(key, default="00:00"):
+        parsed = parse_time_string(options.get(key, default))
+        if not parsed:
+            raise ValueError(f"{where}: invalid {key} '{options.get(key)}', expected HH:MM")
+        return parsed
+
+    def int_option(key, low, high=None):
+        try:
+            value = int(options[key])
+        except ValueError:
+            value = low - 1
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"{where}: {key} must be {low}-{high}" if high else f"{where}: {key} must be >= {low}")
+        return value
+
+    if "cron" in options:
+        schedule = " ".join(options["cron"].split())
+        try:
+            compile_cron_expression(schedule)
+        except CronError as e:
+            raise ValueError(f"{where}: {e}")
+        return schedule, f"Cron {schedule}"
+    if "daily" in options:
+        return build_daily_schedule(*time_option("daily"))
+    if "interval" in options:
+        return build_interval_schedule(int_option("interval", 1, 24), *time_option("start"))
+    if "every_days" in options:
+        return build_every_few_days_schedule(int_option("every_days", 1), *time_option("at"))
+    raise ValueError(f"{where}: needs one of cron, daily, interval or every_days")
+
+def load_desired_schedules(path):
+    """Reads the [schedule NAME] sections of a desired-state file into job dicts, in file order."""
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        if not parser.read(path, encoding='utf-8'):
+            raise ValueError(f"cannot read {path}")
+    except configparser.Error as e:
+        raise ValueError(f"{path}: {e}")
+    jobs = []
+    for section in parser.sections():
+        if not section.startswith(SCHEDULE_SECTION_PREFIX):
+            continue
+        job_id = section[len(SCHEDULE_SECTION_PREFIX):].strip()
+        where = f"{path} [{section}]"
+        if not JOB_ID_RE.fullmatch(job_id):
+            raise ValueError(f"{where}: schedule names may only use letters, digits and . @ - _")
+        options = parser[section]
+        schedule, description = build_schedule_from_options(options, where)
+        job = {"id": job_id, "schedule": schedule, "description": options.get("description", description)}
+        if options.get("jitter"):
+            job["jitter"] = int(options["jitter"])
+        if options.get("services"):
+            # validated now rather than when the job fires
+            load_service_group(options["services"].strip(), path)
+            job["services"] = options["services"].strip()
+            if os.path.abspath(path) != os.path.abspath(CONFIG_PATH):
+                job["services_file"] = os.path.abspath(path)
+            if "description" not in options:
+                job["description"] = f"{description}, restart services {job['services']}"
+        jobs.append(job)
+    return jobs
+
+# ---------------------------------------------------------------------------
+# Fleet restart-window planner and downtime simulator
+# ---------------------------------------------------------------------------
+
+PLAN_PERIODS = {"daily": 1440, "weekly": 7 * 1440}
+DEFAULT_POOL = "default"
+
+def stable_hash(text):
+    """64-bit hash of text that is identical across runs and machines (unlike hash())."""
+    return int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'big')
+
+def parse_time_window(text):
+    """Parses 'HH:MM-HH:MM' into (start, end) minutes of the day; end may wrap past midnight."""
+    start_text, sep, end_text = text.partition('-')
+    start, end = parse_time_string(start_text), parse_time_string(end_text)
+    if not sep or not start or not end:
+        raise ValueError(f"invalid time window '{text}', expected HH:MM-HH:MM")
+    return int(start[0]) * 60 + int(start[1]), int(end[0]) * 60 + int(end[1])
+
+def parse_pool_limits(items):
+    """Parses ['pool=0.1', ...] into {pool: fraction}."""
+    limits = {}
+    for item in items or []:
+        pool, sep, value = item.partition('=')
+        try:
+            fraction = float(value.rstrip('%')) / (100 if value.endswith('%') else 1)
+        except ValueError:
+            fraction = -1
+        if not sep or not 0 < fraction <= 1:
+            raise ValueError(f"invalid pool limit '{item}', expected POOL=FRACTION (e.g. web=0.1 or web=10%)")
+        limits[pool] = fraction
+    return limits
+
+def host_pool(entry):
+    return entry["labels"].get("pool", DEFAULT_POOL)
+
+def host_duration(entry, default_duration):
+    """Expected reboot duration of a host in minutes (label 'duration', else the default)."""
+    try:
+        return max(1, int(entry["labels"].get("duration", default_duration)))
+    except ValueError:
+        return default_duration
+
+def pool_capacity(pool_size, fraction):
+    """How many hosts of a pool may be down at once; always at least one."""
+    return max(1, int(pool_size * fraction))
+
+def start_to_cron(start, period_minutes):
+    """Cron expression firing at minute 'start' of a daily or weekly period (weekly periods start on Sunday)."""
+    day, minute_of_day = divmod(start, 1440)
+    dow = str(day) if period_minutes > 1440 else "*"
+    return f"{minute_of_day % 60} {minute_of_day // 60} * * {dow}"
+
+def plan_restart_windows(hosts, period="daily", max_down_fraction=0.1, pool_limits=None, blackouts=(),
+                         default_duration=10, granularity=1):
+    """Assigns every host a restart start minute within the period.
+
+    Each host hashes to a preferred start among the allowed ones; hosts are placed in hash order and probe forward
+    from their preferred start to the first start where their whole reboot window avoids the
+    blackouts and keeps the pool under its concurrent-downtime limit. The result only depends
+    on the inventory, and adding a host only moves hosts whose slot it takes.
+
+    Returns (assignments, unplaced): assignments are dicts with host, pool, start, duration and
+    cron; unplaced lists hosts for which no start satisfies the constraints.
+    Raises ValueError when granularity is not a positive number of minutes.
+    """
+    if granularity < 1:
+        raise ValueError(f"granularity must be at least 1 minute, got {granularity}")
+    period_minutes = PLAN_PERIODS[period]
+    pool_limits = pool_limits or {}
+
+    blocked = bytearray(period_minutes)
+    for window_start, window_end in blackouts:
+        length = (window_end - window_start) % 1440 or 1440
+        for day in range(period_minutes // 1440):
+            for minute in range(window_start, window_start + length):
+                blocked[(day * 1440 + minute) % period_minutes] = 1
+    # prefix sums over two periods make "is [s, s+d) free of blackouts" an O(1) check, with wrap-around
+    blocked_prefix = [0] + list(itertools.accumulate(blocked + blocked))
+
+    pool_sizes = collections.Counter(host_pool(entry) for entry in hosts)
+    occupancy = {pool: array.array('H', bytes(2 * period_minutes)) for pool in pool_sizes}
+    candidates_by_duration = {}
+    assignments, unplaced = [], []
+
+    for entry in sorted(hosts, key=lambda e: (stable_hash(e["host"]), e["host"])):
+        pool = host_pool(entry)
+        duration = min(host_duration(entry, default_duration), period_minutes)
+        capacity = pool_capacity(pool_sizes[pool], pool_limits.get(pool, max_down_fraction))
+        candidates = candidates_by_duration.get(duration)
+        if candidates is None:
+            candidates = [start for start in range(0, period_minutes, granularity)
+                          if blocked_prefix[start + duration] == blocked_prefix[start]]
+            candidates_by_duration[duration] = candidates
+        occ = occupancy[pool]
+        chosen = None
+        if candidates:
+            first = stable_hash(pool + "/" + entry["host"]) % len(candidates)
+            for k in range(len(candidates)):
+                start = candidates[(first + k) % len(candidates)]
+                end = start + duration
+                if end <= period_minutes:
+                    busiest = max(occ[start:end])
+                else:
+                    busiest = max(max(occ[start:]), max(occ[:end - period_minutes]))
+                if busiest < capacity:
+                    chosen = start
+                    break
+        if chosen is None:
+            unplaced.append(entry["host"])
+            continue
+        for minute in range(chosen, chosen + duration):
+            occ[minute % period_minutes] += 1
+        assignments.append({
+            "host": entry["host"], "pool": pool, "start": chosen, "duration": duration,
+            "cron": start_to_cron(chosen, period_minutes),
+        })
+
+    order = {entry["host"]: i for i, entry in enumerate(hosts)}
+    assignments.sort(key=lambda a: order[a["host"]])
+    return assignments, unplaced
+
+def simulate_downtime(hosts, start, days=30, default_cron=None, default_duration=10):
+    """Replays the restart schedules of hosts minute by minute over 'days' days from 'start'.
+
+    Schedules come from each host's 'cron' label (or default_cron). For every pool a difference
+    array gets +n/-n at the start/end of each reboot window (n = hosts sharing that schedule and
+    duration), and one running sum over the array yields the concurrent-downtime timeline.
+
+    Returns {pool: {"hosts", "peak", "peak_at", "down_minutes", "host_minutes", "timeline"}} and
+    the list of hosts without a usable schedule.
+    """
+    horizon = days * 1440
+    begin = datetime.datetime(start.year, start.month, start.day)
+    base_index = begin.toordinal() * 1440
+    groups = collections.defaultdict(collections.Counter)
+    pool_sizes = collections.Counter()
+    skipped = []
+    for entry in hosts:
+        cron = entry["labels"].get("cron", default_cron)
+        if not cron:
+            skipped.append(entry["host"])
+            continue
+        pool = host_pool(entry)
+        pool_sizes[pool] += 1
+        groups[pool][(cron, host_duration(entry, default_duration))] += 1
+
+    results = {}
+    for pool, schedules in groups.items():
+        diff = array.array('i', bytes(4 * (horizon + 1)))
+        for (cron, duration), count in schedules.items():
+            try:
+                compiled = compile_cron_expression(cron)
+            except CronError:
+                skipped.append(f"{pool}:{cron}")
+                continue
+            # reboots that started shortly before the window still overlap its beginning
+            window_start = begin - datetime.timedelta(minutes=duration)
+            window_end = begin + datetime.timedelta(minutes=horizon)
+            for index in expand_cron_fire_minutes(compiled, window_start, window_end):
+                offset = index - base_index
+                end = offset + duration
+                diff[offset if offset > 0 else 0] += count
+                diff[end if end < horizon else horizon] -= count
+        timeline = array.array('i', itertools.accumulate(diff[:horizon]))
+        peak = max(timeline) if horizon else 0
+        peak_offset = timeline.index(peak) if peak else None
+        results[pool] = {
+            "hosts": pool_sizes[pool],
+            "peak": peak,
+            "peak_at": (begin + datetime.timedelta(minutes=peak_offset)).isoformat() if peak_offset is not None else None,
+            "down_minutes": horizon - timeline.count(0),
+            "host_minutes": sum(timeline),
+            "timeline": timeline,
+        }
+    return results, skipped
+
+# ---------------------------------------------------------------------------
+# Restart strategies: kexec, systemd soft-reboot or a full reboot
+# ---------------------------------------------------------------------------
+
+# Tried in the configured order; "full" is always the last resort and "auto" means kexec, then full
+REBOOT_STRATEGIES = ("kexec", "soft-reboot", "full")
+SYSTEM_BINARY_DIRS = ["/sbin", "/usr/sbin", "/bin", "/usr/bin"]
+# systemd 254+ ships this unit; its presence is checked instead of running systemctl --version
+SOFT_REBOOT_UNIT_DIRS = ["/usr/lib/systemd/system", "/lib/systemd/system"]
+
+def find_system_binary(name):
+    for directory in SYSTEM_BINARY_DIRS:
+        path = os.path.join(directory, name)
+        if os.access(path, os.X_OK):
+            return path
+    return None
+
+def read_small_file(path):
+    """Stripped content of a /proc or /sys file, or None if it cannot be read."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def get_reboot_strategies(preferred=None):
+    """Strategies to try in order: preferred or [reboot] strategy (comma-separated), ending with "full"."""
+    names = []
+    for name in (preferred or get_config_option("reboot", "strategy", "full")).replace(",", " ").lower().split():
+        for expanded in (("kexec", "full") if name == "auto" else (name,)):
+            if expanded not in names:
+                names.append(expanded)
+    if "full" not in names:
+        names.append("full")
+    return names
+
+def kexec_boot_files():
+    """The running kernel's image (or None), its initrd (or None) and its command line."""
+    release = os.uname().release
+    kernel = next((path for path in (f"/boot/vmlinuz-{release}", f"/boot/vmlinux-{release}", f"/boot/Image-{release}")
+                   if os.path.isfile(path)), None)
+    initrd = next((path for path in (f"/boot/initrd.img-{release}", f"/boot/initramfs-{release}.img",
+                                     f"/boot/initrd-{release}") if os.path.isfile(path)), None)
+    # BOOT_IMAGE is added by the bootloader, which kexec skips
+    cmdline = " ".join(arg for arg in (read_small_file("/proc/cmdline") or "").split() if not arg.startswith("BOOT_IMAGE="))
+    return kernel, initrd, cmdline
+
+def check_reboot_strategy(name):
+    """Pre-flight checks for one strategy; reads files only, so it is cheap enough for 'status'.
+    Returns (command, None) when the strategy can be used, else (None, reason).
+    """
+    if name == "full":
+        command = resolve_reboot_command()
+        return (command, None) if command else (None, "no reboot or shutdown command found")
+    if name not in REBOOT_STRATEGIES:
+        return None, "unknown strategy"
+    if not os.path.isdir("/run/systemd/system"):
+        return None, "systemd is not running"
+    if name == "soft-reboot":
+        if not any(os.path.exists(os.path.join(d, "systemd-soft-reboot.service")) for d in SOFT_REBOOT_UNIT_DIRS):
+            return None, "needs systemd 254 or later"
+        return f"{SYSTEMCTL} soft-reboot", None
+    if not find_system_binary("kexec"):
+        return None, "kexec-tools is not installed"
+    if not os.path.exists("/sys/kernel/kexec_loaded"):
+        return None, "kernel built without kexec support"
+    if read_small_file("/proc/sys/kernel/kexec_load_disabled") == "1":
+        return None, "disabled by kernel.kexec_load_disabled"
+    if not kexec_boot_files()[0]:
+        return None, f"no kernel image for {os.uname().release} in /boot"
+    return f"{SYSTEMCTL} kexec", None
+
+def load_kexec_kernel():
+    """Stages the running kernel, initrd and command line with kexec -l, unless a kernel is already
+    loaded. Under lockdown (Secure Boot) only kexec_file_load is allowed, so -s is added.
+    Returns (ok, detail).
+    """
+    if read_small_file("/sys/kernel/kexec_loaded") == "1":
+        return True, "already loaded"
+    kernel, initrd, cmdline = kexec_boot_files()
+    argv = [find_system_binary("kexec") or "kexec", "-l", kernel, f"--command-line={cmdline}"]
+    if initrd:
+        argv.append(f"--initrd={initrd}")
+    lockdown = read_small_file("/sys/kernel/security/lockdown")
+    if lockdown and "[none]" not in lockdown:
+        argv.insert(2, "-s")
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, timeout=120, check=False)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return False, str(e)
+    if result.returncode != 0:
+        return False, result.stderr.strip() or f"kexec exited with status {result.returncode}"
+    if read_small_file("/sys/kernel/kexec_loaded") != "1":
+        return False, "kexec succeeded but no kernel is loaded"
+    return True, f"loaded {kernel}"
+
+def prepare_reboot_strategy(name):
+    """check_reboot_strategy plus the side effects a strategy needs before use (kexec: a loaded kernel)."""
+    command, reason = check_reboot_strategy(name)
+    if command and name == "kexec":
+        ok, detail = load_kexec_kernel()
+        if not ok:
+            return None, f"loading the kernel failed: {detail}"
+    return command, reason
+
+def resolve_reboot_strategy(preferred=None, prepare=False):
+    """Returns the first strategy passing its pre-flight checks as {"strategy", "command", "skipped"}
+    ("strategy" is None when none does). prepare=True also stages what the strategy needs.
+    """
+    skipped = []
+    for name in get_reboot_strategies(preferred):
+        command, reason = prepare_reboot_strategy(name) if prepare else check_reboot_strategy(name)
+        if command:
+            return {"strategy": name, "command": command, "skipped": skipped}
+        skipped.append({"strategy": name, "reason": reason})
+    return {"strategy": None, "command": None, "skipped": skipped}
+
+def describe_reboot_strategy(resolution):
+    skipped = "; ".join(f"{s['strategy']}: {s['reason']}" for s in resolution["skipped"])
+    name = resolution["strategy"] or "none usable"
+    return f"{name} (skipped {skipped})" if skipped else name
+
+def stage_reboot_strategy(inform_user=True):
+    """Prepares the configured strategy ahead of time, e.g. when a schedule is set or after boot,
+    so kexec only has to confirm at reboot time that its kernel is still loaded.
+    """
+    resolution = resolve_reboot_strategy(prepare=True)
+    if inform_user:
+        print(f"   Restart strategy: {BOLD}{describe_reboot_strategy(resolution)}{ENDC}")
+    return resolution
+
+# ---------------------------------------------------------------------------
+# Pre-reboot shutdown pipeline: stop services, kill stragglers, flush filesystems
+# ---------------------------------------------------------------------------
+
+SHUTDOWN_STAGES = ("stop", "kill", "sync")
+# Local filesystems worth flushing; network and pseudo filesystems are left to the init system
+SYNC_FILESYSTEMS = {"ext2", "ext3", "ext4", "xfs", "btrfs", "f2fs", "jfs", "reiserfs", "vfat", "exfat", "ntfs3", "bcachefs"}
+FIFREEZE = 0xC0045877
+FITHAW = 0xC0045878
+
+def load_shutdown_settings():
+    """Pre-reboot pipeline settings from the [shutdown] config section."""
+    stop_timeout = get_config_option("shutdown", "stop_timeout", 30.0, float)
+    services = []
+    for line in get_config_list("shutdown", "services"):
+        words = split_inventory_line(line)
+        options = dict(word.partition('=')[::2] for word in words[1:])
+        unit = words[0] if "." in words[0] else words[0] + ".service"
+        try:
+            timeout = float(options.get("timeout", stop_timeout))
+        except ValueError:
+            timeout = stop_timeout
+        services.append({"unit": unit, "timeout": timeout})
+    return {
+        "stages": get_config_option("shutdown", "stages", " ".join(SHUTDOWN_STAGES)).replace(",", " ").split(),
+        "services": services,
+        "parallel": get_config_option("shutdown", "parallel", 8, int),
+        "kill_processes": get_config_list("shutdown", "kill_processes"),
+        "kill_grace": get_config_option("shutdown", "kill_grace", 10.0, float),
+        "mounts": get_config_list("shutdown", "mounts") or ["auto"],
+        "freeze": get_config_option("shutdown", "freeze", "no").lower() in ("yes", "true", "on", "1"),
+        "sync_timeout": get_config_option("shutdown", "sync_timeout", 60.0, float),
+    }
+
+def list_sync_mounts(configured):
+    """Mount points to flush: the configured ones, or for 'auto' every writable local filesystem
+    in /proc/self/mounts, one mount point per device (bind mounts share a superblock).
+    """
+    if configured != ["auto"]:
+        return configured
+    mounts, devices = [], set()
+    try:
+        with open("/proc/self/mounts", 'r') as f:
+            entries = [line.split() for line in f]
+    except OSError:
+        return []
+    for entry in entries:
+        if len(entry) < 4 or entry[2] not in SYNC_FILESYSTEMS or "ro" in entry[3].split(","):
+            continue
+        # spaces and tabs in mount points are octal escapes
+        mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), entry[1])
+        try:
+            device = os.stat(mount_point).st_dev
+        except OSError:
+            continue
+        if device not in devices:
+            devices.add(device)
+            mounts.append(mount_point)
+    return mounts
+
+def sync_mount(mount_point, freeze, libc):
+    """syncfs() on one filesystem, then optionally a freeze/thaw cycle, which also commits the
+    journal, so the unmount during reboot has nothing left to write. Returns the timings.
+    """
+    result = {"mount": mount_point, "ok": True}
+    started = time.monotonic()
+    try:
+        fd = os.open(mount_point, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError as e:
+        return dict(result, ok=False, error=str(e))
+    frozen = False
+    try:
+        if libc.syncfs(fd) != 0:
+            result.update(ok=False, error="syncfs failed")
+        result["sync"] = round(time.monotonic() - started, 3)
+        if freeze and result["ok"]:
+            started = time.monotonic()
+            try:
+                fcntl.ioctl(fd, FIFREEZE, 0)
+                frozen = True
+            except OSError as e:
+                result["freeze_error"] = str(e) # e.g. not supported by the filesystem
+    finally:
+        # whatever happens after the freeze, the filesystem must not stay frozen
+        if frozen:
+            try:
+                fcntl.ioctl(fd, FITHAW, 0)
+            except OSError as e:
+                result.update(ok=False, thaw_error=str(e))
+            result["freeze"] = round(time.monotonic() - started, 3)
+        os.close(fd)
+    return result
+
+def run_shutdown_pipeline(settings, trigger, dry_run=False):
+    """Runs the configured stages in order, each timed and logged with an fsync so the record
+    survives the reboot that follows:
+
+    stop - 'systemctl stop' for every [shutdown] service concurrently, each with its own timeout,
+    kill - SIGTERM, then SIGKILL after kill_grace, to services that did not stop and to
+           kill_processes,
+    sync - syncfs() (and freeze/thaw) of every mount in parallel, bounded by sync_timeout.
+    Returns {"stages": {stage: seconds}, "stopped": [units]}.
+    """
+    report = {"stages": {}, "stopped": []}
+    stuck = []
+    for stage in settings["stages"]:
+        started = time.monotonic()
+        details = {}
+        if stage not in SHUTDOWN_STAGES:
+            log_event("shutdown_stage", trigger=trigger, stage=stage, error="unknown stage", fsync=True)
+            continue
+        if dry_run:
+            units = [service["unit"] for service in settings["services"]]
+            report["stages"][stage] = {"stop": {"services": units},
+                                       "kill": {"services": units, "processes": settings["kill_processes"]},
+                                       "sync": {"mounts": list_sync_mounts(settings["mounts"]),
+                                                "freeze": settings["freeze"]}}[stage]
+            continue
+        if stage == "stop" and settings["services"]:
+            def stop(service):
+                stop_started = time.monotonic()
+                returncode = run_systemctl("stop", service["unit"], timeout=service["timeout"]).returncode
+                return service["unit"], returncode == 0, returncode, round(time.monotonic() - stop_started, 3)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, settings["parallel"])) as pool:
+                results = list(pool.map(stop, settings["services"]))
+            details["services"] = {unit: seconds for unit, _, _, seconds in results}
+            stuck = [unit for unit, ok, _, _ in results if not ok]
+            details["timed_out"] = [unit for unit, _, returncode, _ in results if returncode is None]
+            report["stopped"] = [unit for unit, _, _, _ in results]
+        elif stage == "kill":
+            pids = set()
+            for name in settings["kill_processes"]:
+                pids |= find_target_pids({"kind": "process", "ident": name})
+            for unit in stuck:
+                run_systemctl("kill", unit)
+            gone = stop_pids(pids, settings["kill_grace"]) if pids else True
+            if stuck:
+                if not pids:
+                    time.sleep(settings["kill_grace"])
+                for unit in stuck:
+                    run_systemctl("kill", "--signal=SIGKILL", unit)
+            details.update(units=stuck, processes=len(pids), all_gone=gone)
+        elif stage == "sync":
+            libc = ctypes.CDLL(None, use_errno=True)
+            mounts = list_sync_mounts(settings["mounts"])
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(mounts)))
+            futures = {pool.submit(sync_mount, mount, settings["freeze"], libc): mount for mount in mounts}
+            done, pending = concurrent.futures.wait(futures, timeout=settings["sync_timeout"])
+            # a filesystem that is still flushing is left to the reboot's own sync
+            pool.shutdown(wait=False)
+            details["mounts"] = [future.result() for future in done]
+            details["timed_out"] = [futures[future] for future in pending]
+        report["stages"][stage] = round(time.monotonic() - started, 3)
+        log_event("shutdown_stage", trigger=trigger, stage=stage, seconds=report["stages"][stage], fsync=True, **details)
+    return report
+
+def restart_stopped_services(units, trigger):
+    """Starts the services the pipeline stopped again, when the reboot itself could not be started."""
+    if units:
+        ok = run_systemctl("start", *units).returncode == 0
+        log_event("shutdown_rollback", trigger=trigger, units=units, ok=ok)
+
+# ---------------------------------------------------------------------------
+# Restart admission: at most K hosts of a pool restarting at once
+# ---------------------------------------------------------------------------
+
+LEASE_STATE_PATH = os.path.join(STATE_DIR, "lease.json")
+LEASE_PORT = 7847
+LEASE_BACKENDS = ("none", "directory", "tcp")
+
+def load_lease_settings():
+    """Admission settings from the [lease] config section; backend 'none' disables admission."""
+    return {
+        "backend": get_config_option("lease", "backend", "none"),
+        "directory": get_config_option("lease", "directory", os.path.join(STATE_DIR, "leases")),
+        "server": get_config_option("lease", "server", f"127.0.0.1:{LEASE_PORT}"),
+        "pool": get_config_option("lease", "pool", "default"),
+        "slots": get_config_option("lease", "slots", 1, int),
+        "ttl": get_config_option("lease", "ttl", 3600.0, float),
+        "holder": get_config_option("lease", "holder", socket.gethostname()),
+        "deadline": get_config_option("lease", "deadline", 3600.0, float),
+        "backoff": get_config_option("lease", "backoff", 5.0, float),
+        "max_backoff": get_config_option("lease", "max_backoff", 120.0, float),
+        "on_timeout": get_config_option("lease", "on_timeout", "skip"),
+    }
+
+class LeaseTable:
+    """Leases of one or more pools, keyed by holder. A holder acquiring again renews its lease,
+    expired leases are dropped on every access. The lease server keeps one of these in memory and,
+    with a state file, writes it out after every change so a server restart forgets nobody.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pools = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.pools = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def _live(self, pool, now):
+        leases = self.pools.setdefault(pool, {})
+        for holder in [h for h, lease in leases.items() if lease["expires"] <= now]:
+            del leases[holder]
+        return leases
+
+    def _save(self):
+        if self.path:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.pools, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+
+    def acquire(self, pool, holder, slots, ttl):
+        """Returns (granted, live leases of the pool, oldest first)."""
+        with self.lock:
+            now = time.time()
+            leases = self._live(pool, now)
+            granted = holder in leases or len(leases) < slots
+            if granted:
+                acquired = leases[holder]["acquired"] if holder in leases else now
+                leases[holder] = {"pool": pool, "holder": holder, "acquired": acquired, "expires": now + ttl}
+                self._save()
+            return granted, sorted(leases.values(), key=lambda lease: lease["acquired"])
+
+    def release(self, pool, holder):
+        with self.lock:
+            released = self._live(pool, time.time()).pop(holder, None) is not None
+            if released:
+                self._save()
+            return released
+
+    def list(self, pool):
+        with self.lock:
+            return sorted(self._live(pool, time.time()).values(), key=lambda lease: lease["acquired"])
+
+class DirectoryLeaseBackend:
+    """Leases as files in a shared directory (NFS, CephFS, ...): POOL/HOLDER.lease, created and
+    pruned while holding a POSIX lock on POOL/.lock, which NFS and cluster filesystems honour.
+    Expiry compares the hosts' wall clocks, so they need to be NTP-synchronised.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _pool_dir(self, pool):
+        path = os.path.join(self.directory, re.sub(r'[^\w.-]', '_', pool))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _lease_path(self, pool_dir, holder):
+        return os.path.join(pool_dir, re.sub(r'[^\w.-]', '_', holder) + ".lease")
+
+    def _locked(self, pool_dir, action):
+        with open(os.path.join(pool_dir, ".lock"), 'a') as lock_file:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+            try:
+                return action(self._live(pool_dir, time.time()))
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+    def _live(self, pool_dir, now):
+        leases = {}
+        for name in os.listdir(pool_dir):
+            if not name.endswith(".lease"):
+                continue
+            path = os.path.join(pool_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lease = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if lease.get("expires", 0) <= now:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            leases[lease["holder"]] = lease
+        return leases
+
+    def acquire(self, pool, holder, slots, ttl):
+        pool_dir = self._pool_dir(pool)
+        def action(leases):
+            if holder not in leases and len(leases) >= slots:
+                return False, sorted(leases.values(), key=lambda lease: lease["acquired"])
+            now = time.time()
+            leases[holder] = {"pool": pool, "holder": holder, "expires": now + ttl,
+                              "acquired": leases[holder]["acquired"] if holder in leases else now}
+            path = self._lease_path(pool_dir, holder)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(leases[holder], f)
+            os.replace(tmp_path, path)
+            return True, sorted(leases.values(), key=lambda lease: lease["acquired"])
+        return self._locked(pool_dir, action)
+
+    def release(self, pool, holder):
+        pool_dir = self._pool_dir(pool)
+        def action(leases):
+            if holder not in leases:
+                return False
+            os.unlink(self._lease_path(pool_dir, holder))
+            return True
+        return self._locked(pool_dir, action)
+
+    def list(self, pool):
+        return self._locked(self._pool_dir(pool), lambda leases: sorted(leases.values(), key=lambda lease: lease["acquired"]))
+
+class TcpLeaseBackend:
+    """Client of the bundled lease server ('lease-server'): one JSON request and one JSON reply per
+    line. Expiry is judged by the server's clock alone.
+    """
+
+    def __init__(self, address, timeout=10.0):
+        host, sep, port = address.rpartition(':')
+        if not sep or ']' in port:
+            host, port = address, LEASE_PORT
+        self.address = (host.strip('[]'), int(port))
+        self.timeout = timeout
+
+    def _request(self, **request):
+        with socket.create_connection(self.address, timeout=self.timeout) as sock:
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        try:
+            response = json.loads(line)
+        except ValueError:
+            raise OSError(f"bad reply from lease server {self.address[0]}:{self.address[1]}")
+        if not response.get("ok"):
+            raise OSError(response.get("error", "request refused"))
+        return response
+
+    def acquire(self, pool, holder, slots, ttl):
+        response = self._request(op="acquire", pool=pool, holder=holder, slots=slots, ttl=ttl)
+        return response["granted"], response["leases"]
+
+    def release(self, pool, holder):
+        return self._request(op="release", pool=pool, holder=holder)["released"]
+
+    def list(self, pool):
+        return self._request(op="list", pool=pool)["leases"]
+
+def get_lease_backend(settings):
+    """The configured lease backend, or None when admission is disabled."""
+    if settings["backend"] == "directory":
+        return DirectoryLeaseBackend(settings["directory"])
+    if settings["backend"] == "tcp":
+        return TcpLeaseBackend(settings["server"])
+    if settings["backend"] != "none":
+        log_event("lease_error", error=f"unknown lease backend '{settings['backend']}' (use {', '.join(LEASE_BACKENDS)})")
+    return None
+
+def serve_leases(bind, port, state_path=None):
+    """Runs the lease server until interrupted. Requests are JSON lines:
+    {"op": "acquire", "pool", "holder", "slots", "ttl"} -> {"ok", "granted", "leases"},
+    {"op": "release", "pool", "holder"} -> {"ok", "released"}, {"op": "list", "pool"} -> {"ok", "leases"}.
+    """
+    table = LeaseTable(state_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    op, pool = request["op"], str(request["pool"])
+                    if op == "acquire":
+                        granted, leases = table.acquire(pool, str(request["holder"]), int(request["slots"]), float(request["ttl"]))
+                        response = {"ok": True, "granted": granted, "leases": leases}
+                        if granted:
+                            log_event("lease_granted", pool=pool, holder=request["holder"], holders=len(leases))
+                    elif op == "release":
+                        response = {"ok": True, "released": table.release(pool, str(request["holder"]))}
+                        if response["released"]:
+                            log_event("lease_released", pool=pool, holder=request["holder"])
+                    elif op == "list":
+                        response = {"ok": True, "leases": table.list(pool)}
+                    else:
+                        response = {"ok": False, "error": f"unknown op '{op}'"}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "error": f"bad request: {e}"}
+                self.wfile.write(json.dumps(response, separators=(',', ':')).encode() + b"\n")
+
+    class Server(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    with Server((bind, port), Handler) as server:
+        print(f"Listening on {server.server_address[0]}:{server.server_address[1]}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def acquire_restart_lease(settings, trigger):
+    """Waits for a free slot in the host's pool, retrying with jittered exponential backoff until
+    [lease] deadline. A host that already holds the lease just renews it. Backend errors count as
+    a refusal. Returns True when admitted or when admission is disabled.
+    """
+    backend = get_lease_backend(settings)
+    if backend is None:
+        return True
+    started = time.monotonic()
+    delay = settings["backoff"]
+    attempts = 0
+    while True:
+        attempts += 1
+        error = None
+        try:
+            granted, leases = backend.acquire(settings["pool"], settings["holder"], settings["slots"], settings["ttl"])
+        except OSError as e:
+            granted, leases, error = False, [], str(e)
+        waited = round(time.monotonic() - started, 3)
+        if granted:
+            try:
+                os.makedirs(os.path.dirname(LEASE_STATE_PATH), exist_ok=True)
+                write_file_if_changed(LEASE_STATE_PATH, json.dumps({key: settings[key] for key in
+                                      ("backend", "directory", "server", "pool", "holder")}) + "\n")
+            except OSError as e:
+                log_event("lease_error", error=f"could not record the lease for release after boot: {e}")
+            log_event("lease_acquired", trigger=trigger, pool=settings["pool"], holder=settings["holder"],
+                      waited=waited, attempts=attempts, holders=[lease["holder"] for lease in leases])
+            return True
+        if waited >= settings["deadline"]:
+            log_event("lease_timeout", trigger=trigger, pool=settings["pool"], waited=waited, attempts=attempts, error=error)
+            return False
+        log_event("lease_wait", trigger=trigger, pool=settings["pool"], waited=waited, error=error,
+                  holders=[lease["holder"] for lease in leases])
+        # hosts refused together must not all come back together
+        time.sleep(min(random.uniform(delay / 2, delay), settings["deadline"] - waited))
+        delay = min(delay * 2, settings["max_backoff"])
+
+def release_restart_lease(trigger):
+    """Gives back the lease recorded by acquire_restart_lease, using the backend it came from.
+    Returns True if a lease was released; if the backend is unreachable, the TTL frees it.
+    """
+    try:
+        with open(LEASE_STATE_PATH, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return False
+    backend = get_lease_backend(dict(state))
+    try:
+        released = backend.release(state["pool"], state["holder"]) if backend else False
+    except OSError as e:
+        log_event("lease_release_failed", trigger=trigger, pool=state["pool"], error=str(e))
+        return False
+    os.unlink(LEASE_STATE_PATH)
+    log_event("lease_release", trigger=trigger, pool=state["pool"], holder=state["holder"], released=released)
+    return released
+
+# ---------------------------------------------------------------------------
+# Reboot gate: waits for a quiet host (load, PSI, connections, readiness script)
+# ---------------------------------------------------------------------------
+
+PSI_RESOURCES = ("cpu", "io", "memory")
+TCP_ESTABLISHED = "01"
+
+def read_psi_avg10(resource):
+    """Returns the 'some avg10' pressure percentage for cpu/io/memory, or None if PSI is unavailable."""
+    try:
+        with open(f"/proc/pressure/{resource}", 'r') as f:
+            for line in f:
+                if line.startswith("some "):
+                    for item in line.split()[1:]:
+                        key, _, value = item.partition('=')
+                        if key == "avg10":
+                            return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def count_established_connections():
+    """Counts established TCP connections (IPv4 and IPv6) from /proc/net/tcp{,6}."""
+    count = 0
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path, 'r') as f:
+                next(f, None) # header
+                for line in f:
+                    fields = line.split(None, 4)
+                    if len(fields) > 3 and fields[3] == TCP_ESTABLISHED:
+                        count += 1
+        except OSError:
+            continue
+    return count
+
+def run_hook(command, timeout):
+    """Runs a shell hook with a timeout. Returns (ok, returncode, seconds)."""
+    started = time.monotonic()
+    try:
+        proc = subprocess.run(command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+        returncode = proc.returncode
+    except subprocess.TimeoutExpired:
+        returncode = None
+    return returncode == 0, returncode, round(time.monotonic() - started, 3)
+
+def load_gate_settings():
+    """Gate thresholds from the [gate] config section; None disables a check."""
+    return {
+        "max_load": get_config_option("gate", "max_load", None, float),
+        "max_pressure": {r: get_config_option("gate", f"max_{r}_pressure", None, float) for r in PSI_RESOURCES},
+        "max_connections": get_config_option("gate", "max_connections", None, int),
+        "readiness_script": get_config_option("gate", "readiness_script"),
+        "drain_hooks": get_config_list("gate", "drain_hooks"),
+        "hook_timeout": get_config_option("gate", "hook_timeout", 120.0, float),
+        "poll_interval": get_config_option("gate", "poll_interval", 30.0, float),
+        "deadline": get_config_option("gate", "deadline", 3600.0, float),
+    }
+
+def sample_gate_signals(settings):
+    """Measures the enabled gate signals. Returns (signals, reasons the host is still busy)."""
+    signals, busy = {}, []
+    if settings["max_load"] is not None:
+        signals["load1"] = round(os.getloadavg()[0], 2)
+        if signals["load1"] > settings["max_load"]:
+            busy.append(f"load {signals['load1']} > {settings['max_load']}")
+    for resource, limit in settings["max_pressure"].items():
+        if limit is None:
+            continue
+        value = read_psi_avg10(resource)
+        signals[f"psi_{resource}"] = value
+        if value is not None and value > limit:
+            busy.append(f"{resource} pressure {value} > {limit}")
+    if settings["max_connections"] is not None:
+        signals["connections"] = count_established_connections()
+        if signals["connections"] > settings["max_connections"]:
+            busy.append(f"{signals['connections']} connections > {settings['max_connections']}")
+    if settings["readiness_script"]:
+        ok, returncode, seconds = run_hook(settings["readiness_script"], settings["hook_timeout"])
+        signals["readiness"] = returncode
+        if not ok:
+            busy.append(f"readiness script returned {returncode}")
+    return signals, busy
+
+def issue_reboot(trigger, scheduled=None, strategy=None, **fields):
+    """Restarts with the first usable strategy (see get_reboot_strategies), recording the restart
+    in the history first. A strategy that fails its checks or exits non-zero falls through to the
+    next one. Returns False if no strategy could be started; the history record is then marked
+    "failed" so that no later boot completes it.
+    """
+    issued = time.time()
+    record_id = int(issued * 1000)
+    attempted = False
+    failure = {}
+    shutdown = {"stages": {}, "stopped": []}
+    for name in get_reboot_strategies(strategy):
+        command, reason = prepare_reboot_strategy(name)
+        if not command:
+            log_event("strategy_skipped", trigger=trigger, strategy=name, reason=reason)
+            continue
+        if not attempted and name != "soft-reboot":
+            # a soft-reboot keeps the kernel and with it the page cache
+            snapshot_pagecache_before_reboot(trigger)
+        if not attempted:
+            shutdown = run_shutdown_pipeline(load_shutdown_settings(), trigger)
+        log_event("reboot_issued", trigger=trigger, strategy=name, command=command, **fields)
+        # records sharing an id are merged, so a fallback only updates the strategy
+        record = ({"id": record_id, "trigger": trigger, "scheduled": scheduled or issued, "issued": issued,
+                   "strategy": name, "shutdown_stages": shutdown["stages"]}
+                  if not attempted else {"id": record_id, "strategy": name})
+        if name == "soft-reboot":
+            # btime survives a soft-reboot; the boot hook compares this count instead
+            record["soft_reboots"] = read_soft_reboot_count()
+        record_history(record)
+        attempted = True
+        try:
+            result = subprocess.run(shlex.split(command), check=False)
+        except OSError as e:
+            log_event("reboot_failed", trigger=trigger, strategy=name, command=command, error=str(e))
+            failure = {"error": str(e)}
+            continue
+        if result.returncode == 0:
+            return True
+        log_event("reboot_failed", trigger=trigger, strategy=name, command=command, returncode=result.returncode)
+        failure = {"returncode": result.returncode}
+    if attempted:
+        record_history({"id": record_id, "failed": True, **failure})
+    else:
+        log_event("reboot_failed", trigger=trigger, error="no usable restart strategy")
+    restart_stopped_services(shutdown["stopped"], trigger)
+    return False
+
+def try_gate_lock():
+    """Takes the gate lock without waiting. Returns its fd, or None when another gate holds it.
+    The lock goes away with the fd, so a gate that dies or reboots never leaves it behind.
+    """
+    fd = open_lock_file(GATE_LOCK_PATH)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+def run_reboot_gate(trigger="cron", deadline=None, strategy=None):
+    """Runs the gate below unless another one is already running (logged as gate_overlap).
+    Returns True if the reboot was issued.
+    """
+    lock_fd = try_gate_lock()
+    if lock_fd is None:
+        log_event("gate_overlap", trigger=trigger, error="another gate is running")
+        return False
+    try:
+        return _run_reboot_gate(trigger, deadline, strategy)
+    finally:
+        os.close(lock_fd)
+
+def _run_reboot_gate(trigger, deadline, strategy):
+    """Reboots once the host is quiet, or when the deadline passes regardless.
+
+    1. sample the signals once (recorded as the starting load),
+    2. take one of the pool's restart leases ([lease]), or give up when none frees up in time,
+    3. run the drain hooks (deregister from load balancers, stop taking work),
+    4. poll the signals until all are within their thresholds or the deadline expires; the
+       deadline counts from admission, so time spent waiting for a lease does not shorten it,
+    5. restart with the first usable strategy (kexec, soft-reboot, full reboot).
+    Returns True if the reboot was issued.
+    """
+    settings = load_gate_settings()
+    if deadline is not None:
+        settings["deadline"] = deadline
+    # cron starts jobs at the top of the scheduled minute; the wait from there is the gate's delay
+    scheduled = time.time() // 60 * 60
+    initial, busy = sample_gate_signals(settings)
+    log_event("gate_start", trigger=trigger, signals=initial, busy=busy, deadline=settings["deadline"])
+
+    lease_settings = load_lease_settings()
+    admitted = acquire_restart_lease(lease_settings, trigger)
+    if not admitted and lease_settings["on_timeout"] != "reboot":
+        return False
+
+    started = time.monotonic()
+
+    for hook in settings["drain_hooks"]:
+        ok, returncode, seconds = run_hook(hook, settings["hook_timeout"])
+        log_event("drain_hook", trigger=trigger, hook=hook, ok=ok, returncode=returncode, seconds=seconds)
+
+    polls = 0
+    while True:
+        signals, busy = sample_gate_signals(settings)
+        polls += 1
+        waited = time.monotonic() - started
+        if not busy:
+            outcome = "quiet"
+            break
+        if waited >= settings["deadline"]:
+            outcome = "deadline"
+            break
+        log_event("gate_wait", trigger=trigger, waited=round(waited, 1), busy=busy)
+        time.sleep(max(0.0, min(settings["poll_interval"], settings["deadline"] - waited)))
+
+    # Connections still open at reboot are the ones it drops; the drop from the start is what waiting saved.
+    avoided = None
+    if "connections" in initial and "connections" in signals:
+        avoided = max(0, initial["connections"] - signals["connections"])
+    log_event("gate_pass", trigger=trigger, outcome=outcome, waited=round(time.monotonic() - started, 3),
+              polls=polls, signals=signals, busy=busy, connections_avoided=avoided)
+    if admitted:
+        # renews the lease, which may have aged while the host was draining
+        acquire_restart_lease(lease_settings, trigger)
+    if issue_reboot(trigger, scheduled=scheduled, strategy=strategy, gate_outcome=outcome):
+        return True
+    release_restart_lease(trigger)
+    return False
+
+# ---------------------------------------------------------------------------
+# Watch mode: restart on sustained resource degradation instead of a clock
+# ---------------------------------------------------------------------------
+
+class ProcSampler:
+    """Samples memory health from /proc without spawning processes.
+
+    Every file is opened once and re-read with pread() at offset 0, which makes the kernel
+    regenerate its contents, so a sample costs a handful of syscalls and no allocations
+    beyond the returned bytes.
+    """
+
+    PATHS = {"uptime": "/proc/uptime", "meminfo": "/proc/meminfo", "vmstat": "/proc/vmstat",
+             "psi_memory": "/proc/pressure/memory"}
+
+    def __init__(self):
+        self.fds = {}
+        for key, path in self.PATHS.items():
+            try:
+                self.fds[key] = os.open(path, os.O_RDONLY)
+            except OSError:
+                pass # PSI needs Linux 4.20+ with CONFIG_PSI; the metric is then reported as None
+        self.last_swapin = None
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+    def _read(self, key):
+        fd = self.fds.get(key)
+        return os.pread(fd, 65536, 0) if fd is not None else b""
+
+    @staticmethod
+    def _field(data, name):
+        """Value of 'Name:  123 kB' / 'name 123' style lines in a /proc buffer, or None."""
+        start = data.find(name)
+        if start == -1:
+            return None
+        start += len(name)
+        end = data.find(b"\n", start)
+        return int(data[start:end].split()[0])
+
+    def sample(self):
+        """Returns one sample dict: uptime, mem_available_pct, slab_pct, swapin_rate, psi_memory_some/full."""
+        now = time.monotonic()
+        uptime = self._read("uptime")
+        meminfo = self._read("meminfo")
+        total = self._field(meminfo, b"MemTotal:") or 1
+        available = self._field(meminfo, b"MemAvailable:")
+        slab = self._field(meminfo, b"SUnreclaim:")
+        swapin = self._field(self._read("vmstat"), b"\npswpin ")
+        swapin_rate = None
+        if swapin is not None and self.last_swapin is not None and now > self.last_swapin[0]:
+            swapin_rate = round((swapin - self.last_swapin[1]) / (now - self.last_swapin[0]), 2)
+        if swapin is not None:
+            self.last_swapin = (now, swapin)
+        psi = self._read("psi_memory")
+        some = full = None
+        if psi:
+            some = float(psi[psi.find(b"avg10=") + 6:].split(None, 1)[0])
+            full_at = psi.find(b"full avg10=")
+            if full_at != -1:
+                full = float(psi[full_at + 11:].split(None, 1)[0])
+        return {
+            "time": now,
+            "uptime": float(uptime.split()[0]) if uptime else None,
+            "mem_available_pct": round(available * 100.0 / total, 2) if available is not None else None,
+            "slab_pct": round(slab * 100.0 / total, 2) if slab is not None else None,
+            "swapin_rate": swapin_rate,
+            "psi_memory_some": some,
+            "psi_memory_full": full,
+        }
+
+# metric -> (config option, True if breached when ABOVE the threshold)
+WATCH_THRESHOLDS = {
+    "mem_available_pct": ("min_mem_available_pct", False),
+    "slab_pct": ("max_slab_pct", True),
+    "swapin_rate": ("max_swapin_rate", True),
+    "psi_memory_some": ("max_memory_pressure", True),
+    "psi_memory_full": ("max_memory_pressure_full", True),
+}
+
+def load_watch_settings():
+    """Watch thresholds from the [watch] config section; unset thresholds are not checked."""
+    return {
+        "interval": get_config_option("watch", "interval", 10.0, float),
+        "window": get_config_option("watch", "window", 600.0, float),
+        "min_uptime": get_config_option("watch", "min_uptime", 86400.0, float),
+        "history": get_config_option("watch", "history", 360, int),
+        "thresholds": {metric: get_config_option("watch", option, None, float)
+                       for metric, (option, _) in WATCH_THRESHOLDS.items()},
+    }
+
+def breached_metrics(sample, thresholds):
+    """Names of the metrics in sample that are past their configured threshold."""
+    breached = []
+    for metric, limit in thresholds.items():
+        value = sample.get(metric)
+        if limit is None or value is None:
+            continue
+        if (value > limit) if WATCH_THRESHOLDS[metric][1] else (value < limit):
+            breached.append(metric)
+    return breached
+
+def run_watch(settings, dry_run=False, max_samples=None):
+    """Samples /proc every interval and restarts once a threshold stays breached for the whole window.
+
+    Samples are kept in a fixed-size ring buffer for the trigger log. A host younger than
+    min_uptime never restarts. The restart goes through the same gate (and therefore the same
+    reboot command resolution) as scheduled jobs. Returns when a reboot was issued, or after
+    max_samples samples.
+    """
+    sampler = ProcSampler()
+    recent = collections.deque(maxlen=max(2, settings["history"]))
+    breach_since = {}
+    samples = 0
+    log_event("watch_start", interval=settings["interval"], window=settings["window"],
+              min_uptime=settings["min_uptime"], thresholds=settings["thresholds"])
+    try:
+        while max_samples is None or samples < max_samples:
+            sample = sampler.sample()
+            samples += 1
+            recent.append(sample)
+            now = sample["time"]
+            breached = breached_metrics(sample, settings["thresholds"])
+            for metric in list(breach_since):
+                if metric not in breached:
+                    del breach_since[metric]
+            for metric in breached:
+                breach_since.setdefault(metric, now)
+            sustained = [m for m, since in breach_since.items() if now - since >= settings["window"]]
+            if sustained and (sample["uptime"] or 0) >= settings["min_uptime"]:
+                window_samples = [r for r in recent if now - r["time"] <= settings["window"]]
+                log_event("watch_trigger", metrics=sustained, uptime=sample["uptime"], samples=len(window_samples),
+                          last={m: sample[m] for m in sustained},
+                          worst={m: (max if WATCH_THRESHOLDS[m][1] else min)(r[m] for r in window_samples if r[m] is not None)
+                                 for m in sustained},
+                          dry_run=dry_run)
+                if dry_run:
+                    breach_since.clear()
+                elif run_reboot_gate(trigger="watch"):
+                    return True
+                else:
+                    breach_since.clear() # reboot failed; require a fresh full window before retrying
+            time.sleep(settings["interval"])
+    finally:
+        sampler.close()
+    return False
+
+WATCH_UNIT = f"{SYSTEMD_UNIT_PREFIX}watch.service"
+
+def install_watch_service():
+    """Installs and starts a systemd service running 'watch'. Returns True on success."""
+    unit = (f"# Managed by restart_scheduler, do not edit.\n[Unit]\nDescription=restart_scheduler: restart on memory degradation\n"
+            f"After=multi-user.target\n\n[Service]\nExecStart={get_script_invocation()} watch\nRestart=on-failure\n"
+            f"RestartSec=30\nNice=10\n\n[Install]\nWantedBy=multi-user.target\n")
+    try:
+        changed = write_file_if_changed(os.path.join(SYSTEMD_UNIT_DIR, WATCH_UNIT), unit)
+    except OSError as e:
+        print(f"{FAIL}⚠️ Error writing {WATCH_UNIT}: {e}{ENDC}")
+        return False
+    if changed:
+        run_systemctl("daemon-reload")
+    ok = run_systemctl("enable", "--now", WATCH_UNIT).returncode == 0
+    if ok:
+        print(f"{OKGREEN}✅ {WATCH_UNIT} installed and started.{ENDC}")
+    else:
+        print(f"{FAIL}⚠️ systemctl failed to start {WATCH_UNIT}.{ENDC}")
+    return ok
+
+# ---------------------------------------------------------------------------
+# Service restarts: dependency tiers, bounded parallelism, health checks, rolling batches
+# ---------------------------------------------------------------------------
+
+SERVICE_GROUP_PREFIX = "services "
+SERVICE_TARGET_OPTIONS = {"after", "health", "instances", "start"}
+
+def expand_service_instances(unit, spec, where):
+    """'app@.service' + '1-3,blue' -> ['app@1.service', 'app@2.service', 'app@3.service', 'app@blue.service']."""
+    if "@." not in unit:
+        raise ValueError(f"{where}: instances= needs a template unit like app@.service, got '{unit}'")
+    prefix, suffix = unit.split("@.", 1)
+    names = []
+    for part in spec.split(","):
+        low, sep, high = part.partition("-")
+        if sep and low.isdigit() and high.isdigit():
+            names.extend(str(n) for n in range(int(low), int(high) + 1))
+        elif part:
+            names.append(part)
+    return [f"{prefix}@{name}.{suffix}" for name in names]
+
+def parse_service_target(line, where):
+    """One target line: 'NAME [after=A,B] [health=CMD] [instances=1-4] [start=CMD]'.
+    NAME is a systemd unit (.service is implied), 'cgroup:PATH' or 'process:COMM'.
+    """
+    words = split_inventory_line(line)
+    options = {}
+    for word in words[1:]:
+        key, sep, value = word.partition('=')
+        if not sep or key not in SERVICE_TARGET_OPTIONS:
+            raise ValueError(f"{where}: unknown target option '{word}' (use {', '.join(sorted(SERVICE_TARGET_OPTIONS))})")
+        options[key] = value
+    name = words[0]
+    kind, _, ident = name.partition(':') if name.startswith(("cgroup:", "process:")) else ("unit", "", name)
+    if kind == "unit" and "." not in ident:
+        ident += ".service"
+    if kind != "unit" and ("instances" in options or not ident):
+        raise ValueError(f"{where}: {name}: {kind} targets take a name and no instances=")
+    instances = expand_service_instances(ident, options["instances"], where) if "instances" in options else [ident]
+    return {"name": name, "kind": kind, "ident": ident, "instances": instances,
+            "after": [dep for dep in options.get("after", "").split(",") if dep],
+            "health": options.get("health"), "start": options.get("start")}
+
+def load_service_group(group, path=None):
+    """Reads [services GROUP] from path (default CONFIG_PATH) into settings and target dicts."""
+    if path is None or path == CONFIG_PATH:
+        parser = load_config()
+    else:
+        parser = configparser.ConfigParser(interpolation=None)
+        if not parser.read(path, encoding='utf-8'):
+            raise ValueError(f"cannot read {path}")
+    section = SERVICE_GROUP_PREFIX + group
+    where = f"{path or CONFIG_PATH} [{section}]"
+    if not parser.has_section(section):
+        raise ValueError(f"{where}: section not found")
+    options = parser[section]
+
+    def number(key, default, cast=float):
+        try:
+            return cast(options.get(key, "").strip() or default)
+        except ValueError:
+            raise ValueError(f"{where}: invalid {key} '{options.get(key)}'")
+
+    targets = [parse_service_target(line.strip(), where)
+               for line in options.get("targets", "").splitlines() if line.strip() and not line.strip().startswith('#')]
+    if not targets:
+        raise ValueError(f"{where}: no targets")
+    settings = {
+        "group": group,
+        "targets": targets,
+        "parallel": max(1, number("parallel", 4, int)),
+        "restart_timeout": number("restart_timeout", 90.0),
+        "stop_timeout": number("stop_timeout", 30.0),
+        "health_timeout": number("health_timeout", 120.0),
+        "health_interval": number("health_interval", 2.0),
+        "min_capacity": number("min_capacity", 0.0),
+    }
+    if not 0.0 <= settings["min_capacity"] < 1.0:
+        raise ValueError(f"{where}: min_capacity must be at least 0 and below 1")
+    for target in targets:
+        rolling_batch_size(len(target["instances"]), settings["min_capacity"], f"{where}: {target['name']}")
+    service_tiers(targets, where)
+    return settings
+
+def rolling_batch_size(instances, min_capacity, where=""):
+    """How many instances may be down at once so that at least min_capacity of them keep running."""
+    if instances == 1:
+        return 1
+    batch = instances - math.ceil(instances * min_capacity)
+    if batch < 1:
+        raise ValueError(f"{where}: min_capacity {min_capacity} leaves no instance of {instances} to restart")
+    return batch
+
+def service_tiers(targets, where=""):
+    """Groups targets into tiers: every target comes after the tiers of the targets it names in after=.
+    Raises ValueError for unknown names and cycles.
+    """
+    by_name = {target["name"]: target for target in targets}
+    for target in targets:
+        for dep in target["after"]:
+            if dep not in by_name:
+                raise ValueError(f"{where}: {target['name']} is after unknown target '{dep}'")
+    tiers, placed = [], set()
+    remaining = list(targets)
+    while remaining:
+        tier = [target for target in remaining if all(dep in placed for dep in target["after"])]
+        if not tier:
+            raise ValueError(f"{where}: dependency cycle among {', '.join(t['name'] for t in remaining)}")
+        tiers.append(tier)
+        placed.update(target["name"] for target in tier)
+        remaining = [target for target in remaining if target["name"] not in placed]
+    return tiers
+
+def find_target_pids(target):
+    """PIDs of a process: target (exact /proc/PID/comm match) or cgroup: target (cgroup v2 cgroup.procs)."""
+    if target["kind"] == "cgroup":
+        try:
+            with open(os.path.join("/sys/fs/cgroup", target["ident"].lstrip('/'), "cgroup.procs"), 'r') as f:
+                return {int(pid) for pid in f.read().split()}
+        except OSError:
+            return set()
+    pids = set()
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/comm", 'r') as f:
+                    if f.read().rstrip('\n') == target["ident"]:
+                        pids.add(int(entry))
+            except OSError:
+                pass
+    return pids
+
+def stop_pids(pids, timeout):
+    """SIGTERM, then SIGKILL for whatever is left after timeout. Returns True when all are gone."""
+    alive = set(pids)
+    for sig, wait in ((signal.SIGTERM, timeout), (signal.SIGKILL, 5.0)):
+        for pid in alive:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + wait
+        while alive and time.monotonic() < deadline:
+            alive = {pid for pid in alive if os.path.exists(f"/proc/{pid}")}
+            if alive:
+                time.sleep(0.1)
+        if not alive:
+            return True
+    return False
+
+def wait_until_healthy(check, timeout, interval):
+    """Calls check() until it returns True or timeout passes. Returns True on success."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if check():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+
+def restart_service_instance(target, instance, settings):
+    """Restarts one unit instance or the processes of one cgroup/process target, then waits for it
+    to be healthy. Returns {"target", "instance", "ok", "phases": {phase: seconds}[, "error"]}.
+    """
+    result = {"target": target["name"], "instance": instance, "ok": False, "phases": {}}
+    started = time.monotonic()
+
+    def phase_done(name):
+        nonlocal started
+        now = time.monotonic()
+        result["phases"][name] = round(now - started, 3)
+        started = now
+
+    if target["kind"] == "unit":
+        returncode = run_systemctl("restart", instance, timeout=settings["restart_timeout"]).returncode
+        phase_done("restart")
+        if returncode != 0:
+            result["error"] = f"systemctl restart {instance} " + ("timed out" if returncode is None else f"exited with {returncode}")
+            return result
+        default_check = lambda: run_systemctl("is-active", "--quiet", instance).returncode == 0
+    else:
+        old_pids = find_target_pids(target)
+        if not stop_pids(old_pids, settings["stop_timeout"]):
+            phase_done("stop")
+            result["error"] = "processes survived SIGKILL"
+            return result
+        phase_done("stop")
+        if target["start"]:
+            ok, returncode, _ = run_hook(target["start"], settings["restart_timeout"])
+            phase_done("start")
+            if not ok:
+                result["error"] = "start command " + ("timed out" if returncode is None else f"exited with {returncode}")
+                return result
+        # a supervisor (systemd, runit, a master process) or start= brings up new processes
+        default_check = lambda: bool(find_target_pids(target) - old_pids)
+    if target["health"]:
+        instance_name = instance.split("@", 1)[1].rsplit(".", 1)[0] if "@" in instance else instance
+        command = target["health"].replace("{instance}", instance_name).replace("{unit}", instance)
+        check = lambda: run_hook(command, settings["health_timeout"])[0]
+    else:
+        check = default_check
+    healthy = wait_until_healthy(check, settings["health_timeout"], settings["health_interval"])
+    phase_done("health")
+    if not healthy:
+        result["error"] = f"not healthy after {settings['health_timeout']:.0f}s"
+    result["ok"] = healthy
+    return result
+
+def restart_service_target(target, settings, slots=None):
+    """Restarts all instances of a target in rolling batches sized by min_capacity; a batch must be
+    healthy before the next one goes down. Every instance restart holds one of slots, a semaphore
+    shared by the whole run (default: 'parallel' slots for this target alone).
+    Returns the target result with its instance results.
+    """
+    if slots is None:
+        slots = threading.BoundedSemaphore(settings["parallel"])
+
+    def restart(instance):
+        with slots:
+            return restart_service_instance(target, instance, settings)
+
+    started = time.monotonic()
+    instances = target["instances"]
+    batch_size = rolling_batch_size(len(instances), settings["min_capacity"])
+    results = []
+    for first in range(0, len(instances), batch_size):
+        batch = instances[first:first + batch_size]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(batch), settings["parallel"])) as pool:
+            batch_results = list(pool.map(restart, batch))
+        results.extend(batch_results)
+        if not all(r["ok"] for r in batch_results):
+            break
+    ok = len(results) == len(instances) and all(r["ok"] for r in results)
+    return {"target": target["name"], "ok": ok, "seconds": round(time.monotonic() - started, 3),
+            "batch_size": batch_size, "instances": results}
+
+def run_service_restart(settings, dry_run=False):
+    """Restarts the group's targets tier by tier. Targets of a tier run concurrently, and at most
+    'parallel' instances restart at once across all targets of the tier and their batches; the
+    next tier starts only when every target of this one is healthy, and a failed tier stops the
+    run. Every tier and the whole run are logged with their timings.
+    """
+    group = settings["group"]
+    tiers = service_tiers(settings["targets"])
+    report = {"group": group, "ok": True, "tiers": [], "seconds": 0.0}
+    if dry_run:
+        report["tiers"] = [{"targets": [{"target": t["name"], "instances": t["instances"],
+                                         "batch_size": rolling_batch_size(len(t["instances"]), settings["min_capacity"])}
+                                        for t in tier]} for tier in tiers]
+        return report
+    started = time.monotonic()
+    log_event("services_start", group=group, tiers=[[t["name"] for t in tier] for tier in tiers])
+    # the tier and batch pools only wait on each other; the restarts themselves share these slots
+    slots = threading.BoundedSemaphore(settings["parallel"])
+    for index, tier in enumerate(tiers):
+        tier_started = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(tier), settings["parallel"])) as pool:
+            results = list(pool.map(lambda target: restart_service_target(target, settings, slots), tier))
+        tier_report = {"tier": index, "ok": all(r["ok"] for r in results),
+                       "seconds": round(time.monotonic() - tier_started, 3), "targets": results}
+        report["tiers"].append(tier_report)
+        log_event("services_tier", group=group, tier=index, ok=tier_report["ok"], seconds=tier_report["seconds"],
+                  targets={r["target"]: r["seconds"] for r in results},
+                  failed=[f"{i['instance']}: {i['error']}" for r in results for i in r["instances"] if not i["ok"]])
+        if not tier_report["ok"]:
+            report["ok"] = False
+            report["skipped"] = [t["name"] for later in tiers[index + 1:] for t in later]
+            break
+    report["seconds"] = round(time.monotonic() - started, 3)
+    log_event("services_done", group=group, ok=report["ok"], seconds=report["seconds"], skipped=report.get("skipped", []))
+    return report
+
+# ---------------------------------------------------------------------------
+# Page-cache snapshot before a reboot and parallel warm-up after it
+# ---------------------------------------------------------------------------
+
+PAGECACHE_SNAPSHOT_PATH = os.path.join(STATE_DIR, "pagecache.snapshot")
+PAGECACHE_SNAPSHOT_VERSION = 1
+# Files are mapped and checked with mincore() this much at a time (one residency byte per page)
+PAGECACHE_WINDOW = 1 << 30
+# cachestat(2) (Linux 6.5+) counts the cached pages of a range without a byte per page; numbers
+# from 424 on are the same on every architecture
+SYS_CACHESTAT = 451
+# Extents are prefetched in pieces of at most this size, so the I/O budget and threads apply evenly
+PAGECACHE_CHUNK = 4 << 20
+
+def load_warmup_settings():
+    """Page-cache snapshot and warm-up settings from the [warmup] config section."""
+    return {
+        "paths": get_config_list("warmup", "paths"),
+        "max_extents": get_config_option("warmup", "max_extents", 200000, int),
+        "merge_gap": get_config_option("warmup", "merge_gap_pages", 32, int),
+        "snapshot_budget": get_config_option("warmup", "snapshot_budget", 15.0, float),
+        "threads": get_config_option("warmup", "threads", 8, int),
+        "io_budget": get_config_option("warmup", "io_budget", 0, parse_byte_size),
+        "max_bytes": get_config_option("warmup", "max_bytes", 0, parse_byte_size),
+        "settle_timeout": get_config_option("warmup", "settle_timeout", 300.0, float),
+    }
+
+def parse_byte_size(text):
+    """'512M' / '2G' / '4096' -> bytes (binary units)."""
+    text = text.strip().upper().rstrip("B")
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+class ResidencyProbe:
+    """mincore() over temporary read-only mappings, through ctypes since the mmap module has no
+    mincore. Mapping does not fault pages in, so probing does not change what is resident.
+    Where cachestat() exists, windows with no or only cached pages skip mincore altogether,
+    which keeps mostly cold (or fully hot) multi-terabyte datasets cheap to scan.
+    """
+
+    def __init__(self):
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.libc.mmap.restype = ctypes.c_void_p
+        self.libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int64]
+        self.libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        self.libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        self.page_size = mmap.PAGESIZE
+        self.prot_read, self.map_shared = mmap.PROT_READ, mmap.MAP_SHARED
+        self.map_failed = ctypes.c_void_p(-1).value
+        self.vec = (ctypes.c_ubyte * (PAGECACHE_WINDOW // self.page_size))()
+        # mincore sets bit 0 for resident pages; the other bits are reserved
+        self.resident_table = bytes(i & 1 for i in range(256))
+        self.cachestat_range = (ctypes.c_uint64 * 2)()
+        self.cachestat_result = (ctypes.c_uint64 * 5)()
+        self.has_cachestat = True
 
-def clear_screen():
-    """Clears the terminal screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    def cached_pages(self, fd, offset, length):
+        """Number of cached pages in a file range via cachestat(), or None where it is unsupported."""
+        if not self.has_cachestat:
+            return None
+        self.cachestat_range[0], self.cachestat_range[1] = offset, length
+        if self.libc.syscall(SYS_CACHESTAT, fd, self.cachestat_range, self.cachestat_result, 0) != 0:
+            self.has_cachestat = False
+            return None
+        return self.cachestat_result[0]
 
-def check_root():
-    """Checks if the script is run as root."""
-    if os.geteuid() != 0:
-        print(f"{FAIL}This script requires root privileges to manage crontab and itself.{ENDC}")
-        # Use EXECUTED_SCRIPT_NAME for more accurate instruction
-        script_call_name = EXECUTED_SCRIPT_NAME.replace('.py', '') if '.py' in EXECUTED_SCRIPT_NAME.lower() else EXECUTED_SCRIPT_NAME
-        print(f"Please run with '{BOLD}sudo python3 {EXECUTED_SCRIPT_NAME}{ENDC}' or if installed in PATH '{BOLD}sudo {script_call_name}{ENDC}'.")
-        sys.exit(1)
+    def residency(self, fd, offset, length):
+        """Bytes with 1 for every resident page of [offset, offset + length); offset is page aligned
+        and length at most PAGECACHE_WINDOW.
+        """
+        addr = self.libc.mmap(None, length, self.prot_read, self.map_shared, fd, offset)
+        if addr in (None, self.map_failed):
+            raise OSError(self.ctypes.get_errno(), "mmap failed")
+        try:
+            if self.libc.mincore(addr, length, self.vec) != 0:
+                raise OSError(self.ctypes.get_errno(), "mincore failed")
+        finally:
+            self.libc.munmap(addr, length)
+        pages = (length + self.page_size - 1) // self.page_size
+        return self.ctypes.string_at(self.vec, pages).translate(self.resident_table)
 
-def get_current_crontab():
-    """Gets the current user's crontab content."""
-    try:
-        result = subprocess.run(['crontab', '-l'], capture_output=True, text=True, check=False)
-        if result.returncode == 0:
-            return result.stdout
-        elif "no crontab for" in result.stderr.lower() or result.stdout == "":
-            return ""
-        else:
-            # Only print warning if stderr has content beyond "no crontab for"
-            if result.stderr and "no crontab for" not in result.stderr.lower():
-                 print(f"{WARNING}Warning while reading crontab: {result.stderr.strip()}{ENDC}")
-            return ""
-    except FileNotFoundError:
-        print(f"{FAIL}Command 'crontab' not found. Is it installed?{ENDC}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"{FAIL}Unknown error while reading crontab: {e}{ENDC}")
-        sys.exit(1)
+    def resident_runs(self, fd, offset, length):
+        """Yields (first page, page count) runs of resident pages in a file range, a window at a time."""
+        end = offset + length
+        while offset < end:
+            window = min(PAGECACHE_WINDOW, end - offset)
+            pages = (window + self.page_size - 1) // self.page_size
+            cached = self.cached_pages(fd, offset, window)
+            if cached == 0:
+                offset += window
+                continue
+            if cached == pages:
+                yield offset // self.page_size, pages
+                offset += window
+                continue
+            vec = self.residency(fd, offset, window)
+            if b'\x01' in vec:
+                base = offset // self.page_size
+                for run in re.finditer(b'\x01+', vec):
+                    yield base + run.start(), run.end() - run.start()
+            offset += window
 
-def set_crontab(content):
-    """Sets the user's crontab content."""
-    if not content.strip():
+def iter_warmup_files(paths):
+    """Regular files under the configured paths (directories are walked), each path once."""
+    seen = set()
+    stack = list(reversed(paths))
+    while stack:
+        path = stack.pop()
         try:
-            subprocess.run(['crontab', '-r'], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            return True
-        except subprocess.CalledProcessError as e:
-            # If 'no crontab for' is the error, it's effectively cleared/empty.
-            if e.stderr and "no crontab for" not in e.stderr.decode().lower():
-                print(f"{FAIL}Error trying to clear crontab (it might have been already empty): {e.stderr.decode().strip()}{ENDC}")
-                # return False # Still, the state is 'empty', so perhaps true is better.
-            return True # Treat as success if crontab is now effectively empty.
+            if os.path.isdir(path) and not os.path.islink(path):
+                with os.scandir(path) as entries:
+                    stack.extend(sorted((e.path for e in entries), reverse=True))
+                continue
+            st = os.stat(path)
+        except OSError:
+            continue
+        if path not in seen and st.st_size > 0 and (st.st_mode & 0o170000) == 0o100000:
+            seen.add(path)
+            yield path, st
+
+def take_pagecache_snapshot(settings):
+    """Records which pages of the configured files are resident as merged extents, ordered
+    hottest first (files with the highest resident fraction first, by offset within a file).
+    Scanning stops at snapshot_budget seconds; the extent list is capped at max_extents.
+    Returns (files, extents, stats) where extents are (file index, first page, pages).
+    """
+    probe = ResidencyProbe()
+    started = time.monotonic()
+    deadline = started + settings["snapshot_budget"]
+    scanned, collected, truncated, per_file = 0, 0, False, []
+    gap = max(0, settings["merge_gap"])
+    flags = os.O_RDONLY | getattr(os, "O_NOATIME", 0)
+    for path, st in iter_warmup_files(settings["paths"]):
+        if time.monotonic() > deadline or collected > 4 * settings["max_extents"]:
+            truncated = True
+            break
+        try:
+            try:
+                fd = os.open(path, flags)
+            except PermissionError:
+                fd = os.open(path, os.O_RDONLY) # O_NOATIME needs ownership or CAP_FOWNER
+        except OSError:
+            continue
+        extents = array.array('Q')
+        resident = 0
+        try:
+            for first, count in probe.resident_runs(fd, 0, st.st_size):
+                resident += count
+                if extents and first - (extents[-2] + extents[-1]) <= gap:
+                    extents[-1] = first + count - extents[-2]
+                else:
+                    extents.extend((first, count))
+        except OSError:
+            continue
+        finally:
+            os.close(fd)
+        scanned += st.st_size
+        if extents:
+            collected += len(extents) // 2
+            total_pages = (st.st_size + probe.page_size - 1) // probe.page_size
+            per_file.append(((path, st.st_ino), extents, resident / total_pages))
+    per_file.sort(key=lambda item: -item[2])
+    files, extents = [], []
+    for index, (identity, file_extents, _) in enumerate(per_file):
+        files.append(identity)
+        extents.extend((index, file_extents[i], file_extents[i + 1]) for i in range(0, len(file_extents), 2))
+        if len(extents) >= settings["max_extents"]:
+            truncated = truncated or len(extents) > settings["max_extents"] or index + 1 < len(per_file)
+            del extents[settings["max_extents"]:]
+            files = files[:extents[-1][0] + 1] if extents else []
+            break
+    stats = {"files": len(files), "extents": len(extents), "scanned_bytes": scanned,
+             "resident_bytes": sum(count for _, _, count in extents) * probe.page_size,
+             "seconds": round(time.monotonic() - started, 3), "truncated": truncated}
+    return files, extents, stats
+
+def write_pagecache_snapshot(files, extents, stats, path=None):
+    """Writes the snapshot: a JSON header line, then the extents as three packed arrays
+    (file index uint32, first page uint64, pages uint32), about 16 bytes per extent.
+    fsynced, since a reboot follows.
+    """
+    path = path or PAGECACHE_SNAPSHOT_PATH
+    header = {"version": PAGECACHE_SNAPSHOT_VERSION, "taken": time.time(), "page_size": mmap.PAGESIZE,
+              "files": [list(identity) for identity in files], "stats": stats}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write((json.dumps(header, separators=(',', ':')) + "\n").encode('utf-8'))
+        for typecode, column in (('I', 0), ('Q', 1), ('I', 2)):
+            array.array(typecode, (extent[column] for extent in extents)).tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+def read_pagecache_snapshot(path=None):
+    """Returns (header, extents) of a snapshot, or (None, []) when there is none or it is unreadable."""
+    path = path or PAGECACHE_SNAPSHOT_PATH
     try:
-        process = subprocess.Popen(['crontab', '-'], stdin=subprocess.PIPE, text=True, encoding='utf-8')
-        stdout, stderr = process.communicate(input=content)
-        if process.returncode == 0:
-            return True
-        else:
-            print(f"{FAIL}Error setting crontab: {stderr or stdout or 'Unknown error'}{ENDC}")
-            return False
-    except FileNotFoundError:
-        print(f"{FAIL}Command 'crontab' not found. Is it installed?{ENDC}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"{FAIL}Unknown error while setting crontab: {e}{ENDC}")
-        sys.exit(1)
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get("version") != PAGECACHE_SNAPSHOT_VERSION:
+                return None, []
+            count = header["stats"]["extents"]
+            columns = []
+            for typecode in ('I', 'Q', 'I'):
+                column = array.array(typecode)
+                column.fromfile(f, count)
+                columns.append(column)
+    except (OSError, ValueError, KeyError, EOFError):
+        return None, []
+    return header, list(zip(*columns))
 
-def remove_all_script_cron_jobs(inform_user=True):
-    """Removes all cron jobs previously set by this script.
-    Returns:
-        - Number of jobs actually removed (>=0) on success.
-        - -1 on failure to set/modify crontab.
+def snapshot_pagecache_before_reboot(trigger):
+    """Called right before a reboot: takes and stores a snapshot when [warmup] paths are configured."""
+    settings = load_warmup_settings()
+    if not settings["paths"]:
+        return None
+    try:
+        files, extents, stats = take_pagecache_snapshot(settings)
+        write_pagecache_snapshot(files, extents, stats)
+    except OSError as e:
+        log_event("pagecache_snapshot_failed", trigger=trigger, error=str(e))
+        return None
+    log_event("pagecache_snapshot", trigger=trigger, **stats)
+    return stats
+
+class IOBudget:
+    """Token bucket shared by the warm-up threads: at most rate bytes per second (0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.available = float(rate)
+        self.updated = time.monotonic()
+
+    def acquire(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(float(self.rate), self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            self.available -= amount
+            wait = -self.available / self.rate if self.available < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+def warm_pagecache(settings, path=None):
+    """Prefetches a snapshot's extents hottest first with posix_fadvise(WILLNEED), split into
+    PAGECACHE_CHUNK pieces over a thread pool, limited by io_budget (bytes/s) and max_bytes.
+    Files whose inode changed are skipped and extents are clipped to the current file size.
+    Then waits (up to settle_timeout) until residency stops growing and reports the result.
     """
-    current_crontab = get_current_crontab()
-    lines = current_crontab.splitlines()
+    header, extents = read_pagecache_snapshot(path)
+    if header is None:
+        return None
+    page_size = header["page_size"]
+    started = time.monotonic()
+    fds, skipped_files = {}, 0
+    for index, (file_path, inode) in enumerate(header["files"]):
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            skipped_files += 1
+            continue
+        st = os.fstat(fd)
+        if st.st_ino != inode:
+            os.close(fd)
+            skipped_files += 1
+            continue
+        fds[index] = (fd, st.st_size)
+    pieces, requested = [], 0
+    limit = settings["max_bytes"] or float("inf")
+    for index, first, count in extents:
+        if index not in fds or requested >= limit:
+            continue
+        fd, size = fds[index]
+        offset, end = first * page_size, min((first + count) * page_size, size)
+        while offset < end and requested < limit:
+            length = min(PAGECACHE_CHUNK, end - offset)
+            pieces.append((fd, offset, length))
+            requested += length
+            offset += length
+    budget = IOBudget(settings["io_budget"])
 
-    jobs_to_remove_lines = [line for line in lines if CRON_COMMENT in line]
-    num_jobs_found = len(jobs_to_remove_lines)
+    def prefetch(piece):
+        fd, offset, length = piece
+        budget.acquire(length)
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
 
-    if num_jobs_found == 0:
-        if inform_user:
-            print(f"{OKBLUE}ℹ️ No restart tasks set by this script were found in crontab.{ENDC}")
-        return 0 # 0 jobs existed, 0 removed, operation successful
+    errors = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, settings["threads"])) as pool:
+        for future in concurrent.futures.as_completed([pool.submit(prefetch, piece) for piece in pieces]):
+            if future.exception() is not None:
+                errors += 1
+    submitted = time.monotonic() - started
+    # WILLNEED only queues the reads; wait for residency to stop growing to time the actual load
+    probe = ResidencyProbe()
+    measure = lambda: sum(count for fd, offset, length in pieces
+                          for _, count in probe.resident_runs(fd, offset, length)) * page_size
+    settle_deadline = time.monotonic() + settings["settle_timeout"]
+    resident = measure()
+    while resident < requested and time.monotonic() < settle_deadline:
+        time.sleep(0.5)
+        current = measure()
+        if current == resident:
+            break
+        resident = current
+    for fd, _ in fds.values():
+        os.close(fd)
+    return {"files": len(fds), "skipped_files": skipped_files, "extents": len(extents),
+            "requested_bytes": requested, "resident_bytes": min(resident, requested), "errors": errors,
+            "submit_seconds": round(submitted, 3), "seconds": round(time.monotonic() - started, 3),
+            "snapshot_age": round(time.time() - header["taken"], 1)}
+
+def warm_pagecache_after_boot():
+    """Boot hook step: warms the page cache from the pre-reboot snapshot, then removes the snapshot
+    so that a later unscheduled reboot does not replay stale extents.
+    """
+    settings = load_warmup_settings()
+    if not os.path.exists(PAGECACHE_SNAPSHOT_PATH):
+        return None
+    try:
+        report = warm_pagecache(settings)
+    except OSError as e:
+        log_event("pagecache_warmup_failed", error=str(e))
+        return None
+    try:
+        os.unlink(PAGECACHE_SNAPSHOT_PATH)
+    except OSError:
+        pass
+    if report:
+        log_event("pagecache_warmup", **report)
+    return report
 
-    new_lines = [line for line in lines if CRON_COMMENT not in line]
-    new_crontab_content = "\n".join(new_lines)
-    if new_lines:
-        new_crontab_content += "\n"
-    else: # If all lines were script lines, ensure content is empty for crontab -r behavior
-        new_crontab_content = ""
+# ---------------------------------------------------------------------------
+# Restart history, boot hook and Prometheus textfile export
+# ---------------------------------------------------------------------------
 
+HISTORY_PATH = os.path.join(STATE_DIR, "history.jsonl")
+BOOT_UNIT = f"{SYSTEMD_UNIT_PREFIX}boot.service"
+DOWNTIME_QUANTILES = (0.5, 0.9, 0.99)
 
-    if set_crontab(new_crontab_content):
-        if inform_user:
-            print(f"{OKGREEN}✅ Successfully cleared {num_jobs_found} previously set restart task(s) from crontab.{ENDC}")
-        return num_jobs_found # Number of jobs removed
-    else:
-        if inform_user:
-            # set_crontab would have printed specific errors
-            print(f"{FAIL}⚠️ Failed to update crontab to remove tasks.{ENDC}")
-        return -1 # Indicates failure
-
-def add_cron_job(schedule_expression, job_description):
-    """Adds a new cron job for restarting the system, after clearing old ones from this script."""
-    # remove_all_script_cron_jobs returns -1 on failure, >=0 on success (including 0 found)
-    clear_status = remove_all_script_cron_jobs(inform_user=False)
-    if clear_status == -1 :
-        print(f"{FAIL}⚠️ Could not clear previous tasks due to an error. New task not added.{ENDC}")
+def record_history(record):
+    """Appends one record to the history file and fsyncs it, since a reboot usually follows.
+    Records sharing an "id" are merged when read; the file is compacted once it grows too large.
+    """
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        fd = os.open(HISTORY_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8'))
+            os.fsync(fd)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"{WARNING}Could not write restart history {HISTORY_PATH}: {e}{ENDC}", file=sys.stderr)
         return
+    if size > get_config_option("history", "max_bytes", 256 * 1024, int):
+        compact_history()
 
-    current_crontab = get_current_crontab()
-    lines = current_crontab.splitlines()
+def read_history():
+    """Returns the merged history records, oldest first."""
+    merged = {}
+    try:
+        with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # torn write from a crash
+                if isinstance(record, dict) and "id" in record:
+                    merged.setdefault(record["id"], {}).update(record)
+    except FileNotFoundError:
+        pass
+    return sorted(merged.values(), key=lambda r: r["id"])
 
-    reboot_paths = ["/sbin/reboot", "/usr/sbin/reboot", "/bin/reboot", "/usr/bin/reboot"]
-    reboot_command_to_use = None
-    for path in reboot_paths:
-        if os.path.exists(path) and os.access(path, os.X_OK):
-            reboot_command_to_use = path
-            break
+def compact_history():
+    """Rewrites the history with one line per restart, keeping the newest [history] max_records."""
+    records = read_history()[-get_config_option("history", "max_records", 500, int):]
+    content = "".join(json.dumps(r, separators=(',', ':')) + "\n" for r in records)
+    fd, tmp_path = tempfile.mkstemp(prefix=".history.", dir=STATE_DIR)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, HISTORY_PATH)
 
-    if not reboot_command_to_use:
-        shutdown_paths = ["/sbin/shutdown", "/usr/sbin/shutdown", "/bin/shutdown", "/usr/bin/shutdown"]
-        shutdown_command_base = None
-        for path in shutdown_paths:
-            if os.path.exists(path) and os.access(path, os.X_OK):
-                shutdown_command_base = path
-                break
-        if shutdown_command_base:
-            reboot_command_to_use = f"{shutdown_command_base} -r now"
-        else:
-            print(f"{FAIL}⚠️ No valid command for restart (reboot or shutdown) found. Please check the correct path.{ENDC}")
-            print(f"{FAIL}Cannot set restart task.{ENDC}")
-            return
+def read_boot_time():
+    """Returns the kernel boot time (btime in /proc/stat) as a Unix timestamp."""
+    with open("/proc/stat", 'rb') as f:
+        for line in f:
+            if line.startswith(b"btime "):
+                return int(line.split()[1])
+    raise OSError("btime not found in /proc/stat")
 
-    new_job = f"{schedule_expression} {reboot_command_to_use} {CRON_COMMENT} ({job_description})"
-    lines.append(new_job)
+def read_soft_reboot_count():
+    """Soft-reboots since the kernel booted (systemd's SoftRebootsCount), or None if unknown."""
+    try:
+        result = subprocess.run(shlex.split(SYSTEMCTL) + ["show", "--value", "-p", "SoftRebootsCount"],
+                                capture_output=True, text=True, check=False, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    value = result.stdout.strip()
+    return int(value) if result.returncode == 0 and value.isdigit() else None
 
-    new_crontab_content = "\n".join(lines)
-    if lines:
-        new_crontab_content += "\n"
+def history_durations(record):
+    """Derived durations (seconds) of a completed restart record.
+    delay: scheduled -> reboot command (gate wait); shutdown: reboot command -> new kernel boot
+    (shutdown plus firmware); boot: kernel boot -> readiness probe passed; downtime: reboot command -> ready.
+    After a soft-reboot the kernel does not boot again; the boot hook's start stands in for btime.
+    """
+    def span(a, b):
+        return round(record[b] - record[a], 3) if record.get(a) is not None and record.get(b) is not None else None
+    return {"delay": span("scheduled", "issued"), "shutdown": span("issued", "btime"),
+            "boot": span("btime", "ready"), "downtime": span("issued", "ready")}
 
-    if set_crontab(new_crontab_content):
-        print(f"{OKGREEN}✅ Restart task successfully set for '{job_description}'.{ENDC}")
-        print(f"   Cron schedule: {BOLD}{schedule_expression}{ENDC}")
-    else:
-        print(f"{FAIL}⚠️ Error setting new crontab task.{ENDC}")
+def wait_until_ready():
+    """Runs the [history] readiness_probe until it succeeds. Returns (ready timestamp or None, attempts)."""
+    probe = get_config_option("history", "readiness_probe")
+    if not probe:
+        return time.time(), 0
+    timeout = get_config_option("history", "probe_timeout", 1800.0, float)
+    interval = get_config_option("history", "probe_interval", 5.0, float)
+    started = time.monotonic()
+    attempts = 0
+    while True:
+        attempts += 1
+        ok, _, _ = run_hook(probe, max(1.0, interval * 6))
+        if ok:
+            return time.time(), attempts
+        if time.monotonic() - started >= timeout:
+            return None, attempts
+        time.sleep(interval)
 
-def get_script_cron_jobs():
-    """Gets cron jobs set by this script."""
-    current_crontab = get_current_crontab()
-    return [line for line in current_crontab.splitlines() if CRON_COMMENT in line and line.strip()]
+def finalize_boot_history():
+    """After boot: completes the restart record issued before this boot. Returns the record or None.
+
+    A restart is complete when the kernel booted after it was issued (btime in /proc/stat), or,
+    for a soft-reboot, which keeps the kernel and btime, when systemd's soft-reboot count went up.
+    Where the count is unknown, this hook running after a soft-reboot was issued is the evidence.
+    Records of restarts whose command failed are never completed.
+    """
+    hook_started = time.time()
+    btime = read_boot_time()
+    soft_reboots = []
+
+    def completed(record):
+        if "btime" in record or record.get("failed"):
+            return False
+        if record.get("issued", 0) < btime:
+            return True
+        if record.get("strategy") != "soft-reboot":
+            return False
+        if record.get("soft_reboots") is None:
+            return True
+        if not soft_reboots:
+            soft_reboots.append(read_soft_reboot_count())
+        return soft_reboots[0] is not None and soft_reboots[0] > record["soft_reboots"]
+
+    pending = [r for r in read_history() if completed(r)]
+    if not pending:
+        return None
+    record = pending[-1]
+    if record.get("issued", 0) >= btime:
+        btime = hook_started
+    ready, attempts = wait_until_ready()
+    update = {"id": record["id"], "btime": btime, "ready": ready, "probe_attempts": attempts}
+    record_history(update)
+    record.update(update)
+    log_event("boot_complete", id=record["id"], **history_durations(record))
+    return record
+
+def percentile(sorted_values, q):
+    """Linearly interpolated percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+def render_prometheus_metrics(records, window):
+    """node_exporter textfile with rolling downtime percentiles over the last 'window' restarts."""
+    completed = [r for r in records if not r.get("failed") and history_durations(r)["downtime"] is not None][-window:]
+    lines = []
+    for name, help_text in (("downtime", "Reboot command to readiness probe passing"),
+                            ("shutdown", "Reboot command to next kernel boot (shutdown and firmware)"),
+                            ("boot", "Kernel boot to readiness probe passing"),
+                            ("delay", "Scheduled time to reboot command (gate wait)")):
+        values = sorted(v for v in (history_durations(r)[name] for r in completed) if v is not None)
+        metric = f"restart_scheduler_{name}_seconds"
+        lines.append(f"# HELP {metric} {help_text}, over the last {window} scheduled restarts.")
+        lines.append(f"# TYPE {metric} summary")
+        for q in DOWNTIME_QUANTILES:
+            value = percentile(values, q)
+            lines.append(f'{metric}{{quantile="{q}"}} {value if value is not None else "NaN"}')
+        lines.append(f"{metric}_sum {round(sum(values), 3)}")
+        lines.append(f"{metric}_count {len(values)}")
+    last = completed[-1] if completed else None
+    lines.append("# HELP restart_scheduler_last_downtime_seconds Downtime of the most recent scheduled restart.")
+    lines.append("# TYPE restart_scheduler_last_downtime_seconds gauge")
+    lines.append(f"restart_scheduler_last_downtime_seconds {history_durations(last)['downtime'] if last else 'NaN'}")
+    lines.append("# HELP restart_scheduler_last_restart_timestamp_seconds When the most recent scheduled restart was issued.")
+    lines.append("# TYPE restart_scheduler_last_restart_timestamp_seconds gauge")
+    lines.append(f"restart_scheduler_last_restart_timestamp_seconds {last['issued'] if last else 'NaN'}")
+    return "\n".join(lines) + "\n"
+
+def export_prometheus_textfile(records=None):
+    """Writes the metrics atomically to [history] textfile. Returns the path written, or None."""
+    path = get_config_option("history", "textfile", "/var/lib/node_exporter/textfile_collector/restart_scheduler.prom")
+    if not os.path.isdir(os.path.dirname(path)):
+        return None
+    records = read_history() if records is None else records
+    write_file_if_changed(path, render_prometheus_metrics(records, get_config_option("history", "window", 50, int)))
+    return path
+
+def run_boot_hook():
+    """Post-boot tasks: warm the page cache from the pre-reboot snapshot, complete the restart
+    history, give back the restart lease once the readiness probe passes, stage the restart
+    strategy for the next restart (a loaded kexec kernel does not survive one) and refresh the
+    exported metrics.
+    """
+    # prefetching runs while the readiness probe waits, so it does not inflate the measured boot time
+    warmup = threading.Thread(target=warm_pagecache_after_boot, name="warmup")
+    warmup.start()
+    record = finalize_boot_history()
+    # a host that never became ready keeps its slot until the lease expires
+    if record is None or record.get("ready"):
+        release_restart_lease("boot")
+    warmup.join()
+    if get_scheduler_backend().list_jobs():
+        resolution = stage_reboot_strategy(inform_user=False)
+        log_event("strategy_staged", strategy=resolution["strategy"], skipped=resolution["skipped"])
+    try:
+        export_prometheus_textfile()
+    except OSError as e:
+        log_event("export_failed", error=str(e))
+    return record
+
+def install_boot_service():
+    """Installs the oneshot unit that runs 'boot' after every startup. Returns True on success."""
+    unit = (f"# Managed by restart_scheduler, do not edit.\n[Unit]\nDescription=restart_scheduler: post-boot tasks\n"
+            f"Wants=network-online.target\nAfter=network-online.target\n\n[Service]\nType=oneshot\n"
+            f"ExecStart={get_script_invocation()} boot\nTimeoutStartSec=infinity\n\n[Install]\nWantedBy=multi-user.target\n")
+    try:
+        changed = write_file_if_changed(os.path.join(SYSTEMD_UNIT_DIR, BOOT_UNIT), unit)
+    except OSError as e:
+        print(f"{FAIL}⚠️ Error writing {BOOT_UNIT}: {e}{ENDC}")
+        return False
+    if changed:
+        run_systemctl("daemon-reload")
+    ok = run_systemctl("enable", BOOT_UNIT).returncode == 0
+    if ok:
+        print(f"{OKGREEN}✅ {BOOT_UNIT} installed; it runs after every boot.{ENDC}")
+    else:
+        print(f"{FAIL}⚠️ systemctl failed to enable {BOOT_UNIT}.{ENDC}")
+    return ok
 
 def display_current_time():
     """Displays the current system time in a formatted way."""
@@ -190,15 +3247,22 @@ def display_current_time():
     print(f"{OKCYAN}║  {BOLD}{OKBLUE}Day:       {day_en.center(18)}{ENDC}  {OKCYAN}║{ENDC}")
     print(f"{OKCYAN}╚══════════════════════════════════════╝{ENDC}\n")
 
+def parse_time_string(time_str):
+    """Parses HH:MM into zero-padded ('HH', 'MM') strings, or returns None if invalid."""
+    match = re.fullmatch(r"([01]?[0-9]|2[0-3]):([0-5][0-9])", time_str.strip())
+    if not match:
+        return None
+    hour, minute = match.groups()
+    return f"{int(hour):02d}", f"{int(minute):02d}"
+
 def get_valid_time_input():
     """Gets HH:MM time input from user and validates it."""
     while True:
         try:
             time_str = input(f"Please enter the time in HH:MM format (e.g., 14:30 or 08:05): ").strip()
-            match = re.fullmatch(r"([01]?[0-9]|2[0-3]):([0-5][0-9])", time_str)
-            if match:
-                hour, minute = match.groups()
-                return f"{int(hour):02d}", f"{int(minute):02d}"
+            parsed = parse_time_string(time_str)
+            if parsed:
+                return parsed
             else:
                 print(f"{WARNING}Invalid time format. Please use HH:MM (e.g., 08:00 or 23:59).{ENDC}")
         except ValueError:
@@ -225,6 +3289,10 @@ def handle_interval_restart(): # Renamed from handle_hourly_restart
     print("From what time should the first restart in the interval begin?")
     start_hour_str, start_minute_str = get_valid_time_input()
 
+    get_scheduler_backend().install_job(*build_interval_schedule(n_hours, start_hour_str, start_minute_str))
+
+def build_interval_schedule(n_hours, start_hour_str, start_minute_str):
+    """Returns (cron schedule, description) for a restart every n_hours from a start time."""
     hours_to_schedule = set()
     h = int(start_hour_str)
     for _ in range(24): # Iterate at most 24 times to find all unique hours in the sequence
@@ -242,14 +3310,21 @@ def handle_interval_restart(): # Renamed from handle_hourly_restart
 
     cron_schedule = f"{start_minute_str} {hour_string} * * *"
     job_description = f"Every {n_hours} hours, starting at {start_hour_str}:{start_minute_str}"
+    return cron_schedule, job_description
+
+def build_daily_schedule(hour, minute):
+    """Returns (cron schedule, description) for a daily restart at HH:MM."""
+    return f"{minute} {hour} * * *", f"Daily at {hour}:{minute}"
 
-    add_cron_job(cron_schedule, job_description)
+def build_every_few_days_schedule(days, hour, minute):
+    """Returns (cron schedule, description) for a restart every N days at HH:MM."""
+    return f"{minute} {hour} */{days} * *", f"Every {days} days at {hour}:{minute}"
 
 def handle_daily_restart():
     print(f"\n{UNDERLINE}Setting up daily restart...{ENDC}")
     print("At what time should the daily restart occur?")
     hour, minute = get_valid_time_input()
-    add_cron_job(f"{minute} {hour} * * *", f"Daily at {hour}:{minute}")
+    get_scheduler_backend().install_job(*build_daily_schedule(hour, minute))
 
 def handle_every_few_days_restart():
     print(f"\n{UNDERLINE}Setting up restart every few days...{ENDC}")
@@ -268,30 +3343,43 @@ def handle_every_few_days_restart():
             print(f"{WARNING}Invalid input. Please enter a number.{ENDC}")
     print(f"At what time should the restart occur every {days} days?")
     hour, minute = get_valid_time_input()
-    add_cron_job(f"{minute} {hour} */{days} * *", f"Every {days} days at {hour}:{minute}")
+    get_scheduler_backend().install_job(*build_every_few_days_schedule(days, hour, minute))
 
-def handle_show_settings():
+def handle_show_settings(next_count=3):
     print(f"\n{UNDERLINE}Displaying current restart settings...{ENDC}")
-    jobs = get_script_cron_jobs()
+    backend = get_scheduler_backend()
+    jobs = backend.list_jobs()
     if jobs:
-        print(f"{OKGREEN}Restart tasks scheduled by this script:{ENDC}")
-        for job in jobs:
-            match_desc = re.search(r'\(([^)]+)\)$', job)
-            desc = match_desc.group(1) if match_desc else "No description"
-            cron_part_match = re.match(r'([^#]+)', job)
-            cron_part = cron_part_match.group(1).strip() if cron_part_match else "Scheduling undefined"
-            print(f"  - {BOLD}{cron_part}{ENDC} ({desc})")
+        print(f"{OKGREEN}Restart tasks scheduled by this script ({backend.name}):{ENDC}")
+        for parsed in jobs:
+            cron_part = f"{parsed['schedule']} {parsed['command']}".strip() or "Scheduling undefined"
+            print(f"  - {BOLD}{cron_part}{ENDC} ({parsed['description']})")
+            try:
+                upcoming = backend.next_runs(parsed, next_count)
+            except CronError as e:
+                print(f"    {WARNING}Cannot compute next restarts: {e}{ENDC}")
+                continue
+            if upcoming:
+                print("    Next restarts: " + ", ".join(t.strftime("%a %Y-%m-%d %H:%M") for t in upcoming))
     else:
-        print(f"{OKBLUE}ℹ️ No restart settings found by this script in crontab.{ENDC}")
+        print(f"{OKBLUE}ℹ️ No restart settings found by this script in {backend.name}.{ENDC}")
+    print(f"Restart strategy: {BOLD}{describe_reboot_strategy(resolve_reboot_strategy())}{ENDC}")
+    history = read_history()
+    if history:
+        last = history[-1]
+        downtime = history_durations(last)["downtime"]
+        issued = datetime.datetime.fromtimestamp(last["issued"]).strftime("%Y-%m-%d %H:%M")
+        print(f"Last restart: {BOLD}{issued}{ENDC} ({last.get('trigger', '?')}), downtime "
+              f"{f'{downtime:.0f}s' if downtime is not None else 'not measured yet'} - see 'history' for more.")
 
 def handle_clear_settings():
     print(f"\n{UNDERLINE}Clearing previous restart settings (keeps script file)...{ENDC}")
-    remove_all_script_cron_jobs(inform_user=True)
+    get_scheduler_backend().remove_all_jobs(inform_user=True)
 
 def handle_uninstall_script():
     print(f"\n{UNDERLINE}Uninstall script and settings...{ENDC}")
 
-    status_or_count = remove_all_script_cron_jobs(inform_user=True)
+    status_or_count = get_scheduler_backend().remove_all_jobs(inform_user=True)
 
     if status_or_count != -1: # Cron jobs cleared successfully or none existed
         # Message about cron jobs already printed by remove_all_script_cron_jobs
@@ -357,7 +3445,7 @@ def handle_uninstall_script():
                 print(f"  - Also consider checking common installation paths like: {BOLD}{common_install_path}{ENDC}")
     else: # status_or_count == -1 (failure clearing cron jobs)
         # Error message already printed by remove_all_script_cron_jobs or set_crontab
-        print(f"{FAIL}Could not complete the uninstallation of scheduled settings due to an error in crontab modification.{ENDC}")
+        print(f"{FAIL}Could not complete the uninstallation of scheduled settings due to an error while removing the scheduled tasks.{ENDC}")
         print(f"{FAIL}Script file has NOT been deleted.{ENDC}")
 
 
@@ -398,8 +3486,812 @@ def print_installation_instructions():
     print(f"  Now you can run the script from anywhere using: '{BOLD}sudo restart_scheduler{ENDC}'")
     print("=" * 60)
 
-def main():
-    """Main function to run the script."""
+# ---------------------------------------------------------------------------
+# Non-interactive command line interface
+# ---------------------------------------------------------------------------
+
+def cli_set(args):
+    """'set' subcommand: sets the default restart job without any prompts; other named jobs are kept."""
+    if args.daily:
+        parsed = parse_time_string(args.daily)
+        if not parsed:
+            print(f"{FAIL}Invalid time '{args.daily}'. Use HH:MM.{ENDC}")
+            return 2
+        schedule, description = build_daily_schedule(*parsed)
+    elif args.interval is not None:
+        if not 1 <= args.interval <= 24:
+            print(f"{FAIL}Number of hours must be between 1 and 24.{ENDC}")
+            return 2
+        parsed = parse_time_string(args.start)
+        if not parsed:
+            print(f"{FAIL}Invalid start time '{args.start}'. Use HH:MM.{ENDC}")
+            return 2
+        schedule, description = build_interval_schedule(args.interval, *parsed)
+    elif args.every_days is not None:
+        if args.every_days <= 0:
+            print(f"{FAIL}Number of days must be a positive integer greater than zero.{ENDC}")
+            return 2
+        parsed = parse_time_string(args.at)
+        if not parsed:
+            print(f"{FAIL}Invalid time '{args.at}'. Use HH:MM.{ENDC}")
+            return 2
+        schedule, description = build_every_few_days_schedule(args.every_days, *parsed)
+    else:
+        schedule = " ".join(args.cron.split())
+        try:
+            compile_cron_expression(schedule)
+        except CronError as e:
+            print(f"{FAIL}Invalid cron expression '{args.cron}': {e}{ENDC}")
+            return 2
+        description = f"Cron {schedule}"
+    if args.description:
+        description = args.description
+    ok = get_scheduler_backend().install_job(schedule, description, args.jitter)
+    refresh_status_cache()
+    return 0 if ok else 1
+
+def get_schedule_status(next_count=3):
+    """Returns the restart jobs installed by this script, with their next fire times, as a JSON-serializable dict."""
+    backend = get_scheduler_backend()
+    jobs = []
+    for job in backend.list_jobs():
+        try:
+            job["next_runs"] = [t.isoformat() for t in backend.next_runs(job, next_count)]
+        except CronError as e:
+            job["next_runs"] = []
+            job["error"] = str(e)
+        jobs.append(job)
+    return {"backend": backend.name, "reboot_strategy": resolve_reboot_strategy()["strategy"], "jobs": jobs}
+
+def cli_show(args):
+    """'show' subcommand."""
+    if args.json:
+        print(json.dumps(get_schedule_status(args.next), indent=2 if sys.stdout.isatty() else None))
+    else:
+        handle_show_settings(args.next)
+    return 0
+
+def build_status(next_count=STATUS_NEXT_RUNS):
+    """Status without spawning processes: jobs are read from root's spool file when it is readable
+    (even with the crontab command backend), and next runs come from the cron engine. A missing
+    spool file, or no spool directory and no crontab command, means no jobs.
+    Raises PermissionError when root's crontab is needed and the caller cannot read it.
+    """
+    backend = get_scheduler_backend()
+    spool_path = get_crontab_spool_path(SCHEDULER_USER)
+    if backend.name != "cron":
+        jobs = backend.list_jobs()
+    elif spool_path and os.access(spool_path, os.R_OK):
+        jobs = [parse_script_cron_job(line) for line in read_managed_lines_from_spool(spool_path)]
+    elif spool_path and os.access(os.path.dirname(spool_path), os.X_OK) and not os.path.lexists(spool_path):
+        jobs = [] # root has no crontab
+    elif not spool_path and not crontab_installed():
+        jobs = [] # no cron on this host
+    elif pwd.getpwuid(os.geteuid()).pw_name != SCHEDULER_USER:
+        # 'crontab -l' would list the caller's own crontab
+        raise PermissionError(f"{SCHEDULER_USER}'s crontab is not readable")
+    else:
+        jobs = backend.list_jobs()
+    for job in jobs:
+        job.pop("unit", None)
+        try:
+            job["next_runs"] = [t.isoformat() for t in next_cron_fire_times(job["schedule"], next_count)]
+        except CronError as e:
+            job["next_runs"] = []
+            job["error"] = str(e)
+    resolution = resolve_reboot_strategy()
+    return {"status": "ok", "backend": backend.name, "reboot_strategy": resolution["strategy"],
+            "reboot_command": resolution["command"], "jobs": jobs}
+
+def write_status_cache(key, status):
+    """Stores status for key, readable by everyone (best effort: unwritable locations just leave
+    polls uncached). A key with unverified parts is never stored.
+    """
+    if STATUS_KEY_UNVERIFIED in key:
+        return
+    tmp_path = f"{STATUS_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(STATUS_CACHE_PATH), mode=0o755, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "built": time.time(), "status": status}, f, separators=(',', ':'))
+            os.fchmod(f.fileno(), 0o644)
+        os.replace(tmp_path, STATUS_CACHE_PATH)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def get_cached_status(use_cache=True, store=None):
+    """Returns the status dict, from STATUS_CACHE_PATH when nothing it depends on has changed.
+    A rebuilt answer is stored when the cache was consulted, or when store is True.
+    """
+    key = status_cache_key()
+    status = read_status_cache(key) if use_cache else None
+    if status is not None:
+        return status
+    try:
+        status = build_status()
+    except PermissionError:
+        # root's crontab is hidden from the caller, but a cache whose whole key still matches
+        # holds root's current jobs, however old it is
+        cache = load_status_cache(key) if use_cache and STATUS_KEY_UNVERIFIED not in key else None
+        if cache is None:
+            raise
+        status = cache["status"]
+        now = datetime.datetime.now().isoformat()
+        for job in status["jobs"]:
+            upcoming = [t for t in job["next_runs"] if t > now]
+            if job["next_runs"] and not upcoming:
+                upcoming = [t.isoformat() for t in next_cron_fire_times(job["schedule"], STATUS_NEXT_RUNS)]
+            job["next_runs"] = upcoming
+        status["cached"] = True
+        return status
+    if use_cache if store is None else store:
+        write_status_cache(key, status)
+    status["cached"] = False
+    return status
+
+def refresh_status_cache():
+    """Rebuilds the status cache after a schedule change, so unprivileged pollers, which cannot
+    check root's crontab themselves, see it at once.
+    """
+    if os.geteuid() == 0:
+        try:
+            get_cached_status(use_cache=False, store=True)
+        except (OSError, CronError):
+            pass
+
+def cli_status(args):
+    """'status' subcommand: one line of JSON for monitoring agents. No banner, no root check."""
+    try:
+        status = get_cached_status(use_cache=not (args and args.no_cache))
+    except PermissionError as e:
+        print_status({"status": "error", "error": f"{e} and the cache is missing or out of date; run 'status' as root to rebuild it", "jobs": None})
+        return 1
+    except (OSError, CronError) as e:
+        print_status({"status": "error", "error": str(e), "jobs": None})
+        return 1
+    print_status(status)
+    return 0
+
+def cli_clear(args):
+    """'clear' subcommand."""
+    removed = get_scheduler_backend().remove_all_jobs(inform_user=not args.quiet)
+    refresh_status_cache()
+    return 0 if removed != -1 else 1
+
+# Shell-like word: runs of unquoted characters and '...' / "..." segments (no backslash escapes)
+INVENTORY_WORD_RE = re.compile(r"""(?:[^\s'"\\]+|'[^']*'|"[^"]*")+""")
+INVENTORY_QUOTED_RE = re.compile(r"'([^']*)'|" + r'"([^"]*)"')
+
+def split_inventory_line(line):
+    """Splits an inventory line like a shell would. shlex is ~50x slower, so it only handles backslashes."""
+    if '\\' in line:
+        return shlex.split(line)
+    return [INVENTORY_QUOTED_RE.sub(lambda m: m.group(1) if m.group(1) is not None else m.group(2), word)
+            if "'" in word or '"' in word else word
+            for word in INVENTORY_WORD_RE.findall(line)]
+
+def load_inventory(path):
+    """Reads a host inventory: one host per line, optionally followed by key=value labels.
+    Blank lines and '#' comments are ignored. '-' reads from stdin.
+    Returns a list of {"host": ..., "labels": {...}}.
+    """
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    hosts = []
+    seen = set()
+    with stream:
+        for line_number, raw in enumerate(stream, 1):
+            line = raw.split('#', 1)[0].strip()
+            if not line:
+                continue
+            tokens = split_inventory_line(line)
+            host, labels = tokens[0], {}
+            for token in tokens[1:]:
+                key, sep, value = token.partition('=')
+                if not sep:
+                    raise ValueError(f"{path}:{line_number}: expected key=value label, got '{token}'")
+                labels[key] = value
+            if host in seen:
+                continue
+            seen.add(host)
+            hosts.append({"host": host, "labels": labels})
+    return hosts
+
+def build_fleet_command(ssh_template, host, remote_command):
+    """Builds the argv that runs remote_command on host.
+    ssh_template is split like a shell command line; a '{command}' token becomes the whole
+    (shell-quoted) remote command as one argument, '{host}' is substituted anywhere.
+    """
+    argv = []
+    has_command = False
+    for token in shlex.split(ssh_template):
+        if token == "{command}":
+            argv.append(remote_command)
+            has_command = True
+        else:
+            argv.append(token.replace("{host}", host))
+    if not has_command:
+        argv.append(remote_command)
+    return argv
+
+def run_on_host(host, argv, timeout, retries, retry_delay=1.0):
+    """Runs argv for one host with a timeout and retries (exponential backoff). Returns a result dict."""
+    started = time.monotonic()
+    result = {"host": host, "ok": False, "attempts": 0, "returncode": None, "stdout": "", "stderr": ""}
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            proc = subprocess.run(argv, capture_output=True, text=True, timeout=timeout, stdin=subprocess.DEVNULL)
+            result.update(returncode=proc.returncode, stdout=proc.stdout, stderr=proc.stderr)
+            if proc.returncode == 0:
+                result["ok"] = True
+                break
+        except subprocess.TimeoutExpired:
+            result.update(returncode=None, stderr=f"timed out after {timeout}s")
+        except OSError as e:
+            result.update(returncode=None, stderr=str(e))
+            break # The runner itself is missing; retrying will not help
+        if attempt < retries:
+            time.sleep(retry_delay * (2 ** attempt))
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+def format_remote_args(remote_args, entry):
+    """Substitutes '{host}' and '{<label>}' placeholders in remote_args with the host's values."""
+    values = dict(entry["labels"], host=entry["host"])
+    return [re.sub(r'\{(\w+)\}', lambda m: values.get(m.group(1), m.group(0)), arg) for arg in remote_args]
+
+def run_fleet(hosts, remote_args, ssh_template, remote_command, parallel, timeout, retries, retry_delay=1.0, progress=None):
+    """Runs this script with remote_args on every host through a bounded worker pool.
+    Placeholders like {cron} in remote_args take the host's inventory labels.
+    Returns the per-host results in inventory order.
+    """
+    def command_for(entry):
+        args = format_remote_args(remote_args, entry)
+        return " ".join([remote_command] + [shlex.quote(arg) for arg in args])
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        futures = {
+            pool.submit(run_on_host, entry["host"], build_fleet_command(ssh_template, entry["host"], command_for(entry)),
+                        timeout, retries, retry_delay): entry["host"]
+            for entry in hosts
+        }
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results[result["host"]] = result
+            if progress:
+                progress(result, len(results), len(futures))
+    return [results[entry["host"]] for entry in hosts]
+
+def summarize_fleet_output(result):
+    """One-line summary of what a host returned, for the fleet table."""
+    text = result["stdout"].strip()
+    if result["ok"] and text.startswith('{'):
+        try:
+            jobs = json.loads(text).get("jobs", [])
+            return "; ".join(job["schedule"] for job in jobs) or "(no jobs)"
+        except ValueError:
+            pass
+    text = text or result["stderr"].strip()
+    last_line = re.sub(r'\x1b\[[0-9;]*m', '', text.splitlines()[-1]) if text else ""
+    return last_line[:80]
+
+def print_fleet_summary(results):
+    """Prints a per-host result table followed by totals."""
+    host_width = max([len("HOST")] + [len(r["host"]) for r in results])
+    print(f"{BOLD}{'HOST'.ljust(host_width)}  STATUS  TRIES  SECONDS  OUTPUT{ENDC}")
+    for r in results:
+        status = f"{OKGREEN}ok    {ENDC}" if r["ok"] else f"{FAIL}FAILED{ENDC}"
+        print(f"{r['host'].ljust(host_width)}  {status}  {r['attempts']:>5}  {r['elapsed']:>7.2f}  {summarize_fleet_output(r)}")
+    failed = sum(1 for r in results if not r["ok"])
+    color = FAIL if failed else OKGREEN
+    print(f"\n{color}{len(results) - failed}/{len(results)} hosts succeeded, {failed} failed.{ENDC}")
+
+def cli_fleet(args):
+    """'fleet' subcommand: applies or inspects schedules on many hosts in parallel."""
+    try:
+        hosts = load_inventory(args.inventory)
+    except (OSError, ValueError) as e:
+        print(f"{FAIL}Could not read inventory: {e}{ENDC}")
+        return 2
+    if args.limit:
+        wanted = set(args.limit.split(','))
+        hosts = [h for h in hosts if h["host"] in wanted]
+    if not hosts:
+        print(f"{WARNING}Inventory contains no hosts.{ENDC}")
+        return 2
+    remote_args = list(args.remote_args)
+    if remote_args and remote_args[0] == '--':
+        remote_args = remote_args[1:]
+    if not remote_args:
+        print(f"{FAIL}No remote action given (e.g. 'set --daily 04:30', 'show --json', 'clear').{ENDC}")
+        return 2
+
+    def progress(result, done, total):
+        if not args.json and sys.stderr.isatty():
+            sys.stderr.write(f"\r{done}/{total} hosts done")
+            sys.stderr.flush()
+
+    results = run_fleet(hosts, remote_args, args.ssh, args.remote_command, args.parallel,
+                        args.timeout, args.retries, args.retry_delay, progress)
+    if not args.json and sys.stderr.isatty():
+        sys.stderr.write("\n")
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_fleet_summary(results)
+    return 0 if all(r["ok"] for r in results) else 1
+
+def format_period_minute(start, period_minutes):
+    """Renders a minute of a daily/weekly period as 'HH:MM' or 'Sun HH:MM'."""
+    day, minute_of_day = divmod(start, 1440)
+    prefix = f"{['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'][day]} " if period_minutes > 1440 else ""
+    return f"{prefix}{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+def cli_plan(args):
+    """'plan' subcommand: staggers restart windows across an inventory."""
+    try:
+        hosts = load_inventory(args.inventory)
+        pool_limits = parse_pool_limits(args.pool_limit)
+        blackouts = [parse_time_window(w) for w in args.blackout or []]
+    except (OSError, ValueError) as e:
+        print(f"{FAIL}{e}{ENDC}")
+        return 2
+    if not 0 < args.max_down <= 1:
+        print(f"{FAIL}--max-down must be a fraction between 0 and 1.{ENDC}")
+        return 2
+    if args.granularity < 1:
+        print(f"{FAIL}--granularity must be a positive number of minutes.{ENDC}")
+        return 2
+    assignments, unplaced = plan_restart_windows(
+        hosts, args.period, args.max_down, pool_limits, blackouts, args.default_duration, args.granularity)
+    period_minutes = PLAN_PERIODS[args.period]
+
+    if args.format == "json":
+        print(json.dumps({"assignments": assignments, "unplaced": unplaced}, indent=2))
+    elif args.format == "inventory":
+        labels_by_host = {entry["host"]: entry["labels"] for entry in hosts}
+        for a in assignments:
+            labels = dict(labels_by_host[a["host"]], pool=a["pool"], duration=str(a["duration"]), cron=a["cron"])
+            print(" ".join([a["host"]] + [shlex.quote(f"{k}={v}") for k, v in labels.items()]))
+    else:
+        host_width = max([len("HOST")] + [len(a["host"]) for a in assignments])
+        pool_width = max([len("POOL")] + [len(a["pool"]) for a in assignments])
+        print(f"{BOLD}{'HOST'.ljust(host_width)}  {'POOL'.ljust(pool_width)}  {'START'.ljust(9)}  MIN  CRON{ENDC}")
+        for a in assignments:
+            print(f"{a['host'].ljust(host_width)}  {a['pool'].ljust(pool_width)}  "
+                  f"{format_period_minute(a['start'], period_minutes).ljust(9)}  {a['duration']:>3}  {a['cron']}")
+    if unplaced:
+        print(f"{FAIL}⚠️ {len(unplaced)} host(s) could not be placed within the constraints: "
+              f"{', '.join(unplaced[:10])}{' ...' if len(unplaced) > 10 else ''}{ENDC}", file=sys.stderr)
+        return 1
+    return 0
+
+def cli_simulate(args):
+    """'simulate' subcommand: replays planned schedules and reports peak concurrent downtime per pool."""
+    try:
+        hosts = load_inventory(args.inventory)
+        pool_limits = parse_pool_limits(args.pool_limit)
+        start = datetime.datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.datetime.now()
+        if args.cron:
+            compile_cron_expression(args.cron)
+    except (OSError, ValueError) as e:
+        print(f"{FAIL}{e}{ENDC}")
+        return 2
+    results, skipped = simulate_downtime(hosts, start, args.days, args.cron, args.default_duration)
+
+    report = {}
+    for pool, r in sorted(results.items()):
+        limit = pool_capacity(r["hosts"], pool_limits.get(pool, args.max_down)) if args.max_down or pool in pool_limits else None
+        report[pool] = {
+            "hosts": r["hosts"], "peak_down": r["peak"], "peak_fraction": round(r["peak"] / r["hosts"], 4),
+            "peak_at": r["peak_at"], "minutes_with_downtime": r["down_minutes"],
+            "host_downtime_minutes": r["host_minutes"], "limit": limit,
+            "minutes_over_limit": sum(1 for n in r["timeline"] if n > limit) if limit is not None else None,
+        }
+    violations = sum(1 for r in report.values() if r["minutes_over_limit"])
+    if args.json:
+        print(json.dumps({"days": args.days, "pools": report, "skipped": skipped}, indent=2))
+    else:
+        print(f"{BOLD}{'POOL'.ljust(16)} HOSTS  PEAK  PEAK%  PEAK AT           OVER LIMIT  HOST-MIN{ENDC}")
+        for pool, r in report.items():
+            over = "-" if r["limit"] is None else f"{r['minutes_over_limit']} min"
+            color = FAIL if r["minutes_over_limit"] else ""
+            peak_at = (r["peak_at"] or "-")[:16].replace('T', ' ')
+            print(f"{color}{pool[:16].ljust(16)} {r['hosts']:>5}  {r['peak_down']:>4}  {r['peak_fraction'] * 100:>4.1f}  "
+                  f"{peak_at.ljust(16)}  {over:>10}  {r['host_downtime_minutes']:>8}{ENDC if color else ''}")
+        if skipped:
+            print(f"{WARNING}Skipped {len(skipped)} host(s)/schedule(s) without a usable cron schedule.{ENDC}")
+    return 1 if violations else 0
+
+def cli_gate(args):
+    """'gate' subcommand: run by the scheduled job instead of calling reboot directly."""
+    if args.dry_run:
+        settings = load_gate_settings()
+        signals, busy = sample_gate_signals(settings)
+        resolution = resolve_reboot_strategy(args.strategy)
+        lease = None
+        lease_settings = load_lease_settings()
+        backend = get_lease_backend(lease_settings)
+        if backend:
+            lease = {"backend": lease_settings["backend"], "pool": lease_settings["pool"], "slots": lease_settings["slots"]}
+            try:
+                lease["holders"] = [item["holder"] for item in backend.list(lease_settings["pool"])]
+            except OSError as e:
+                lease["error"] = str(e)
+        print(json.dumps({"signals": signals, "busy": busy, "would_reboot": not busy,
+                          "strategy": resolution["strategy"], "skipped_strategies": resolution["skipped"],
+                          "lease": lease}, indent=2))
+        return 0 if not busy else 1
+    return 0 if run_reboot_gate(args.trigger, args.deadline, args.strategy) else 1
+
+def cli_watch(args):
+    """'watch' subcommand: condition-triggered restarts."""
+    if args.install:
+        return 0 if install_watch_service() else 1
+    settings = load_watch_settings()
+    if args.once:
+        sample = ProcSampler().sample()
+        sample.pop("time")
+        print(json.dumps({"sample": sample, "breached": breached_metrics(sample, settings["thresholds"])}, indent=2))
+        return 0
+    if args.interval:
+        settings["interval"] = args.interval
+    if not any(limit is not None for limit in settings["thresholds"].values()):
+        print(f"{FAIL}No [watch] thresholds configured in {CONFIG_PATH}; nothing to watch.{ENDC}")
+        return 2
+    run_watch(settings, dry_run=args.dry_run)
+    return 0
+
+def cli_boot(args):
+    """'boot' subcommand: post-boot hook (history completion and metrics)."""
+    if args.install:
+        return 0 if install_boot_service() else 1
+    run_boot_hook()
+    return 0
+
+def cli_pagecache(args):
+    """'pagecache' subcommand: take a snapshot or warm up from one by hand."""
+    settings = load_warmup_settings()
+    if args.action == "snapshot":
+        if args.path:
+            settings["paths"] = args.path
+        if not settings["paths"]:
+            print(f"{FAIL}No paths: set [warmup] paths or pass them as arguments.{ENDC}")
+            return 2
+        files, extents, report = take_pagecache_snapshot(settings)
+        report["output"] = write_pagecache_snapshot(files, extents, report, args.file)
+    else:
+        report = warm_pagecache(settings, args.file)
+        if report is None:
+            print(f"{FAIL}No readable snapshot at {args.file or PAGECACHE_SNAPSHOT_PATH}.{ENDC}")
+            return 1
+    if args.json:
+        print(json.dumps(report, indent=2 if sys.stdout.isatty() else None))
+    elif args.action == "snapshot":
+        print(f"{OKGREEN}✅ {format_bytes(report['resident_bytes'])} resident in {report['extents']} extents of "
+              f"{report['files']} files ({format_bytes(report['scanned_bytes'])} scanned in {report['seconds']:.2f}s"
+              f"{', truncated' if report['truncated'] else ''}) -> {report['output']}{ENDC}")
+    else:
+        print(f"{OKGREEN}✅ Loaded {format_bytes(report['resident_bytes'])} of {format_bytes(report['requested_bytes'])} "
+              f"from {report['files']} files in {report['seconds']:.1f}s{ENDC}"
+              + (f" ({report['skipped_files']} changed files skipped)" if report["skipped_files"] else ""))
+    return 0
+
+def cli_lease(args):
+    """'lease' subcommand: list the holders of this host's pool, or release this host's lease."""
+    settings = load_lease_settings()
+    backend = get_lease_backend(settings)
+    if backend is None:
+        print(f"{WARNING}Restart admission is disabled: set [lease] backend to {' or '.join(LEASE_BACKENDS[1:])}.{ENDC}")
+        return 2
+    if args.action == "release":
+        released = release_restart_lease("manual")
+        print(f"{OKGREEN}✅ Lease released.{ENDC}" if released else f"{WARNING}This host holds no lease.{ENDC}")
+        return 0
+    try:
+        leases = backend.list(settings["pool"])
+    except OSError as e:
+        print(f"{FAIL}⚠️ Lease backend unavailable: {e}{ENDC}")
+        return 1
+    print(f"{BOLD}Pool {settings['pool']}: {len(leases)} of {settings['slots']} slots taken{ENDC}")
+    for lease in leases:
+        expires = datetime.datetime.fromtimestamp(lease["expires"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"  {OKBLUE}{lease['holder']:30}{ENDC} expires {expires}")
+    return 0
+
+def cli_lease_server(args):
+    """'lease-server' subcommand: serves leases to the gates of a whole fleet."""
+    serve_leases(args.bind, args.port, args.state)
+    return 0
+
+def cli_pre_reboot(args):
+    """'pre-reboot' subcommand: runs the shutdown stages by hand and starts the stopped services
+    again, to find the slow stage without rebooting. The kill stage only runs with --kill: what it
+    kills is not brought back.
+    """
+    settings = load_shutdown_settings()
+    if not args.kill:
+        settings["stages"] = [stage for stage in settings["stages"] if stage != "kill"]
+    elif not args.dry_run:
+        print(f"{WARNING}--kill: services that do not stop in time and the [shutdown] kill_processes are killed "
+              f"and not started again.{ENDC}", file=sys.stderr)
+    report = run_shutdown_pipeline(settings, "manual", dry_run=args.dry_run)
+    if not args.dry_run:
+        restart_stopped_services(report["stopped"], "manual")
+    if args.json:
+        print(json.dumps(report["stages"], indent=2 if sys.stdout.isatty() else None))
+        return 0
+    for stage, value in report["stages"].items():
+        if args.dry_run:
+            print(f"{OKBLUE}{stage:6}{ENDC} " + ", ".join(f"{key}: {' '.join(map(str, item)) if isinstance(item, list) else item}"
+                                                         for key, item in value.items()))
+        else:
+            print(f"{OKBLUE}{stage:6}{ENDC} {value:.2f}s")
+    return 0
+
+def format_bytes(count):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TiB"
+
+def cli_history(args):
+    """'history' subcommand: recent restarts with their durations."""
+    records = read_history()[-args.limit:] if args.limit else read_history()
+    if args.export:
+        path = export_prometheus_textfile()
+        if not path:
+            print(f"{WARNING}Textfile directory does not exist; set [history] textfile.{ENDC}", file=sys.stderr)
+            return 1
+    if args.json:
+        print(json.dumps([dict(r, durations=history_durations(r)) for r in records], indent=2))
+        return 0
+    if not records:
+        print(f"{OKBLUE}ℹ️ No restarts recorded yet.{ENDC}")
+        return 0
+    print(f"{BOLD}{'ISSUED'.ljust(19)}  {'TRIGGER'.ljust(7)}  {'STRATEGY'.ljust(11)}  DELAY  SHUTDOWN   BOOT  DOWNTIME{ENDC}")
+    for r in records:
+        d = history_durations(r)
+        cells = [f"{d[k]:>{w}.0f}" if d[k] is not None else "-".rjust(w) for k, w in
+                 (("delay", 5), ("shutdown", 8), ("boot", 6), ("downtime", 8))]
+        issued = datetime.datetime.fromtimestamp(r["issued"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{issued}  {r.get('trigger', '-')[:7].ljust(7)}  {r.get('strategy', 'full')[:11].ljust(11)}  " + "  ".join(cells)
+              + (f"  {FAIL}failed{ENDC}" if r.get("failed") else ""))
+    downtimes = sorted(d for d in (history_durations(r)["downtime"] for r in records if not r.get("failed")) if d is not None)
+    if downtimes:
+        print("\nDowntime p50 {:.0f}s  p90 {:.0f}s  p99 {:.0f}s over {} restart(s)".format(
+            *(percentile(downtimes, q) for q in DOWNTIME_QUANTILES), len(downtimes)))
+    return 0
+
+def cli_restart_services(args):
+    """'restart-services' subcommand: restart a [services GROUP] now (also what service jobs run)."""
+    try:
+        settings = load_service_group(args.group, args.file)
+    except ValueError as e:
+        print(f"{FAIL}{e}{ENDC}")
+        return 2
+    report = run_service_restart(settings, dry_run=args.dry_run)
+    if args.json:
+        print(json.dumps(report, indent=2 if sys.stdout.isatty() else None))
+        return 0 if report["ok"] else 1
+    for index, tier in enumerate(report["tiers"]):
+        print(f"{BOLD}Tier {index + 1}{ENDC}" + (f" ({tier['seconds']:.1f}s)" if "seconds" in tier else ""))
+        for target in tier["targets"]:
+            if args.dry_run:
+                print(f"  {target['target']}: {len(target['instances'])} instance(s), {target['batch_size']} at a time")
+                continue
+            for instance in target["instances"]:
+                phases = "  ".join(f"{phase} {seconds:.1f}s" for phase, seconds in instance["phases"].items())
+                mark = f"{OKGREEN}ok{ENDC}" if instance["ok"] else f"{FAIL}FAILED: {instance['error']}{ENDC}"
+                print(f"  {instance['instance']:<32} {phases:<36} {mark}")
+    if report.get("skipped"):
+        print(f"{WARNING}Not restarted because an earlier tier failed: {', '.join(report['skipped'])}{ENDC}")
+    if not args.dry_run:
+        color = OKGREEN if report["ok"] else FAIL
+        print(f"{color}{'✅ Done' if report['ok'] else '⚠️ Failed'} in {report['seconds']:.1f}s.{ENDC}")
+    return 0 if report["ok"] else 1
+
+def cli_reconcile(args):
+    """'reconcile' subcommand: converge the installed jobs to the desired-state file."""
+    try:
+        desired = load_desired_schedules(args.file)
+    except ValueError as e:
+        print(f"{FAIL}{e}{ENDC}")
+        return 2
+    reboots = [job for job in desired if not job.get("services")]
+    if reboots and not resolve_reboot_command():
+        print(f"{WARNING}No reboot or shutdown command found; the jobs will fail when they run.{ENDC}")
+    backend = get_scheduler_backend()
+    try:
+        diff = backend.reconcile_jobs(desired, dry_run=args.dry_run)
+    except CronError as e:
+        print(f"{FAIL}Cannot express a schedule with the {backend.name} backend: {e}{ENDC}")
+        return 2
+    diff["backend"] = backend.name
+    if args.json:
+        print(json.dumps(diff))
+    else:
+        schedules = {job["id"]: job["schedule"] for job in desired}
+        for key, mark, color in (("added", "+", OKGREEN), ("changed", "~", WARNING), ("removed", "-", FAIL)):
+            for job_id in diff[key]:
+                print(f"{color}{mark} {job_id}{ENDC}" + (f"  {schedules[job_id]}" if job_id in schedules else ""))
+        if not diff_has_changes(diff):
+            print(f"{OKGREEN}✅ {len(desired)} schedule(s) already up to date; nothing written.{ENDC}")
+        elif args.dry_run:
+            print(f"{OKBLUE}Dry run: nothing written.{ENDC}")
+        elif diff["written"] and "error" not in diff:
+            print(f"{OKGREEN}✅ Applied: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+                  f"{len(diff['removed'])} removed.{ENDC}")
+    if reboots and diff["written"] and "error" not in diff:
+        # a no-op pass (e.g. from a timer) must not probe strategies or reload a kexec kernel
+        stage_reboot_strategy(inform_user=not args.json)
+    if diff["written"]:
+        refresh_status_cache()
+    if "error" in diff:
+        print(f"{FAIL}⚠️ {diff['error']}{ENDC}", file=sys.stderr)
+        return 1
+    return 3 if args.check and diff_has_changes(diff) else 0
+
+def build_arg_parser():
+    """Builds the argument parser for the non-interactive interface."""
+    parser = argparse.ArgumentParser(
+        prog="restart_scheduler",
+        description="Schedule system restarts through cron. Run without arguments for the interactive menu.")
+    sub = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    p = sub.add_parser("set", help="set the default restart job (named [schedule] jobs are kept)")
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--daily", metavar="HH:MM", help="restart every day at HH:MM")
+    group.add_argument("--interval", type=int, metavar="N", help="restart every N hours (1-24), see --start")
+    group.add_argument("--every-days", type=int, metavar="N", help="restart every N days, see --at")
+    group.add_argument("--cron", metavar="EXPR", help="raw 5-field cron expression")
+    p.add_argument("--start", default="00:00", metavar="HH:MM", help="first restart of --interval (default 00:00)")
+    p.add_argument("--at", default="00:00", metavar="HH:MM", help="time of day for --every-days (default 00:00)")
+    p.add_argument("--description", help="description stored with the job")
+    p.add_argument("--jitter", type=int, metavar="SECONDS",
+                   help="random delay spreading a fleet's restarts (systemd backend, RandomizedDelaySec=)")
+    p.set_defaults(func=cli_set, needs_root=True)
+
+    p = sub.add_parser("show", help="show the scheduled restarts")
+    p.add_argument("--json", action="store_true", help="machine-readable output")
+    p.add_argument("-n", "--next", type=int, default=3, metavar="N", help="number of upcoming restarts to list (default 3)")
+    p.set_defaults(func=cli_show, needs_root=True)
+
+    p = sub.add_parser("status", help="print installed jobs, next runs and reboot command as JSON (cached; root builds the cache)")
+    p.add_argument("--no-cache", action="store_true", help=f"ignore and do not update {STATUS_CACHE_PATH}")
+    p.set_defaults(func=cli_status, needs_root=False)
+
+    p = sub.add_parser("clear", help="remove the scheduled restarts (keeps the script)")
+    p.add_argument("-q", "--quiet", action="store_true")
+    p.set_defaults(func=cli_clear, needs_root=True)
+
+    p = sub.add_parser("reconcile", help="install exactly the [schedule NAME] jobs of a desired-state file")
+    p.add_argument("-f", "--file", default=CONFIG_PATH, help=f"desired-state file (default {CONFIG_PATH})")
+    p.add_argument("--dry-run", action="store_true", help="only report the differences")
+    p.add_argument("--check", action="store_true", help="exit with status 3 when anything differs")
+    p.add_argument("--json", action="store_true", help="print the diff as JSON")
+    p.set_defaults(func=cli_reconcile, needs_root=True)
+
+    p = sub.add_parser("restart-services", help="restart a [services GROUP] in dependency order with health checks")
+    p.add_argument("group", help="name of the [services GROUP] config section")
+    p.add_argument("-f", "--file", default=CONFIG_PATH, help=f"file holding the section (default {CONFIG_PATH})")
+    p.add_argument("--dry-run", action="store_true", help="only print the tiers and rolling batches")
+    p.add_argument("--json", action="store_true", help="print the per-phase timings as JSON")
+    p.set_defaults(func=cli_restart_services, needs_root=True)
+
+    p = sub.add_parser("gate", help="reboot once the host is quiet (used by the scheduled job)")
+    p.add_argument("--deadline", type=float, metavar="SECONDS", help="reboot anyway after this long (default: config or 3600)")
+    p.add_argument("--trigger", default="cron", help="name recorded in the log for what started the gate")
+    p.add_argument("--dry-run", action="store_true", help="only sample the signals and report whether the host is quiet")
+    p.add_argument("--strategy", metavar="LIST", help="restart strategies to try, e.g. 'kexec,full' (default: [reboot] strategy)")
+    p.set_defaults(func=cli_gate, needs_root=True)
+
+    p = sub.add_parser("lease", help="show or give back this pool's restart leases ([lease] config)")
+    p.add_argument("action", choices=["list", "release"])
+    p.set_defaults(func=cli_lease, needs_root=False)
+
+    p = sub.add_parser("lease-server", help="run the bundled TCP lease server for restart admission")
+    p.add_argument("--bind", default="127.0.0.1", help="address to listen on (default 127.0.0.1)")
+    p.add_argument("--port", type=int, default=LEASE_PORT, help=f"port to listen on (default {LEASE_PORT}, 0 = any)")
+    p.add_argument("--state", metavar="FILE", help="keep the leases in FILE so a restarted server remembers them")
+    p.set_defaults(func=cli_lease_server, needs_root=False)
+
+    p = sub.add_parser("pre-reboot", help="time the pre-reboot shutdown pipeline without rebooting ([shutdown] config)")
+    p.add_argument("--dry-run", action="store_true", help="only list what each stage would act on")
+    p.add_argument("--kill", action="store_true", help="also run the kill stage; killed processes are not restarted")
+    p.add_argument("--json", action="store_true", help="print the stage timings as JSON")
+    p.set_defaults(func=cli_pre_reboot, needs_root=True)
+
+    p = sub.add_parser("watch", help="restart when memory health stays degraded ([watch] config)")
+    p.add_argument("--once", action="store_true", help="print one sample and the breached thresholds, then exit")
+    p.add_argument("--dry-run", action="store_true", help="log triggers without rebooting")
+    p.add_argument("--interval", type=float, metavar="SECONDS", help="override the sampling interval")
+    p.add_argument("--install", action="store_true", help="install and start a systemd service running 'watch'")
+    p.set_defaults(func=cli_watch, needs_root=True)
+
+    p = sub.add_parser("boot", help="post-boot hook: complete the restart history and export metrics")
+    p.add_argument("--install", action="store_true", help=f"install {BOOT_UNIT} to run this after every boot")
+    p.set_defaults(func=cli_boot, needs_root=True)
+
+    p = sub.add_parser("pagecache", help="snapshot resident file pages or warm the page cache from a snapshot")
+    p.add_argument("action", choices=["snapshot", "warm"])
+    p.add_argument("path", nargs="*", help="files or directories to snapshot (default: [warmup] paths)")
+    p.add_argument("-f", "--file", help=f"snapshot file (default {PAGECACHE_SNAPSHOT_PATH})")
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.set_defaults(func=cli_pagecache, needs_root=True)
+
+    p = sub.add_parser("history", help="show recorded restarts and downtime percentiles")
+    p.add_argument("-n", "--limit", type=int, default=20, help="number of restarts to show (0 for all, default 20)")
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--export", action="store_true", help="also rewrite the Prometheus textfile")
+    p.set_defaults(func=cli_history, needs_root=False)
+
+    p = sub.add_parser("fleet", help="run a set/show/clear action on many hosts in parallel")
+    p.add_argument("-i", "--inventory", required=True, help="host inventory file ('-' for stdin)")
+    p.add_argument("-p", "--parallel", type=int, default=32, help="concurrent hosts (default 32)")
+    p.add_argument("-t", "--timeout", type=float, default=30.0, help="per-attempt timeout in seconds (default 30)")
+    p.add_argument("-r", "--retries", type=int, default=1, help="retries per host after a failure (default 1)")
+    p.add_argument("--retry-delay", type=float, default=1.0, help="initial retry backoff in seconds (default 1)")
+    p.add_argument("--ssh", default="ssh -o BatchMode=yes -o ConnectTimeout=10 {host} {command}",
+                   help="command template used to reach a host; '{host}' and '{command}' are substituted")
+    p.add_argument("--remote-command", default="restart_scheduler",
+                   help="how to invoke this script on the hosts (default: restart_scheduler)")
+    p.add_argument("--limit", metavar="HOST,...", help="only act on these hosts")
+    p.add_argument("--json", action="store_true", help="print per-host results as JSON")
+    p.add_argument("remote_args", nargs=argparse.REMAINDER, help="action and arguments, e.g. set --daily 04:30")
+    p.set_defaults(func=cli_fleet, needs_root=False)
+
+    p = sub.add_parser("plan", help="stagger restart windows across an inventory (labels: pool=, duration=)")
+    p.add_argument("-i", "--inventory", required=True, help="host inventory file ('-' for stdin)")
+    p.add_argument("--period", choices=sorted(PLAN_PERIODS), default="daily", help="restart once per day or week")
+    p.add_argument("--max-down", type=float, default=0.1, metavar="FRACTION",
+                   help="max fraction of a pool down at once (default 0.1, at least one host)")
+    p.add_argument("--pool-limit", action="append", metavar="POOL=FRACTION", help="per-pool override of --max-down")
+    p.add_argument("--blackout", action="append", metavar="HH:MM-HH:MM", help="no reboots in this daily window")
+    p.add_argument("--default-duration", type=int, default=10, metavar="MIN",
+                   help="reboot duration for hosts without a duration= label (default 10)")
+    p.add_argument("--granularity", type=int, default=1, metavar="MIN", help="spacing of candidate start minutes")
+    p.add_argument("--format", choices=["table", "json", "inventory"], default="table",
+                   help="'inventory' adds cron= labels for 'simulate' and 'fleet ... set --cron {cron}'")
+    p.set_defaults(func=cli_plan, needs_root=False)
+
+    p = sub.add_parser("simulate", help="replay schedules minute by minute and report peak downtime per pool")
+    p.add_argument("-i", "--inventory", required=True, help="inventory with cron= labels (e.g. from 'plan --format inventory')")
+    p.add_argument("--cron", help="schedule for hosts without a cron= label")
+    p.add_argument("--days", type=int, default=30, help="days to simulate (default 30)")
+    p.add_argument("--start", metavar="YYYY-MM-DD", help="first simulated day (default today)")
+    p.add_argument("--max-down", type=float, default=None, metavar="FRACTION", help="report minutes above this pool fraction")
+    p.add_argument("--pool-limit", action="append", metavar="POOL=FRACTION", help="per-pool override of --max-down")
+    p.add_argument("--default-duration", type=int, default=10, metavar="MIN",
+                   help="reboot duration for hosts without a duration= label (default 10)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cli_simulate, needs_root=False)
+    return parser
+
+def main(argv=None):
+    """Entry point: interactive menu without arguments, subcommands otherwise."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        run_interactive_menu()
+        return 0
+    if argv == ["status"]:
+        # polled by monitoring every few seconds: skip building the argument parser
+        return cli_status(None)
+    args = build_arg_parser().parse_args(argv)
+    if not getattr(args, "func", None):
+        build_arg_parser().print_help()
+        return 2
+    if args.needs_root:
+        check_root()
+    return args.func(args)
+
+def run_interactive_menu():
+    """Runs the interactive menu."""
     check_root()
     clear_screen()
     print_installation_instructions()
@@ -419,6 +4311,7 @@ def main():
 
         if choice in actions:
             actions[choice]()
+            refresh_status_cache()
             # If handle_uninstall_script was called and successful, sys.exit(0) would have ended the script.
             # Otherwise, or for other actions, the loop continues.
         elif choice == str(len(actions) + 1): # Exit option
@@ -430,4 +4323,4 @@ def main():
         clear_screen()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
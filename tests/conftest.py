@@ -0,0 +1,31 @@
+"""Imports restart_scheduler.py from the repository root with every path it writes to
+(log, lock, state, status cache, config) pointed into a temporary directory.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+_sandbox = tempfile.mkdtemp(prefix="rs-tests-")
+for name, value in {
+    "RESTART_SCHEDULER_CONFIG": os.path.join(_sandbox, "none.conf"),
+    "RESTART_SCHEDULER_LOG": os.path.join(_sandbox, "restart_scheduler.log"),
+    "RESTART_SCHEDULER_LOCK": os.path.join(_sandbox, "restart_scheduler.lock"),
+    "RESTART_SCHEDULER_STATE_DIR": os.path.join(_sandbox, "state"),
+    "RESTART_SCHEDULER_STATUS_CACHE": os.path.join(_sandbox, "status.json"),
+}.items():
+    os.environ[name] = value
+
+import restart_scheduler  # noqa: E402
+
+
+@pytest.fixture
+def rs(tmp_path, monkeypatch):
+    """The script module, logging into tmp_path."""
+    monkeypatch.setattr(restart_scheduler, "LOG_PATH", str(tmp_path / "restart_scheduler.log"))
+    return restart_scheduler
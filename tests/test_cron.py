@@ -0,0 +1,112 @@
+"""compile_cron_expression and iter_cron_fire_times checked against a brute-force minute scan."""
+
+import datetime
+
+import pytest
+
+START = datetime.datetime(2027, 1, 1, 0, 0)
+DAYS = 400
+
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+NAMES = {3: {"jan": 1, "feb": 2, "jun": 6, "dec": 12}, 4: {"sun": 0, "mon": 1, "fri": 5, "sat": 6}}
+
+
+def expand(field, index):
+    """Values a single cron field allows, written independently of the parser."""
+    low, high = FIELD_RANGES[index]
+    values = set()
+    for part in field.split(","):
+        base, _, step = part.partition("/")
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(NAMES.get(index, {}).get(v.lower(), v)) for v in base.split("-"))
+        else:
+            start = int(NAMES.get(index, {}).get(base.lower(), base))
+            end = high if step else start
+        values.update(range(start, end + 1, int(step or 1)))
+    if index == 4 and 7 in values:
+        values = (values - {7}) | {0}
+    return values
+
+
+def brute_force(expression, after, days):
+    """Every matching minute in (after, after + days], checking each minute of each matching day."""
+    fields = expression.split()
+    minutes, hours, doms, months, dows = (expand(f, i) for i, f in enumerate(fields))
+    dom_star, dow_star = fields[2].startswith("*"), fields[4].startswith("*")
+    moment = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    end = after + datetime.timedelta(days=days)
+    fire_times = []
+    while moment <= end:
+        dom_ok = moment.day in doms
+        dow_ok = (moment.isoweekday() % 7) in dows
+        if dom_star or dow_star:
+            day_ok = dom_ok and dow_ok
+        else:
+            day_ok = dom_ok or dow_ok
+        if not (day_ok and moment.month in months):
+            # Nothing fires today; jump to the next midnight to keep the scan fast
+            moment = datetime.datetime.combine(moment.date() + datetime.timedelta(days=1), datetime.time())
+            continue
+        if moment.hour in hours and moment.minute in minutes:
+            fire_times.append(moment)
+        moment += datetime.timedelta(minutes=1)
+    return fire_times
+
+
+def engine(rs, expression, after, days):
+    end = after + datetime.timedelta(days=days)
+    fire_times = []
+    for fire_time in rs.iter_cron_fire_times(expression, after):
+        if fire_time > end:
+            break
+        fire_times.append(fire_time)
+    return fire_times
+
+
+@pytest.mark.parametrize("expression", [
+    "30 4 * * *",
+    "*/15 2-3 * * *",
+    "0 0 13 * 5",          # the 13th OR any Friday
+    "0 12 1,15 * mon",     # the 1st, the 15th OR any Monday
+    "0 6 * * 1-5",         # weekdays only: a '*' day of month does not widen the match
+    "0 6 1-7 * *",
+    "0 6 */10 * 0",
+    "5 23 29 feb *",       # leap day only
+    "0 1 * jun-dec/2 sat,sun",
+    "0 3 * * 7",           # 7 is Sunday
+    "10,20 8 31 * *",
+])
+def test_fire_times_match_a_minute_scan(rs, expression):
+    assert engine(rs, expression, START, DAYS) == brute_force(expression, START, DAYS)
+
+
+def test_leap_day_schedule_skips_to_the_next_leap_year(rs):
+    assert rs.next_cron_fire_times("0 0 29 2 *", 2, START) == [
+        datetime.datetime(2028, 2, 29), datetime.datetime(2032, 2, 29)]
+
+
+def test_fire_times_are_strictly_after_the_start(rs):
+    after = datetime.datetime(2027, 3, 1, 4, 30, 15)
+    assert rs.next_cron_fire_times("30 4 * * *", 1, after) == [datetime.datetime(2027, 3, 2, 4, 30)]
+
+
+def test_macros_compile_like_their_expansion(rs):
+    for macro, expansion in rs.CRON_MACROS.items():
+        assert engine(rs, macro, START, 40) == brute_force(expansion, START, 40)
+    assert rs.compile_cron_expression("@reboot").at_reboot
+    assert list(rs.iter_cron_fire_times("@reboot", START)) == []
+
+
+def test_impossible_date_yields_nothing(rs):
+    assert rs.next_cron_fire_times("0 0 31 2 *", 1, START) == []
+
+
+@pytest.mark.parametrize("expression", [
+    "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "* * * * 8",
+    "*/0 * * * *", "5-1 * * * *", "* * * foo *", "* * * *",
+])
+def test_invalid_expressions_raise_cron_error(rs, expression):
+    with pytest.raises(rs.CronError):
+        rs.compile_cron_expression(expression)
@@ -0,0 +1,94 @@
+"""Crontab editing: the managed block, setting one job, and reconcile."""
+
+import inspect
+import types
+
+import pytest
+
+
+@pytest.fixture
+def crontab(rs, tmp_path, monkeypatch):
+    """Root's crontab as a spool file in tmp_path, edited through the spool backend.
+    Returns the spool file's path and the list of stage_reboot_strategy calls.
+    """
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setattr(rs, "CRONTAB_SPOOL_DIRS", [str(spool_dir)])
+    monkeypatch.setattr(rs, "CRON_BACKEND", "spool")
+    monkeypatch.setattr(rs, "CRON_LOCK_PATH", str(tmp_path / "crontab.lock"))
+    monkeypatch.setattr(rs, "STATUS_CACHE_PATH", str(tmp_path / "status.json"))
+    monkeypatch.setattr(rs, "resolve_reboot_command", lambda: "true")
+    staged = []
+    monkeypatch.setattr(rs, "stage_reboot_strategy", lambda inform_user=True: staged.append(inform_user))
+    return types.SimpleNamespace(path=spool_dir / rs.get_crontab_spool_path().rsplit("/", 1)[1], staged=staged)
+
+
+def job_ids(rs):
+    return [rs.parse_script_cron_job(line)["id"] for line in rs.get_script_cron_jobs()]
+
+
+def test_reconcile_writes_and_stages_only_when_something_changed(rs, crontab, tmp_path, capsys):
+    config = tmp_path / "desired.conf"
+    config.write_text("[schedule nightly]\ndaily = 05:00\n\n[schedule weekly]\ncron = 0 2 * * 0\n")
+    args = rs.build_arg_parser().parse_args(["reconcile", "--file", str(config), "--json"])
+    assert rs.cli_reconcile(args) == 0
+    assert crontab.staged == [False]
+    assert job_ids(rs) == ["nightly", "weekly"]
+    written = crontab.path.stat().st_mtime_ns, crontab.path.read_text()
+
+    assert rs.cli_reconcile(args) == 0
+    assert '"written": false' in capsys.readouterr().out.splitlines()[-1]
+    assert crontab.staged == [False]
+    assert (crontab.path.stat().st_mtime_ns, crontab.path.read_text()) == written
+
+
+def test_both_backends_install_named_jobs(rs, crontab):
+    backend = rs.CronBackend()
+    assert backend.install_job("30 4 * * *", "Daily at 04:30")
+    assert backend.install_job("0 2 * * 0", "Weekly", name="weekly")
+    assert job_ids(rs) == ["default", "weekly"]
+    assert inspect.signature(rs.CronBackend.install_job) == inspect.signature(rs.SystemdTimerBackend.install_job)
+
+
+def test_set_replaces_only_the_job_with_the_matching_id(rs, crontab):
+    crontab.path.write_text("*/5 * * * * /usr/local/bin/backup\n")
+    assert rs.add_cron_job("30 4 * * *", "Daily at 04:30")
+    assert rs.add_cron_job("0 2 * * 0", "Weekly", job_id="weekly")
+    assert rs.add_cron_job("0 5 * * *", "Daily at 05:00")
+    jobs = [rs.parse_script_cron_job(line) for line in rs.get_script_cron_jobs()]
+    assert [(job["id"], job["schedule"]) for job in jobs] == [("default", "0 5 * * *"), ("weekly", "0 2 * * 0")]
+    assert crontab.path.read_text().startswith("*/5 * * * * /usr/local/bin/backup\n")
+
+
+def test_set_collapses_duplicate_ids(rs, crontab):
+    weekly = rs.format_script_cron_job("0 2 * * 0", "true", "weekly", "Weekly")
+    first = rs.format_script_cron_job("30 4 * * *", "true", "default", "Daily at 04:30")
+    second = rs.format_script_cron_job("0 6 * * *", "true", "default", "Daily at 06:00")
+    crontab.path.write_text(rs.splice_managed_block("", [first, weekly, second]))
+    assert rs.add_cron_job("0 5 * * *", "Daily at 05:00")
+    jobs = [rs.parse_script_cron_job(line) for line in rs.get_script_cron_jobs()]
+    assert [(job["id"], job["schedule"]) for job in jobs] == [("default", "0 5 * * *"), ("weekly", "0 2 * * 0")]
+
+
+def test_backend_reconcile_writes_nothing_when_the_state_matches(rs, crontab, monkeypatch):
+    desired = [{"id": "nightly", "schedule": "0 3 * * *", "description": "Nightly", "jitter": 0},
+               {"id": "weekly", "schedule": "0 2  * * 0", "description": "Weekly", "jitter": 0}]
+    backend = rs.CronBackend()
+    assert backend.reconcile_jobs(desired)["written"]
+    writes = []
+    monkeypatch.setattr(rs, "set_crontab", lambda content: writes.append(content) or True)
+    diff = backend.reconcile_jobs(desired)
+    assert not diff["written"] and not rs.diff_has_changes(diff)
+    assert writes == []
+
+
+def test_backend_reconcile_rewrites_duplicate_ids(rs, crontab):
+    desired = [{"id": "nightly", "schedule": "0 3 * * *", "description": "Nightly", "jitter": 0}]
+    backend = rs.CronBackend()
+    backend.reconcile_jobs(desired)
+    line = rs.get_script_cron_jobs()[0]
+    crontab.path.write_text(rs.splice_managed_block("", [line, line]))
+    assert backend.reconcile_jobs(desired, dry_run=True)["written"] is False
+    assert len(rs.get_script_cron_jobs()) == 2
+    assert backend.reconcile_jobs(desired)["written"]
+    assert rs.get_script_cron_jobs() == [line]
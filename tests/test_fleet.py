@@ -0,0 +1,70 @@
+"""run_fleet with a local command runner standing in for ssh."""
+
+import shlex
+import sys
+import textwrap
+
+RUNNER = textwrap.dedent("""\
+    import os, sys, time
+    host, command = sys.argv[1], sys.argv[2]
+    if host.startswith("down"):
+        sys.exit(255)
+    if host.startswith("slow"):
+        time.sleep(5)
+    if host.startswith("flaky"):
+        marker = os.path.join(os.path.dirname(__file__), host + ".tried")
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            sys.exit(1)
+    print(host, command)
+""")
+
+
+def run(rs, tmp_path, hosts, remote_args=("show", "--json"), **kwargs):
+    runner = tmp_path / "runner.py"
+    runner.write_text(RUNNER)
+    template = f"{shlex.quote(sys.executable)} {shlex.quote(str(runner))} {{host}} {{command}}"
+    options = dict(parallel=4, timeout=2, retries=0, retry_delay=0.01)
+    options.update(kwargs)
+    return rs.run_fleet(hosts, list(remote_args), template, "restart_scheduler", **options)
+
+
+def entry(host, **labels):
+    return {"host": host, "labels": labels}
+
+
+def test_results_in_inventory_order_with_substituted_labels(rs, tmp_path):
+    hosts = [entry(f"web{i}", cron=f"0{i} 04 * * *") for i in range(6)]
+    results = run(rs, tmp_path, hosts, ("set", "--cron", "{cron}", "--description", "{host}"))
+    assert [r["host"] for r in results] == [h["host"] for h in hosts]
+    for i, r in enumerate(results):
+        assert r["ok"] and r["returncode"] == 0 and r["attempts"] == 1
+        assert r["stdout"] == f"web{i} restart_scheduler set --cron '0{i} 04 * * *' --description web{i}\n"
+
+
+def test_failed_host_does_not_affect_others(rs, tmp_path):
+    results = run(rs, tmp_path, [entry("web1"), entry("down1"), entry("web2")], retries=1)
+    by_host = {r["host"]: r for r in results}
+    assert by_host["web1"]["ok"] and by_host["web2"]["ok"]
+    assert not by_host["down1"]["ok"]
+    assert by_host["down1"]["returncode"] == 255
+    assert by_host["down1"]["attempts"] == 2
+
+
+def test_retry_succeeds_after_a_failed_attempt(rs, tmp_path):
+    (result,) = run(rs, tmp_path, [entry("flaky1")], retries=2)
+    assert result["ok"] and result["attempts"] == 2
+
+
+def test_timeout_is_reported_per_host(rs, tmp_path):
+    results = run(rs, tmp_path, [entry("slow1"), entry("web1")], timeout=0.5)
+    assert results[0]["ok"] is False
+    assert results[0]["returncode"] is None
+    assert "timed out" in results[0]["stderr"]
+    assert results[1]["ok"]
+
+
+def test_missing_runner_is_not_retried(rs):
+    (result,) = rs.run_fleet([entry("web1")], ["show"], "/nonexistent/ssh {host} {command}",
+                             "restart_scheduler", parallel=1, timeout=1, retries=3, retry_delay=0.01)
+    assert not result["ok"] and result["attempts"] == 1
@@ -0,0 +1,41 @@
+"""The reboot gate's single-instance lock."""
+
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def gate_lock(rs, tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "GATE_LOCK_PATH", str(tmp_path / "restart_scheduler.gate.lock"))
+
+
+def log_events(rs):
+    with open(rs.LOG_PATH) as f:
+        return [json.loads(line)["event"] for line in f]
+
+
+def test_second_gate_exits_while_one_is_running(rs, gate_lock, monkeypatch):
+    def must_not_run(*args):
+        raise AssertionError("the overlapping gate went on")
+
+    monkeypatch.setattr(rs, "_run_reboot_gate", must_not_run)
+    held = rs.try_gate_lock()
+    try:
+        assert rs.try_gate_lock() is None
+        assert rs.run_reboot_gate(trigger="watch") is False
+        assert log_events(rs) == ["gate_overlap"]
+    finally:
+        os.close(held)
+
+
+def test_lock_is_released_when_the_gate_returns(rs, gate_lock, monkeypatch):
+    runs = []
+    monkeypatch.setattr(rs, "_run_reboot_gate", lambda *args: runs.append(args) or False)
+    assert rs.run_reboot_gate() is False
+    assert rs.run_reboot_gate(trigger="manual") is False
+    assert [args[0] for args in runs] == ["cron", "manual"]
+    fd = rs.try_gate_lock()
+    assert fd is not None
+    os.close(fd)
@@ -0,0 +1,107 @@
+"""Restart history: failed reboot commands and boot completion."""
+
+import pytest
+
+
+@pytest.fixture
+def history(rs, tmp_path, monkeypatch):
+    """History in tmp_path, with a "full" strategy whose command is chosen per test."""
+    monkeypatch.setattr(rs, "STATE_DIR", str(tmp_path))
+    monkeypatch.setattr(rs, "HISTORY_PATH", str(tmp_path / "history.jsonl"))
+    monkeypatch.setattr(rs, "get_reboot_strategies", lambda preferred=None: ["full"])
+    monkeypatch.setattr(rs, "snapshot_pagecache_before_reboot", lambda trigger: None)
+    monkeypatch.setattr(rs, "run_shutdown_pipeline", lambda settings, trigger: {"stages": {}, "stopped": []})
+    monkeypatch.setattr(rs, "wait_until_ready", lambda: (rs.time.time(), 0))
+
+    def use_command(command):
+        monkeypatch.setattr(rs, "prepare_reboot_strategy", lambda name: (command, None))
+    return use_command
+
+
+def test_failed_command_marks_the_record(rs, history):
+    history("false")
+    assert rs.issue_reboot("cron") is False
+    (record,) = rs.read_history()
+    assert record["failed"] is True and record["returncode"] == 1
+
+
+def test_missing_command_marks_the_record(rs, history):
+    history("/nonexistent/reboot")
+    assert rs.issue_reboot("cron") is False
+    (record,) = rs.read_history()
+    assert record["failed"] is True and "error" in record
+
+
+def test_next_boot_does_not_complete_a_failed_record(rs, history, monkeypatch):
+    history("false")
+    rs.issue_reboot("cron")
+    monkeypatch.setattr(rs, "read_boot_time", lambda: rs.time.time() + 3 * 86400)
+    assert rs.finalize_boot_history() is None
+    (record,) = rs.read_history()
+    assert "btime" not in record
+
+
+def test_successful_command_is_completed_by_the_next_boot(rs, history, monkeypatch):
+    history("true")
+    assert rs.issue_reboot("cron") is True
+    monkeypatch.setattr(rs, "read_boot_time", lambda: rs.time.time() + 60)
+    record = rs.finalize_boot_history()
+    assert record is not None and "failed" not in record
+    assert rs.history_durations(record)["shutdown"] > 0
+
+
+def test_percentiles_skip_failed_records(rs):
+    records = [{"id": 1, "issued": 0, "btime": 30, "ready": 60},
+               {"id": 2, "issued": 100, "btime": 90000, "ready": 90100, "failed": True}]
+    text = rs.render_prometheus_metrics(records, 50)
+    assert 'restart_scheduler_downtime_seconds{quantile="0.5"} 60' in text
+    assert "restart_scheduler_downtime_seconds_count 1" in text
+
+
+@pytest.fixture
+def soft_reboot(rs, history, monkeypatch):
+    """Issues a successful soft-reboot with systemd reporting count soft-reboots so far,
+    then returns a setter for the count the boot hook sees. btime stays before the restart.
+    """
+    monkeypatch.setattr(rs, "get_reboot_strategies", lambda preferred=None: ["soft-reboot"])
+    monkeypatch.setattr(rs, "read_boot_time", lambda: rs.time.time() - 3600)
+    history("true")
+
+    def issue(count):
+        monkeypatch.setattr(rs, "read_soft_reboot_count", lambda: count)
+        assert rs.issue_reboot("cron") is True
+        (record,) = rs.read_history()
+        assert record["strategy"] == "soft-reboot" and record["soft_reboots"] == count
+
+        def boot_with(count_after):
+            monkeypatch.setattr(rs, "read_soft_reboot_count", lambda: count_after)
+        return boot_with
+    return issue
+
+
+def test_soft_reboot_is_completed_when_the_count_goes_up(rs, soft_reboot):
+    soft_reboot(2)(3)
+    record = rs.finalize_boot_history()
+    assert record is not None and record["btime"] >= record["issued"]
+    assert rs.finalize_boot_history() is None
+
+
+@pytest.mark.parametrize("count_after", [2, None])
+def test_soft_reboot_is_not_completed_without_a_higher_count(rs, soft_reboot, count_after):
+    soft_reboot(2)(count_after)
+    assert rs.finalize_boot_history() is None
+    (record,) = rs.read_history()
+    assert "btime" not in record
+
+
+def test_soft_reboot_with_an_unknown_count_is_completed_by_the_hook(rs, soft_reboot):
+    soft_reboot(None)(None)
+    assert rs.finalize_boot_history() is not None
+
+
+def test_full_reboot_needs_a_newer_kernel_boot(rs, history, monkeypatch):
+    history("true")
+    monkeypatch.setattr(rs, "read_soft_reboot_count", lambda: 5)
+    rs.issue_reboot("cron")
+    monkeypatch.setattr(rs, "read_boot_time", lambda: rs.time.time() - 3600)
+    assert rs.finalize_boot_history() is None
@@ -0,0 +1,106 @@
+"""Lease acquire, release and expiry on the directory backend and the bundled TCP lease server."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+@pytest.fixture
+def lease_server(rs, tmp_path):
+    """Address of a lease server on a free local port, keeping its state in tmp_path."""
+    env = dict(os.environ, RESTART_SCHEDULER_LOG=str(tmp_path / "server.log"))
+    proc = subprocess.Popen([sys.executable, os.path.abspath(rs.__file__), "lease-server",
+                             "--bind", "127.0.0.1", "--port", "0", "--state", str(tmp_path / "server-state.json")],
+                            stdout=subprocess.PIPE, text=True, env=env)
+    line = proc.stdout.readline()
+    try:
+        assert line.startswith("Listening on "), line
+        yield line.split()[-1]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+@pytest.fixture(params=["directory", "tcp"])
+def settings(request, rs, tmp_path, monkeypatch):
+    """Lease settings for host-a on the backend under test; change "holder" for other hosts."""
+    monkeypatch.setattr(rs, "LEASE_STATE_PATH", str(tmp_path / "state" / "lease.json"))
+    server = request.getfixturevalue("lease_server") if request.param == "tcp" else ""
+    return {"backend": request.param, "directory": str(tmp_path / "leases"), "server": server,
+            "pool": "web", "slots": 2, "ttl": 60.0, "holder": "host-a", "deadline": 0.3,
+            "backoff": 0.05, "max_backoff": 0.1, "on_timeout": "skip"}
+
+
+def holders(leases):
+    return [lease["holder"] for lease in leases]
+
+
+def test_acquire_grants_up_to_the_slots(rs, settings):
+    backend = rs.get_lease_backend(settings)
+    assert backend.acquire("web", "host-a", 2, 60)[0]
+    granted, leases = backend.acquire("web", "host-b", 2, 60)
+    assert granted and holders(leases) == ["host-a", "host-b"]
+    granted, leases = backend.acquire("web", "host-c", 2, 60)
+    assert not granted and holders(leases) == ["host-a", "host-b"]
+    # pools are independent
+    assert backend.acquire("db", "host-c", 2, 60)[0]
+
+
+def test_holder_renews_its_own_lease(rs, settings):
+    backend = rs.get_lease_backend(settings)
+    backend.acquire("web", "host-a", 1, 60)
+    (first,) = backend.list("web")
+    time.sleep(0.05)
+    granted, (renewed,) = backend.acquire("web", "host-a", 1, 60)
+    assert granted
+    assert renewed["acquired"] == first["acquired"]
+    assert renewed["expires"] > first["expires"]
+
+
+def test_release_frees_the_slot(rs, settings):
+    backend = rs.get_lease_backend(settings)
+    backend.acquire("web", "host-a", 1, 60)
+    assert not backend.acquire("web", "host-b", 1, 60)[0]
+    assert backend.release("web", "host-a")
+    assert not backend.release("web", "host-a")
+    assert backend.acquire("web", "host-b", 1, 60)[0]
+    assert holders(backend.list("web")) == ["host-b"]
+
+
+def test_expired_lease_frees_the_slot(rs, settings):
+    backend = rs.get_lease_backend(settings)
+    backend.acquire("web", "host-a", 1, 0.2)
+    assert not backend.acquire("web", "host-b", 1, 60)[0]
+    time.sleep(0.3)
+    assert backend.list("web") == []
+    assert backend.acquire("web", "host-b", 1, 60)[0]
+
+
+def test_admission_waits_times_out_and_releases(rs, settings):
+    settings["slots"] = 1
+    assert rs.acquire_restart_lease(settings, "test")
+    with open(rs.LEASE_STATE_PATH) as f:
+        assert json.load(f)["holder"] == "host-a"
+
+    other = dict(settings, holder="host-b")
+    started = time.monotonic()
+    assert not rs.acquire_restart_lease(other, "test")
+    assert time.monotonic() - started >= other["deadline"]
+
+    assert rs.release_restart_lease("test")
+    assert not os.path.exists(rs.LEASE_STATE_PATH)
+    assert not rs.release_restart_lease("test")
+    assert rs.acquire_restart_lease(other, "test")
+
+
+def test_unreachable_server_counts_as_refusal(rs, tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "LEASE_STATE_PATH", str(tmp_path / "lease.json"))
+    settings = {"backend": "tcp", "directory": "", "server": "127.0.0.1:1", "pool": "web", "slots": 1,
+                "ttl": 60.0, "holder": "host-a", "deadline": 0.1, "backoff": 0.05, "max_backoff": 0.05,
+                "on_timeout": "skip"}
+    assert not rs.acquire_restart_lease(settings, "test")
+    assert not os.path.exists(rs.LEASE_STATE_PATH)
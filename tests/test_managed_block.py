@@ -0,0 +1,93 @@
+"""The managed crontab block: locating it, splicing it and the mmap spool reader."""
+
+import pytest
+
+import restart_scheduler
+
+BEGIN = restart_scheduler.MANAGED_BLOCK_BEGIN
+END = restart_scheduler.MANAGED_BLOCK_END
+TAG = restart_scheduler.CRON_COMMENT
+
+JOB_A = f"30 4 * * * /usr/bin/restart gate {TAG} [default] (Daily at 04:30)"
+JOB_B = f"0 2 * * 0 /usr/bin/restart gate {TAG} [weekly] (Weekly)"
+USER_JOB = "*/5 * * * * /usr/local/bin/backup"
+QUOTED = f"0 1 * * * echo '{BEGIN}' > /tmp/x"
+
+CONTENTS = {
+    "empty": "",
+    "user only": USER_JOB + "\n",
+    "block at offset 0": f"{BEGIN}\n{JOB_A}\n{END}\n{USER_JOB}\n",
+    "block after user jobs": f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{JOB_B}\n{END}\n",
+    "marker quoted mid-line": f"{QUOTED}\n{BEGIN}\n{JOB_A}\n{END}\n",
+    "markers only quoted": f"{QUOTED}\n{USER_JOB}\n",
+    "end marker quoted in body": f"{BEGIN}\n{JOB_A}\n0 0 * * * echo '{END}'\n{END}\n",
+    "unterminated block": f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{JOB_B}\n",
+    "begin marker only": f"{USER_JOB}\n{BEGIN}\n",
+    "empty block": f"{BEGIN}\n{END}\n",
+    "legacy lines": f"{USER_JOB}\n{JOB_A}\n{JOB_B}\n",
+    "no trailing newline": f"{BEGIN}\n{JOB_A}\n{END}",
+}
+
+
+def test_find_managed_block_ignores_a_marker_quoted_mid_line(rs):
+    content = CONTENTS["marker quoted mid-line"]
+    start, body_start, body_end, end = rs.find_managed_block(content)
+    assert start == len(QUOTED) + 1
+    assert content[body_start:body_end] == JOB_A + "\n"
+    assert end == len(content)
+    assert rs.find_managed_block(CONTENTS["markers only quoted"]) is None
+
+
+def test_find_managed_block_at_offset_zero_and_unterminated(rs):
+    content = CONTENTS["block at offset 0"]
+    start, body_start, body_end, end = rs.find_managed_block(content)
+    assert start == 0 and content[end:] == USER_JOB + "\n"
+    content = CONTENTS["unterminated block"]
+    start, body_start, body_end, end = rs.find_managed_block(content)
+    assert content[body_start:body_end] == f"{JOB_A}\n{JOB_B}\n" and end == len(content)
+
+
+@pytest.mark.parametrize("name", sorted(CONTENTS))
+def test_spool_reader_agrees_with_the_full_parse(rs, tmp_path, name):
+    path = tmp_path / "root"
+    path.write_text(CONTENTS[name])
+    assert rs.read_managed_lines_from_spool(str(path)) == rs.read_managed_lines(CONTENTS[name])
+
+
+def test_spool_reader_treats_a_missing_file_as_no_jobs(rs, tmp_path):
+    assert rs.read_managed_lines_from_spool(str(tmp_path / "missing")) == []
+
+
+def test_splice_replaces_only_the_block(rs):
+    content = f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{END}\n# trailing comment\n"
+    spliced = rs.splice_managed_block(content, [JOB_A, JOB_B])
+    assert spliced == f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{JOB_B}\n{END}\n# trailing comment\n"
+    assert rs.read_managed_lines(spliced) == [JOB_A, JOB_B]
+
+
+def test_splice_keeps_a_quoted_marker_line(rs):
+    spliced = rs.splice_managed_block(CONTENTS["marker quoted mid-line"], [JOB_B])
+    assert spliced == f"{QUOTED}\n{BEGIN}\n{JOB_B}\n{END}\n"
+
+
+def test_splice_with_no_jobs_removes_the_block(rs):
+    assert rs.splice_managed_block(CONTENTS["block after user jobs"], []) == USER_JOB + "\n"
+    assert rs.splice_managed_block(CONTENTS["empty"], []) == ""
+
+
+def test_splice_moves_legacy_lines_into_the_block(rs):
+    spliced = rs.splice_managed_block(CONTENTS["legacy lines"], [JOB_A])
+    assert spliced == f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{END}\n"
+
+
+def test_splice_appends_after_content_without_a_trailing_newline(rs):
+    spliced = rs.splice_managed_block(USER_JOB, [JOB_A])
+    assert spliced == f"{USER_JOB}\n{BEGIN}\n{JOB_A}\n{END}\n"
+
+
+@pytest.mark.parametrize("name", sorted(CONTENTS))
+def test_splice_round_trips(rs, name):
+    jobs = rs.read_managed_lines(CONTENTS[name])
+    spliced = rs.splice_managed_block(CONTENTS[name], jobs)
+    assert rs.read_managed_lines(spliced) == jobs
+    assert rs.splice_managed_block(spliced, jobs) == spliced
@@ -0,0 +1,106 @@
+"""plan_restart_windows and simulate_downtime on small synthetic inventories."""
+
+import argparse
+import datetime
+
+import pytest
+
+
+def inventory(count, **labels):
+    return [{"host": f"web{i:02d}", "labels": dict(labels)} for i in range(count)]
+
+
+def down_minutes(assignment, period_minutes):
+    return {(assignment["start"] + m) % period_minutes for m in range(assignment["duration"])}
+
+
+def test_no_window_overlaps_a_blackout(rs):
+    blackouts = [rs.parse_time_window("08:00-20:00"), rs.parse_time_window("23:30-01:00")]
+    assignments, unplaced = rs.plan_restart_windows(inventory(40), max_down_fraction=0.5, blackouts=blackouts)
+    assert unplaced == [] and len(assignments) == 40
+    blocked = set(range(8 * 60, 20 * 60)) | set(range(23 * 60 + 30, 1440)) | set(range(0, 60))
+    for assignment in assignments:
+        assert not down_minutes(assignment, 1440) & blocked, assignment
+
+
+def test_weekly_blackouts_apply_to_every_day(rs):
+    blackouts = [rs.parse_time_window("00:00-22:00")]
+    assignments, _ = rs.plan_restart_windows(inventory(10), period="weekly", blackouts=blackouts)
+    for assignment in assignments:
+        for minute in down_minutes(assignment, 7 * 1440):
+            assert minute % 1440 >= 22 * 60
+
+
+def test_pool_limit_caps_concurrent_downtime(rs):
+    hosts = inventory(20, duration="30")
+    assignments, unplaced = rs.plan_restart_windows(hosts, max_down_fraction=0.1, granularity=5)
+    assert unplaced == []
+    busy = [0] * 1440
+    for assignment in assignments:
+        assert assignment["start"] % 5 == 0
+        for minute in down_minutes(assignment, 1440):
+            busy[minute] += 1
+    assert max(busy) <= rs.pool_capacity(20, 0.1)
+
+
+def test_hosts_that_do_not_fit_are_unplaced(rs):
+    # one host at a time, 60-minute reboots, only two free hours: two hosts fit
+    blackouts = [rs.parse_time_window("02:00-00:00")]
+    assignments, unplaced = rs.plan_restart_windows(inventory(3, duration="60"), blackouts=blackouts)
+    assert len(assignments) == 2 and len(unplaced) == 1
+
+
+def test_plan_is_stable_when_a_host_is_added(rs):
+    before, _ = rs.plan_restart_windows(inventory(30))
+    after, _ = rs.plan_restart_windows(inventory(31))
+    moved = {a["host"] for a in before} - {a["host"] for a in after if a in before}
+    assert len(moved) <= 1
+
+
+@pytest.mark.parametrize("granularity", [0, -5])
+def test_non_positive_granularity_is_rejected(rs, granularity):
+    with pytest.raises(ValueError):
+        rs.plan_restart_windows(inventory(3), granularity=granularity)
+
+
+@pytest.mark.parametrize("granularity", [0, -5])
+def test_cli_plan_rejects_non_positive_granularity(rs, tmp_path, granularity):
+    path = tmp_path / "hosts"
+    path.write_text("web01\nweb02\n")
+    args = argparse.Namespace(inventory=str(path), pool_limit=None, blackout=None, max_down=0.1,
+                              granularity=granularity, period="daily", default_duration=10, format="table")
+    assert rs.cli_plan(args) == 2
+
+
+def test_simulate_counts_overlapping_reboots(rs):
+    hosts = [
+        {"host": "a", "labels": {"cron": "0 3 * * *", "duration": "20"}},
+        {"host": "b", "labels": {"cron": "10 3 * * *", "duration": "20"}},
+        {"host": "c", "labels": {"cron": "0 3 * * *", "duration": "20", "pool": "db"}},
+        {"host": "d", "labels": {}},
+    ]
+    results, skipped = rs.simulate_downtime(hosts, datetime.datetime(2027, 1, 1), days=2)
+    assert skipped == ["d"]
+    web = results["default"]
+    assert web["hosts"] == 2 and web["peak"] == 2
+    assert web["peak_at"] == "2027-01-01T03:10:00"
+    assert web["down_minutes"] == 2 * 30
+    assert web["host_minutes"] == 2 * 2 * 20
+    assert results["db"]["peak"] == 1 and results["db"]["down_minutes"] == 2 * 20
+
+
+def test_simulate_includes_reboots_started_before_the_window(rs):
+    hosts = [{"host": "a", "labels": {"cron": "50 23 * * *", "duration": "20"}}]
+    results, _ = rs.simulate_downtime(hosts, datetime.datetime(2027, 1, 1), days=1)
+    timeline = results["default"]["timeline"]
+    assert list(timeline[:10]) == [1] * 10 and timeline[10] == 0
+    assert results["default"]["down_minutes"] == 10 + 10
+
+
+def test_simulate_replays_a_plan(rs):
+    hosts = inventory(50, duration="15")
+    assignments, _ = rs.plan_restart_windows(hosts, max_down_fraction=0.1)
+    planned = [{"host": a["host"], "labels": {"cron": a["cron"], "duration": "15"}} for a in assignments]
+    results, skipped = rs.simulate_downtime(planned, datetime.datetime(2027, 1, 1), days=3)
+    assert skipped == []
+    assert results["default"]["peak"] <= rs.pool_capacity(50, 0.1)
@@ -0,0 +1,72 @@
+"""Scheduled service restarts: the shared parallel limit and unit restarts through systemctl."""
+
+import threading
+import time
+
+import pytest
+
+STUB = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+case "$1 $2" in "restart broken.service") exit 3;; esac
+exit 0
+"""
+
+
+def load_group(rs, tmp_path, targets, **options):
+    config = tmp_path / "services.conf"
+    lines = ["[services web]", "targets ="] + [f"    {target}" for target in targets]
+    lines += [f"{key} = {value}" for key, value in options.items()]
+    config.write_text("\n".join(lines) + "\n")
+    return rs.load_service_group("web", str(config))
+
+
+@pytest.fixture
+def concurrency(rs, monkeypatch):
+    """Replaces the instance restart with a short sleep and records the peak concurrency."""
+    state = {"running": 0, "peak": 0, "order": []}
+    lock = threading.Lock()
+
+    def restart(target, instance, settings):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            state["order"].append(target["name"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        if instance == "fail@1.service":
+            return {"target": target["name"], "instance": instance, "ok": False, "phases": {}, "error": "failed"}
+        return {"target": target["name"], "instance": instance, "ok": True, "phases": {}}
+    monkeypatch.setattr(rs, "restart_service_instance", restart)
+    return state
+
+
+def test_parallel_bounds_all_targets_of_a_tier_together(rs, tmp_path, concurrency):
+    settings = load_group(rs, tmp_path, ["a@.service instances=1-6", "b@.service instances=1-6",
+                                         "c@.service instances=1-6"], parallel=4, min_capacity=0)
+    report = rs.run_service_restart(settings)
+    assert report["ok"] and len(report["tiers"]) == 1
+    assert concurrency["peak"] == 4
+
+
+def test_tiers_run_in_order_and_a_failure_skips_the_rest(rs, tmp_path, concurrency):
+    settings = load_group(rs, tmp_path, ["db", "fail@ instances=1-2 after=db",
+                                         "web after=fail@"], parallel=2)
+    report = rs.run_service_restart(settings)
+    assert not report["ok"] and report["skipped"] == ["web"]
+    assert concurrency["order"][0] == "db"
+    assert "web" not in concurrency["order"]
+
+
+def test_unit_restart_goes_through_systemctl(rs, tmp_path, monkeypatch):
+    stub = tmp_path / "systemctl"
+    stub.write_text(STUB)
+    stub.chmod(0o755)
+    monkeypatch.setattr(rs, "SYSTEMCTL", str(stub))
+    settings = load_group(rs, tmp_path, ["app.service", "broken.service"], health_timeout=1, health_interval=0.1)
+    ok = rs.restart_service_instance(settings["targets"][0], "app.service", settings)
+    assert ok["ok"] and set(ok["phases"]) == {"restart", "health"}
+    broken = rs.restart_service_instance(settings["targets"][1], "broken.service", settings)
+    assert not broken["ok"] and broken["error"] == "systemctl restart broken.service exited with 3"
+    calls = (tmp_path / "calls.log").read_text().splitlines()
+    assert calls == ["restart app.service", "is-active --quiet app.service", "restart broken.service"]
@@ -0,0 +1,96 @@
+"""The pre-reboot pipeline: the opt-in kill stage of manual runs and the freeze/thaw cycle."""
+
+import types
+
+import pytest
+
+STUB = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+case "$1 $2" in "stop stuck.service") exit 1;; esac
+exit 0
+"""
+
+
+@pytest.fixture
+def pipeline(rs, tmp_path, monkeypatch):
+    """A stub systemctl and [shutdown] settings with one service that stops and one that does not.
+    Returns a function giving the stub's argument lines so far.
+    """
+    stub = tmp_path / "systemctl"
+    stub.write_text(STUB)
+    stub.chmod(0o755)
+    monkeypatch.setattr(rs, "SYSTEMCTL", str(stub))
+    settings = {"stages": ["stop", "kill"], "parallel": 2, "kill_processes": [], "kill_grace": 0.0,
+                "services": [{"unit": "app.service", "timeout": 5.0}, {"unit": "stuck.service", "timeout": 5.0}],
+                "mounts": [], "freeze": False, "sync_timeout": 1.0}
+    monkeypatch.setattr(rs, "load_shutdown_settings", lambda: dict(settings))
+
+    def calls():
+        log = tmp_path / "calls.log"
+        return log.read_text().splitlines() if log.exists() else []
+    return calls
+
+
+def test_manual_run_skips_the_kill_stage_without_kill(rs, pipeline, capsys):
+    args = rs.build_arg_parser().parse_args(["pre-reboot", "--json"])
+    assert rs.cli_pre_reboot(args) == 0
+    assert '"kill"' not in capsys.readouterr().out
+    calls = pipeline()
+    assert not [call for call in calls if call.startswith("kill")]
+    assert calls[-1] == "start app.service stuck.service"
+
+
+def test_manual_run_kills_stuck_services_with_kill(rs, pipeline, capsys):
+    args = rs.build_arg_parser().parse_args(["pre-reboot", "--kill", "--json"])
+    assert rs.cli_pre_reboot(args) == 0
+    assert '"kill"' in capsys.readouterr().out
+    calls = pipeline()
+    assert "kill stuck.service" in calls and "kill --signal=SIGKILL stuck.service" in calls
+    assert "kill app.service" not in calls
+
+
+class FakeIoctl:
+    """Records FIFREEZE/FITHAW calls; the given requests raise OSError."""
+
+    def __init__(self, rs, failing=()):
+        self.rs = rs
+        self.failing = set(failing)
+        self.calls = []
+
+    def __call__(self, fd, request, arg):
+        name = {self.rs.FIFREEZE: "freeze", self.rs.FITHAW: "thaw"}[request]
+        self.calls.append(name)
+        if name in self.failing:
+            raise OSError(f"{name} refused")
+        return 0
+
+
+def sync_with(rs, tmp_path, monkeypatch, syncfs=0, failing=()):
+    ioctl = FakeIoctl(rs, failing)
+    monkeypatch.setattr(rs.fcntl, "ioctl", ioctl)
+    libc = types.SimpleNamespace(syncfs=lambda fd: syncfs)
+    return rs.sync_mount(str(tmp_path), True, libc), ioctl.calls
+
+
+def test_frozen_filesystem_is_thawed(rs, tmp_path, monkeypatch):
+    result, calls = sync_with(rs, tmp_path, monkeypatch)
+    assert calls == ["freeze", "thaw"]
+    assert result["ok"] and "sync" in result and "freeze" in result
+
+
+def test_failed_thaw_marks_the_mount(rs, tmp_path, monkeypatch):
+    result, calls = sync_with(rs, tmp_path, monkeypatch, failing=["thaw"])
+    assert calls == ["freeze", "thaw"]
+    assert not result["ok"] and result["thaw_error"] == "thaw refused"
+
+
+def test_unsupported_freeze_is_not_thawed(rs, tmp_path, monkeypatch):
+    result, calls = sync_with(rs, tmp_path, monkeypatch, failing=["freeze"])
+    assert calls == ["freeze"]
+    assert result["ok"] and result["freeze_error"] == "freeze refused"
+
+
+def test_failed_sync_skips_the_freeze(rs, tmp_path, monkeypatch):
+    result, calls = sync_with(rs, tmp_path, monkeypatch, syncfs=-1)
+    assert calls == []
+    assert not result["ok"] and result["error"] == "syncfs failed"
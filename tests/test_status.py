@@ -0,0 +1,73 @@
+"""The 'status' cache: keyed on the spool directory, a missing spool file means no jobs."""
+
+import json
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def spool(rs, tmp_path, monkeypatch):
+    """An empty spool directory for the cron backend, with the status cache in tmp_path."""
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setattr(rs, "CRONTAB_SPOOL_DIRS", [str(spool_dir)])
+    monkeypatch.setattr(rs, "STATUS_CACHE_PATH", str(tmp_path / "run" / "status.json"))
+    monkeypatch.setattr(rs, "SCHEDULER_BACKEND", "cron")
+    monkeypatch.setattr(rs, "CRON_BACKEND", "spool")
+    return spool_dir
+
+
+def write_root_crontab(rs, spool_dir, schedule):
+    """Replaces root's spool file by renaming into the directory, like crontab(1) does."""
+    line = rs.format_script_cron_job(schedule, "/usr/local/bin/restart_scheduler gate", "default", "test")
+    tmp_path = spool_dir / ".tmp"
+    tmp_path.write_text(f"{rs.MANAGED_BLOCK_BEGIN}\n{line}\n{rs.MANAGED_BLOCK_END}\n")
+    os.replace(tmp_path, spool_dir / "root")
+
+
+def test_missing_spool_file_means_no_jobs(rs, spool, capsys):
+    assert rs.cli_status(None) == 0
+    status = json.loads(capsys.readouterr().out)
+    assert status["status"] == "ok" and status["jobs"] == [] and status["cached"] is False
+
+
+def test_cache_is_hit_until_the_spool_directory_changes(rs, spool):
+    write_root_crontab(rs, spool, "30 4 * * *")
+    assert rs.get_cached_status()["cached"] is False
+    status = rs.get_cached_status()
+    assert status["cached"] is True
+    assert [job["schedule"] for job in status["jobs"]] == ["30 4 * * *"]
+
+    key = rs.status_cache_key()
+    time.sleep(0.05)
+    write_root_crontab(rs, spool, "0 5 * * *")
+    assert rs.status_cache_key() != key
+    status = rs.get_cached_status()
+    assert status["cached"] is False
+    assert [job["schedule"] for job in status["jobs"]] == ["0 5 * * *"]
+
+
+def test_expired_cache_is_not_read(rs, spool, monkeypatch):
+    rs.get_cached_status()
+    key = rs.status_cache_key()
+    assert rs.read_status_cache(key) is not None
+    monkeypatch.setattr(rs, "STATUS_CACHE_MAX_AGE", -1)
+    assert rs.read_status_cache(key) is None
+
+
+def test_unreadable_crontab_falls_back_to_a_matching_cache(rs, spool, monkeypatch):
+    write_root_crontab(rs, spool, "30 4 * * *")
+    rs.get_cached_status()
+
+    def hidden():
+        raise PermissionError("root's crontab is not readable")
+
+    monkeypatch.setattr(rs, "build_status", hidden)
+    monkeypatch.setattr(rs, "STATUS_CACHE_MAX_AGE", -1)
+    assert rs.get_cached_status()["jobs"][0]["schedule"] == "30 4 * * *"
+    time.sleep(0.05)
+    write_root_crontab(rs, spool, "0 5 * * *")
+    with pytest.raises(PermissionError):
+        rs.get_cached_status()
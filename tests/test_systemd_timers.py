@@ -0,0 +1,107 @@
+"""SystemdTimerBackend against a temporary unit directory and a stub systemctl."""
+
+import datetime
+import os
+
+import pytest
+
+STUB = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+case "$1" in show) echo "@1792382400";; esac
+exit 0
+"""
+
+
+@pytest.fixture
+def backend(rs, tmp_path, monkeypatch):
+    stub = tmp_path / "systemctl"
+    stub.write_text(STUB)
+    stub.chmod(0o755)
+    monkeypatch.setattr(rs, "resolve_reboot_command", lambda: "true")
+    backend = rs.SystemdTimerBackend(unit_dir=str(tmp_path / "units"), systemctl=str(stub))
+    (tmp_path / "units").mkdir()
+    return backend
+
+
+def systemctl_calls(backend):
+    """The stub's argument lines so far."""
+    log = os.path.join(os.path.dirname(backend.systemctl[0]), "calls.log")
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return f.read().splitlines()
+
+
+def unit_files(backend):
+    return sorted(os.listdir(backend.unit_dir))
+
+
+def test_install_writes_and_enables_the_timer(rs, backend):
+    assert backend.install_job("30 4 * * *", "Daily at 04:30", jitter=600)
+    assert unit_files(backend) == ["restart-scheduler-default.service", "restart-scheduler-default.timer"]
+    timer, service = backend._read_units("default")
+    assert "OnCalendar=*-*-* 04:30:00\n" in timer
+    assert "RandomizedDelaySec=600\n" in timer
+    assert "ExecStart=" in service and "gate --trigger systemd" in service
+    assert systemctl_calls(backend) == ["daemon-reload", "enable --now restart-scheduler-default.timer"]
+
+
+def test_list_reads_back_installed_jobs(rs, backend):
+    backend.install_job("30 4 * * *", "Daily at 04:30")
+    backend.install_job("0 2 * * 0", "Weekly", name="weekly")
+    jobs = {job["id"]: job for job in backend.list_jobs()}
+    assert set(jobs) == {"default", "weekly"}
+    assert jobs["default"]["schedule"] == "30 4 * * *"
+    assert jobs["default"]["description"] == "Daily at 04:30"
+    assert jobs["weekly"]["unit"] == "restart-scheduler-weekly.timer"
+    assert "gate --trigger systemd" in jobs["weekly"]["command"]
+    assert backend.next_runs(jobs["weekly"], 1) == [datetime.datetime.fromtimestamp(1792382400)]
+
+
+def test_reinstall_only_touches_the_named_job(rs, backend):
+    backend.install_job("0 2 * * 0", "Weekly", name="weekly")
+    backend.install_job("30 4 * * *", "Daily at 04:30")
+    calls = len(systemctl_calls(backend))
+    backend.install_job("30 4 * * *", "Daily at 04:30")
+    assert len(systemctl_calls(backend)) == calls  # unchanged: nothing written, no daemon-reload
+    backend.install_job("0 5 * * *", "Daily at 05:00")
+    assert systemctl_calls(backend)[calls:] == ["daemon-reload", "restart restart-scheduler-default.timer"]
+    assert [job["id"] for job in backend.list_jobs()] == ["default", "weekly"]
+
+
+def test_remove_all_disables_and_deletes_units(rs, backend):
+    backend.install_job("30 4 * * *", "Daily at 04:30")
+    backend.install_job("0 2 * * 0", "Weekly", name="weekly")
+    calls = len(systemctl_calls(backend))
+    assert backend.remove_all_jobs(inform_user=False) == 2
+    assert unit_files(backend) == []
+    assert systemctl_calls(backend)[calls:] == [
+        "disable --now restart-scheduler-default.timer restart-scheduler-weekly.timer", "daemon-reload"]
+    assert backend.remove_all_jobs(inform_user=False) == 0
+
+
+def test_reconcile_removes_timers_missing_from_the_desired_state(rs, backend):
+    backend.install_job("30 4 * * *", "Daily at 04:30")
+    desired = [{"id": "nightly", "schedule": "0 3 * * *", "description": "Nightly", "jitter": 0}]
+    diff = backend.reconcile_jobs(desired)
+    assert diff["added"] == ["nightly"] and diff["removed"] == ["default"] and diff["written"]
+    assert [job["id"] for job in backend.list_jobs()] == ["nightly"]
+
+
+@pytest.mark.parametrize("expression, calendars", [
+    ("30 4 * * *", ["*-*-* 04:30:00"]),
+    ("@weekly", ["Sun *-*-* 00:00:00"]),
+    ("0 3 * * 7", ["Sun *-*-* 03:00:00"]),
+    ("0 0 * * 0-6", ["*-*-* 00:00:00"]),
+    ("*/15 2 * * 1-5", ["Mon,Tue,Wed,Thu,Fri *-*-* 02:00,15,30,45:00"]),
+    ("0 6 */10 jan,jul *", ["*-01,07-01,11,21,31 06:00:00"]),
+    # both day fields restricted: cron fires on either, so the timer needs both calendars
+    ("0 0 13 * 5", ["Fri *-*-* 00:00:00", "*-*-13 00:00:00"]),
+])
+def test_cron_to_on_calendar(rs, expression, calendars):
+    assert rs.cron_to_on_calendar(expression) == calendars
+
+
+def test_cron_to_on_calendar_rejects_reboot(rs):
+    with pytest.raises(rs.CronError):
+        rs.cron_to_on_calendar("@reboot")